@@ -27,7 +27,7 @@ __version__ = '3.0-pre5'
 
 import sys
 try:
-	from typing import Tuple
+	from typing import Tuple, Iterator
 except:
 	pass
 	
@@ -41,6 +41,12 @@ from das2.dataset   import *
 from das2.auth      import *
 from das2.util      import *
 from das2.reader    import *
+from das2.cache     import *
+from das2.search    import *
+from das2.node      import _get_def
+from das2.profile   import profile_stream, format_profile
+from das2.transcode import transcode
+from das2.compress  import decompress, sniff_compression, FileFeed
 
 # Pull up a function or two from the C module:
 from _das2 import convert
@@ -92,7 +98,8 @@ def read_file(sFileName):
 	"""Read datasets from a file
 
 	Args:
-		sFileName (str) : the name of the file to read
+		sFileName (str) : the name of the file to read, gzip and zstd
+			compressed files are decompressed as they are read.
 
 	Returns: (dict, list)
 		A stream header followed by a list of dataset objects created from the
@@ -101,7 +108,8 @@ def read_file(sFileName):
 	"""
 
 	try:
-		(dHdr, lDs) = _das2.read_file(sFileName)
+		with FileFeed(sFileName) as sPath:
+			(dHdr, lDs) = _das2.read_file(sPath)
 	except Exception as e:
 		sys.stderr.write("Error reading '%s': %s\n"%(sFileName, str(e)))
 		return None
@@ -115,8 +123,8 @@ def read_file(sFileName):
 	raise _das2.Error("Unable to retrieve data using %s"%sUrl)
 
 
-def read_http(sUrl, rTimeOut=3.0, sAgent=None):
-	#type: (str, float, str) -> Tuple[dict, list]
+def read_http(sUrl, rTimeOut=3.0, sAgent=None, cache=True):
+	#type: (str, float, str, bool) -> Tuple[dict, list]
 	"""Issue an HTTP GET command to a remote server and output a list of
 	datasets.
 
@@ -137,20 +145,34 @@ def read_http(sUrl, rTimeOut=3.0, sAgent=None):
 		sAgent (str, options) : The user-agent string to set in the HTTP/HTTPs
 			header.  If not specified a default string will be sent.
 
+		cache (bool, optional) : If False, don't read or write the stream cache.
+			Has no effect unless caching has been turned on via das2.set_cache().
+
 	Returns: (dict, list)
 		A stream header followed by a list of dataset objects created from the
 		message body, or None if an error occured.  The return datasets may or
 		may not have data depending on if data packetes were part of the response.
 	"""
 
-	try:
-		if sAgent:
-			(dHdr, lDs) = _das2.read_server(sUrl, rTimeOut, sAgent)
-		else:
-			(dHdr, lDs) = _das2.read_server(sUrl, rTimeOut)
-	except Exception as e:
-		sys.stderr.write("Error retrieving '%s': %s\n"%(sUrl, str(e)))
-		return None
+	stCache = get_cache() if cache else None
+	tRaw = None
+	if stCache != None:
+		sKey = cache_key({'url':sUrl})
+		tRaw = stCache.get(sKey)
+
+	if tRaw is not None:
+		(dHdr, lDs) = tRaw
+	else:
+		try:
+			if sAgent:
+				(dHdr, lDs) = _das2.read_server(sUrl, rTimeOut, sAgent)
+			else:
+				(dHdr, lDs) = _das2.read_server(sUrl, rTimeOut)
+		except Exception as e:
+			sys.stderr.write("Error retrieving '%s': %s\n"%(sUrl, str(e)))
+			return None
+
+		if (stCache != None) and (lDs != None): stCache.put(sKey, dHdr, lDs)
 
 	if lDs != None:
 		lOut = []
@@ -160,6 +182,149 @@ def read_http(sUrl, rTimeOut=3.0, sAgent=None):
 
 	raise _das2.Error("Unable to retrieve data using %s"%sUrl)
 
+# ########################################################################### #
+# Incremental reading functions
+
+def _iter_raw(fRead, tArgs, nQueue):
+	"""Run one of the _das2.read_*_cb functions in a background thread and
+	yield (dHdr, lDs) chunks as they arrive.  The queue is bounded so that the
+	reader blocks (and stops buffering) when the consumer falls behind.
+	"""
+	import threading
+	import queue
+
+	qChunks = queue.Queue(max(1, nQueue))
+	evStop = threading.Event()
+	_END = object()
+
+	def onChunk(tChunk):
+		while not evStop.is_set():
+			try:
+				qChunks.put(tChunk, timeout=0.25)
+				return True
+			except queue.Full:
+				pass
+		return False  # Consumer went away, stop reading
+
+	def run():
+		try:
+			fRead(*(tArgs[:1] + (onChunk,) + tArgs[1:]))
+			qChunks.put(_END)
+		except Exception as e:
+			qChunks.put(e)
+
+	thread = threading.Thread(target=run, name="das2-reader", daemon=True)
+	thread.start()
+	try:
+		while True:
+			item = qChunks.get()
+			if item is _END: break
+			if isinstance(item, Exception): raise item
+
+			(dHdr, lRaw) = item
+			yield (dHdr, [ds_from_raw(ds) for ds in lRaw if ds != None])
+	finally:
+		evStop.set()
+		# Drain so a blocked reader notices the stop flag promptly
+		while thread.is_alive():
+			try:
+				qChunks.get(timeout=0.25)
+			except queue.Empty:
+				pass
+
+def _chunk_args(nRecs, rMegaBytes):
+	return (max(0, int(nRecs or 0)), max(0, int((rMegaBytes or 0)*1048576)))
+
+def iter_file(sFileName, nRecs=0, rMegaBytes=16.0, nQueue=2):
+	# type: (str, int, float, int) -> Iterator[Tuple[dict, list]]
+	"""Read datasets from a file a chunk at a time
+
+	Unlike read_file(), which returns only after the entire stream has been
+	loaded, this generator yields datasets as soon as each chunk is complete.
+	Peak memory use is bounded by the chunk size times nQueue instead of the
+	size of the stream.
+
+	Args:
+		sFileName (str) : the name of the file to read, may be compressed,
+			see read_file()
+
+		nRecs (int, optional) : Emit a chunk after this many data packets have
+			been read.  The default, 0, disables the record limit.
+
+		rMegaBytes (float, optional) : Emit a chunk after the buffered arrays
+			reach this size in MiB.  Use 0 to disable the size limit.
+
+		nQueue (int, optional) : The number of decoded chunks that may wait
+			for the consumer before the reader blocks.
+
+	Returns: iterator of (dict, list)
+		Each item is a stream header followed by a list of dataset objects
+		containing only the records in the chunk.  Stream-level datasets that
+		are not indexed by record are repeated in each chunk.
+
+	Raises:
+		das2.Error : If the stream can not be read.  Chunks yielded before
+			the error are still valid.
+
+	Example:
+
+		>>> for (dHdr, lDs) in das2.iter_file('big.d2s', rMegaBytes=64):
+		...     for ds in lDs: process(ds)
+	"""
+	(nRecs, nBytes) = _chunk_args(nRecs, rMegaBytes)
+	with FileFeed(sFileName) as sPath:
+		for tChunk in _iter_raw(_das2.read_file_cb, (sPath, nRecs, nBytes), nQueue):
+			yield tChunk
+
+def iter_http(sUrl, nRecs=0, rMegaBytes=16.0, rTimeOut=3.0, sAgent=None, nQueue=2):
+	# type: (str, int, float, float, str, int) -> Iterator[Tuple[dict, list]]
+	"""Issue an HTTP GET command to a remote server and yield datasets a chunk
+	at a time while the download is still in progress.
+
+	Args:
+		sUrl (str) : The URL, see read_http()
+
+		nRecs (int, optional) : See iter_file()
+
+		rMegaBytes (float, optional) : See iter_file()
+
+		rTimeOut (float) : The maximum amount of time to wait in seconds for the
+			TCP/IP connection to be established, see read_http()
+
+		sAgent (str, options) : The user-agent string to set in the HTTP/HTTPs
+			header.
+
+		nQueue (int, optional) : See iter_file()
+
+	Returns: iterator of (dict, list)
+		See iter_file()
+	"""
+	(nRecs, nBytes) = _chunk_args(nRecs, rMegaBytes)
+	if sAgent:
+		tArgs = (sUrl, nRecs, nBytes, rTimeOut, sAgent)
+	else:
+		tArgs = (sUrl, nRecs, nBytes, rTimeOut)
+	return _iter_raw(_das2.read_server_cb, tArgs, nQueue)
+
+def iter_cmd(sCmd, nRecs=0, rMegaBytes=16.0, nQueue=2):
+	# type: (str, int, float, int) -> Iterator[Tuple[dict, list]]
+	"""Run a das2 reader command line and yield datasets a chunk at a time
+
+	Args:
+		sCmd (str) : The command line to run, see read_cmd()
+
+		nRecs (int, optional) : See iter_file()
+
+		rMegaBytes (float, optional) : See iter_file()
+
+		nQueue (int, optional) : See iter_file()
+
+	Returns: iterator of (dict, list)
+		See iter_file()
+	"""
+	(nRecs, nBytes) = _chunk_args(nRecs, rMegaBytes)
+	return _iter_raw(_das2.read_cmd_cb, (sCmd, nRecs, nBytes), nQueue)
+
 g_sDefDas2SrcTag = 'tag:das2.org,2012:'
 
 # ########################################################################### #
@@ -198,6 +363,10 @@ def get_node(sPathId, sUrl=None):
 		describe one of these object types or can't be read then None is
 		returned.
 
+	If the node cache is enabled (see set_node_cache()) definitions are
+	served from disk and only revalidated with the server once they are older
+	than the cache's maximum age.
+
 	Examples:
 
 		Load an http stream source for a das2 Voyager dataset:
@@ -256,10 +425,10 @@ def get_node(sPathId, sUrl=None):
 		# The result is sub-optimal and should be updated if time permits by
 		# creating a C pyNode object.
 
-		dDef = _das2.get_node(sPathId, None, sUrl)
+		dDef = _get_def(sPathId, sUrl)
 		bGlobal = DETACHED
 	else:
-		dDef = _das2.get_node(sPathId)
+		dDef = _get_def(sPathId)
 		bGlobal = GLOBAL
 
 	if dDef == None: return None
@@ -347,7 +516,35 @@ def get_catalog(sPathId=None, sUrl=None):
 		                   node.__class__.__name__, node['_url']))
 
 	return node
-	
+
+# ########################################################################### #
+def crawl(sPathId=None, sUrl=None, depth=None, workers=8):
+	"""Load a catalog and everything below it using concurrent downloads.
+
+	This is a short cut for get_catalog(sPathId, sUrl).prefetch(depth, workers),
+	see Catalog.prefetch() for details.
+
+	Args:
+		sPathId (str, optional) : The path URI of the top catalog, see
+			get_catalog()
+
+		sUrl (str,optional) : A direct load URL for the top catalog
+
+		depth (int, optional) : How many levels to expand, defaults to all
+
+		workers (int, optional) : The maximum number of simultaneous downloads
+
+	Returns: (dict, dict)
+		A path URI to node type index and download statistics.
+
+	Example:
+
+		>>> (dIndex, dStats) = das2.crawl('site:/uiowa/cassini')
+		>>> print("%d nodes in %.1f s"%(dStats['nodes'], dStats['seconds']))
+	"""
+	cat = get_catalog(sPathId, sUrl)
+	return cat.prefetch(depth, workers)
+
 # ########################################################################### #
 #
 # Need to think this through, I don't like the implication that sampling a 
@@ -0,0 +1,894 @@
+# The MIT License
+#
+# Copyright 2024 Chris Piker
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""On-disk cache of decoded das2 stream reads
+
+Each cache entry holds the raw (header, datasets) tuple produced by one of the
+_das2.read_* functions.  Arrays are stored in a single .npz file per entry,
+everything else is stored as JSON inside the same file.  Entries are named by
+the SHA-256 hash of a normalized query description so the directory is
+content addressed.
+
+An in-memory IntervalCache is also provided for time series sources.  It
+remembers which time ranges have already been read for a query and only the
+uncovered gaps are requested from the server.
+
+Catalog node definitions are held by a separate NodeCache as one JSON file per
+node.  They are revalidated against the server using the HTTP ETag and
+Last-Modified headers, or not at all in offline mode.
+"""
+
+import os
+import os.path
+import sys
+import json
+import time
+import hashlib
+import threading
+
+# Modules that moved from python2 to python3
+try:
+	from urllib.request import Request, urlopen
+	from urllib.error import HTTPError, URLError
+except ImportError:
+	from urllib2 import Request, urlopen, HTTPError, URLError
+
+import numpy
+
+import _das2
+from . util import CatalogError
+
+from . dastime import DasTime
+from . dataset import RaggedVariable, _ds_subset
+
+perr = sys.stderr.write
+
+g_nDefMaxBytes = 2*1024*1024*1024
+g_rDefTtl      = 7*86400.0
+g_sMetaKey     = '__meta__'
+g_nDefMemBytes = 512*1024*1024
+g_rDefMaxAge   = 3600.0
+
+def _defCacheDir(sSub='streams'):
+	sBase = os.getenv('XDG_CACHE_HOME')
+	if not sBase:
+		sHome = os.getenv('HOME')
+		if sHome == None: sHome = os.getenv('USERPROFILE')
+		if sHome == None:
+			raise EnvironmentError("Can't find account home directory")
+		sBase = os.path.join(sHome, '.cache')
+
+	return os.path.join(sBase, 'das2py', sSub)
+
+def _jsonable(obj):
+	# Header and dataset dictionaries hold tuples and numpy scalars
+	if isinstance(obj, numpy.generic): return obj.item()
+	raise TypeError("%s is not JSON serializable"%type(obj).__name__)
+
+def cache_key(dKey):
+	"""Get a cache key for a query description.
+
+	Args:
+		dKey (dict) : Any JSON compatible dictionary that uniquely describes a
+			stream read, for example {'url':sUrl}.  Key order does not matter.
+
+	Returns: str
+		A hex digest usable as a cache entry name.
+	"""
+	sKey = json.dumps(dKey, sort_keys=True, default=str, separators=(',',':'))
+	return hashlib.sha256(sKey.encode('utf-8')).hexdigest()
+
+# ########################################################################### #
+
+class StreamCache(object):
+	"""A size-bounded, least recently used, disk cache of stream reads.
+
+	Entries expire after a time-to-live and the least recently read entries
+	are removed once the total cache size exceeds the limit.  Instances may be
+	shared between threads.
+
+	Members:
+		- .dir - The cache directory
+		- .max_bytes - The total size limit in bytes
+		- .ttl - Entry lifetime in seconds, 0 or None to never expire
+	"""
+
+	def __init__(self, sDir=None, nMaxBytes=g_nDefMaxBytes, rTtl=g_rDefTtl):
+		"""Open (or create) a stream cache
+
+		Args:
+			sDir (str, optional) : The cache directory, defaults to
+				$XDG_CACHE_HOME/das2py/streams or $HOME/.cache/das2py/streams
+
+			nMaxBytes (int, optional) : The maximum total size of all entries
+
+			rTtl (float, optional) : Entries older than this many seconds are
+				not used.
+		"""
+		if sDir == None: sDir = _defCacheDir()
+		self.dir = sDir
+		self.max_bytes = nMaxBytes
+		self.ttl = rTtl
+		self._lock = threading.Lock()
+
+		if not os.path.isdir(sDir): os.makedirs(sDir)
+
+	def _path(self, sKey):
+		return os.path.join(self.dir, sKey[:2], "%s.npz"%sKey)
+
+	def get(self, sKey):
+		"""Get a cached stream read
+
+		Args:
+			sKey (str) : A key as returned by cache_key()
+
+		Returns: (dict, list) or None
+			The raw stream header and list of raw datasets in the same form as
+			returned by _das2.read_server, or None if there is no valid entry.
+		"""
+		sPath = self._path(sKey)
+		try:
+			with numpy.load(sPath, allow_pickle=False) as npz:
+				dMeta = json.loads(npz[g_sMetaKey].tobytes().decode('utf-8'))
+
+				if self.ttl and (time.time() - dMeta['created'] > self.ttl):
+					self._remove(sPath)
+					return None
+
+				lDs = []
+				for i, dDs in enumerate(dMeta['datasets']):
+					dDs['arrays'] = {}
+					for sAry in dDs.pop('_arrays'):
+						dDs['arrays'][sAry] = npz["%d/%s"%(i, sAry)]
+					for sAry in dDs.pop('_text'):
+						aText = dDs['arrays'][sAry].astype(object)
+						aText[aText == ''] = None
+						dDs['arrays'][sAry] = aText
+					dDs['offsets'] = {}
+					for sAry in dDs.pop('_offsets'):
+						dDs['offsets'][sAry] = npz["%d/offsets/%s"%(i, sAry)]
+					lDs.append(dDs)
+
+		except (IOError, OSError):
+			return None
+		except (ValueError, KeyError) as e:
+			perr("Removing damaged cache entry %s, %s\n"%(sPath, str(e)))
+			self._remove(sPath)
+			return None
+
+		# Mark as recently used for LRU eviction
+		try:
+			os.utime(sPath, None)
+		except OSError:
+			pass
+
+		dHdr = dMeta['header']
+		if 'props' in dHdr:
+			dHdr['props'] = {k: tuple(v) for (k,v) in dHdr['props'].items()}
+		for dDs in lDs: _propsToTuple(dDs)
+
+		return (dHdr, lDs)
+
+	def put(self, sKey, dHdr, lDs):
+		"""Save a stream read in the cache
+
+		Must be called before the raw datasets are handed to ds_from_raw,
+		which modifies them.
+
+		Args:
+			sKey (str) : A key as returned by cache_key()
+
+			dHdr (dict) : The raw stream header
+
+			lDs (list) : The raw dataset dictionaries
+		"""
+		dArrays = {}
+		lMeta = []
+		for i, dDs in enumerate(lDs):
+			dMeta = {k:v for (k,v) in dDs.items() if k not in ('arrays','offsets')}
+			dMeta['_arrays'] = []
+			dMeta['_text'] = []
+			dMeta['_offsets'] = []
+
+			for (sAry, aVals) in dDs['arrays'].items():
+				aVals = numpy.ma.getdata(aVals)
+				if aVals.dtype == object:
+					aVals = numpy.array(
+						['' if v is None else str(v) for v in aVals.ravel()]
+					).reshape(aVals.shape)
+					dMeta['_text'].append(sAry)
+				dArrays["%d/%s"%(i, sAry)] = aVals
+				dMeta['_arrays'].append(sAry)
+
+			for (sAry, aOffs) in dDs.get('offsets', {}).items():
+				dArrays["%d/offsets/%s"%(i, sAry)] = aOffs
+				dMeta['_offsets'].append(sAry)
+
+			lMeta.append(dMeta)
+
+		dMeta = {'created':time.time(), 'header':dHdr, 'datasets':lMeta}
+		sMeta = json.dumps(dMeta, default=_jsonable)
+		dArrays[g_sMetaKey] = numpy.frombuffer(sMeta.encode('utf-8'), dtype=numpy.uint8)
+
+		sPath = self._path(sKey)
+		sDir = os.path.dirname(sPath)
+		if not os.path.isdir(sDir): os.makedirs(sDir, exist_ok=True)
+
+		# Write then rename so that readers never see partial entries
+		sTmp = "%s.%d.%d.tmp"%(sPath, os.getpid(), threading.get_ident())
+		try:
+			with open(sTmp, 'wb') as fOut:
+				numpy.savez(fOut, **dArrays)
+			os.replace(sTmp, sPath)
+		except (IOError, OSError) as e:
+			perr("Could not write cache entry %s, %s\n"%(sPath, str(e)))
+			self._remove(sTmp)
+			return
+
+		self.evict()
+
+	def _remove(self, sPath):
+		try:
+			os.remove(sPath)
+		except OSError:
+			pass
+
+	def _entries(self):
+		# List of (mtime, size, path) for all entries
+		lOut = []
+		for sSub in os.listdir(self.dir):
+			sSubDir = os.path.join(self.dir, sSub)
+			if not os.path.isdir(sSubDir): continue
+			for sName in os.listdir(sSubDir):
+				if not sName.endswith('.npz'): continue
+				sPath = os.path.join(sSubDir, sName)
+				try:
+					st = os.stat(sPath)
+				except OSError:
+					continue
+				lOut.append((st.st_mtime, st.st_size, sPath))
+		return lOut
+
+	def size(self):
+		"""Get the total size of all cache entries in bytes"""
+		return sum(t[1] for t in self._entries())
+
+	def evict(self):
+		"""Remove least recently used entries until the cache is within it's
+		size limit.
+
+		Returns: int
+			The number of entries removed
+		"""
+		if not self.max_bytes: return 0
+
+		with self._lock:
+			lEntries = self._entries()
+			nTotal = sum(t[1] for t in lEntries)
+			if nTotal <= self.max_bytes: return 0
+
+			lEntries.sort()
+			nRemoved = 0
+			for (rTime, nSize, sPath) in lEntries:
+				if nTotal <= self.max_bytes: break
+				self._remove(sPath)
+				nTotal -= nSize
+				nRemoved += 1
+
+		return nRemoved
+
+	def clear(self):
+		"""Remove all cache entries"""
+		with self._lock:
+			for (rTime, nSize, sPath) in self._entries():
+				self._remove(sPath)
+
+def _propsToTuple(dItem):
+	# JSON turns property tuples into lists, mk_prop_from_raw doesn't care
+	# but keep the raw form identical to the C module output anyway
+	for sKey in ('props',):
+		if sKey in dItem:
+			dItem[sKey] = {k: tuple(v) for (k,v) in dItem[sKey].items()}
+
+	for sSection in ('coords', 'data'):
+		for dDim in dItem.get(sSection, {}).values():
+			_propsToTuple(dDim)
+
+# ########################################################################### #
+# Time interval cache
+
+def _time64(value):
+	# Convert a query time to a numpy datetime64 in nanoseconds
+	if isinstance(value, numpy.datetime64): return value.astype('M8[ns]')
+	return numpy.datetime64(DasTime(str(value)).isoc(6), 'ns')
+
+def _recTimes(ds, sDim):
+	# Get the time of each record (first index) in a dataset, or None if
+	# the dataset has no time values that vary with the first index
+	if sDim not in ds.dCoord: return None
+	dim = ds.dCoord[sDim]
+	for sRole in ('reference', 'center', 'min'):
+		if sRole in dim.vars: break
+	else:
+		return None
+
+	var = dim.vars[sRole]
+	if (len(var.unique) == 0) or (not var.unique[0]): return None
+	if var.array.dtype.kind != 'M': return None
+
+	tIdx = (slice(None, None, None),) + (0,)*(len(var.unique) - 1)
+	return numpy.ma.getdata(var.array[tIdx])
+
+def _trimDs(ds, t0, t1, sDim):
+	# Sub-set a dataset to records in [t0, t1), records are assumed to be in
+	# time order.  Datasets without a time coordinate are returned as is.
+	aTime = _recTimes(ds, sDim)
+	if aTime is None: return ds
+
+	i0 = int(numpy.searchsorted(aTime, t0, 'left'))
+	i1 = int(numpy.searchsorted(aTime, t1, 'left'))
+	if (i0 == 0) and (i1 == len(aTime)): return ds
+	return _ds_subset(ds, (slice(i0, i1),))
+
+def _dsBytes(ds):
+	# Memory used by the non-degenerate values of a dataset
+	nBytes = 0
+	for dDims in (ds.dCoord, ds.dData):
+		for dim in dDims.values():
+			for var in dim.vars.values():
+				if isinstance(var, RaggedVariable) and (var.ragged is not None):
+					nBytes += var.ragged.nbytes
+				else:
+					nBytes += var.array[var.uniIndex()].nbytes
+	return nBytes
+
+class _Piece(object):
+	# One contiguous time range held by the interval cache
+	__slots__ = ('beg', 'end', 'header', 'datasets', 'nbytes', 'used')
+
+	def __init__(self, beg, end, dHdr, lDs, nUsed):
+		self.beg = beg
+		self.end = end
+		self.header = dHdr
+		self.datasets = lDs
+		self.nbytes = sum(_dsBytes(ds) for ds in lDs)
+		self.used = nUsed
+
+class IntervalCache(object):
+	"""A size-bounded, in-memory cache of time series query results.
+
+	Results are stored by query (source plus all non-time parameters,
+	including the resolution) together with the time range that was
+	requested.  A later query for any sub-range of the held intervals is
+	answered from memory and a query that only partially overlaps needs just
+	the uncovered gaps from the server.  Instances may be shared between
+	threads.
+
+	Members:
+		- .max_bytes - The total size limit in bytes
+		- .hits - Requests answered entirely from memory
+		- .partial - Requests that needed some gaps from the server
+		- .misses - Requests with no overlap with the cache
+		- .bytes_saved - Dataset bytes answered from memory
+		- .bytes_fetched - Dataset bytes downloaded to fill gaps
+	"""
+
+	def __init__(self, nMaxBytes=g_nDefMemBytes):
+		"""Create an empty interval cache
+
+		Args:
+			nMaxBytes (int, optional) : The maximum size of all held datasets,
+				least recently used intervals are dropped beyond this size.
+		"""
+		self.max_bytes = nMaxBytes
+		self.hits = 0
+		self.partial = 0
+		self.misses = 0
+		self.bytes_saved = 0
+		self.bytes_fetched = 0
+
+		self._dPieces = {}  # Key -> List of _Piece sorted by start time
+		self._nBytes = 0
+		self._nTick = 0
+		self._lock = threading.Lock()
+
+	def gaps(self, sKey, t0, t1):
+		"""Get the parts of a time range that are not in the cache
+
+		Calling this function updates the hit, partial and miss counters.
+
+		Args:
+			sKey (str) : A key as returned by cache_key()
+
+			t0 (datetime64) : The start of the range, inclusive
+
+			t1 (datetime64) : The end of the range, exclusive
+
+		Returns: list
+			A list of (begin, end) datetime64 tuples in time order
+		"""
+		lGaps = []
+		with self._lock:
+			tCur = t0
+			for pc in self._dPieces.get(sKey, []):
+				if pc.end <= tCur: continue
+				if pc.beg >= t1: break
+				if pc.beg > tCur: lGaps.append((tCur, pc.beg))
+				tCur = max(tCur, pc.end)
+				if tCur >= t1: break
+			if tCur < t1: lGaps.append((tCur, t1))
+
+			if len(lGaps) == 0: self.hits += 1
+			elif (lGaps[0][0] == t0) and (lGaps[0][1] == t1): self.misses += 1
+			else: self.partial += 1
+
+		return lGaps
+
+	def add(self, sKey, t0, t1, dHdr, lDs):
+		"""Save the result of a query over a time range
+
+		Args:
+			sKey (str) : A key as returned by cache_key()
+
+			t0 (datetime64) : The start of the queried range, inclusive
+
+			t1 (datetime64) : The end of the queried range, exclusive
+
+			dHdr (dict) : The stream header
+
+			lDs (list) : The Dataset objects returned for the range
+
+		Returns: object
+			An opaque handle for the new interval, see serve()
+		"""
+		with self._lock:
+			self._nTick += 1
+			pc = _Piece(t0, t1, dHdr, lDs, self._nTick)
+			self.bytes_fetched += pc.nbytes
+			self._nBytes += pc.nbytes
+
+			lPieces = self._dPieces.setdefault(sKey, [])
+			lPieces.append(pc)
+			lPieces.sort(key=lambda pc: pc.beg)
+
+		return pc
+
+	def serve(self, sKey, t0, t1, sDim='time', lFresh=()):
+		"""Get the cached datasets for a time range
+
+		Records outside the range are trimmed off.  Where held intervals
+		overlap, records are taken from the earliest interval.  Least recently
+		used intervals are evicted after the output is gathered, so call this
+		after add() even if the cache is smaller than one query.
+
+		Args:
+			sKey (str) : A key as returned by cache_key()
+
+			t0 (datetime64) : The start of the range, inclusive
+
+			t1 (datetime64) : The end of the range, exclusive
+
+			sDim (str, optional) : The name of the time coordinate dimension
+
+			lFresh (list, optional) : Handles from add() for intervals that were
+				just downloaded.  These don't count towards .bytes_saved.
+
+		Returns: list
+			A list of (header, datasets) tuples, one for each interval that
+			contributes to the range, in time order.
+		"""
+		with self._lock:
+			self._nTick += 1
+			lUse = []
+			tCur = t0
+			for pc in self._dPieces.get(sKey, []):
+				if pc.end <= tCur: continue
+				if pc.beg >= t1: break
+				lUse.append((pc, tCur, min(t1, pc.end)))
+				pc.used = self._nTick
+				tCur = min(t1, pc.end)
+				if tCur >= t1: break
+
+		lOut = []
+		for (pc, tBeg, tEnd) in lUse:
+			lDs = [_trimDs(ds, tBeg, tEnd, sDim) for ds in pc.datasets]
+			if not any(pc is pcFresh for pcFresh in lFresh):
+				nSaved = sum(_dsBytes(ds) for ds in lDs)
+				with self._lock: self.bytes_saved += nSaved
+			lOut.append((pc.header, lDs))
+
+		self.evict()
+		return lOut
+
+	def size(self):
+		"""Get the total size of all held datasets in bytes"""
+		return self._nBytes
+
+	def evict(self):
+		"""Drop least recently used intervals until the cache is within it's
+		size limit.
+
+		Returns: int
+			The number of intervals removed
+		"""
+		if not self.max_bytes: return 0
+
+		nRemoved = 0
+		with self._lock:
+			if self._nBytes <= self.max_bytes: return 0
+
+			lAll = [(pc.used, id(pc), sKey, pc) for (sKey, lPieces) in
+			        self._dPieces.items() for pc in lPieces]
+			lAll.sort(key=lambda t: t[:2])
+			for (nUsed, nId, sKey, pc) in lAll:
+				if self._nBytes <= self.max_bytes: break
+				self._dPieces[sKey].remove(pc)
+				if len(self._dPieces[sKey]) == 0: del self._dPieces[sKey]
+				self._nBytes -= pc.nbytes
+				nRemoved += 1
+
+		return nRemoved
+
+	def stats(self):
+		"""Get the cache counters as a dictionary"""
+		with self._lock:
+			return {
+				'hits':self.hits, 'partial':self.partial, 'misses':self.misses,
+				'bytes_saved':self.bytes_saved, 'bytes_fetched':self.bytes_fetched,
+				'bytes':self._nBytes,
+				'intervals':sum(len(l) for l in self._dPieces.values())
+			}
+
+	def clear(self):
+		"""Drop all held intervals, counters are not reset"""
+		with self._lock:
+			self._dPieces = {}
+			self._nBytes = 0
+
+# ########################################################################### #
+# Catalog node cache
+
+def _http_node(sPathId, lUrls, sAgent=None, rTimeOut=10.0):
+	"""Download a JSON node definition without going through the C catalog
+	tree.  Unlike _das2.get_node() this releases the GIL while waiting on the
+	network, so many nodes may be downloaded at once.
+
+	Args:
+		sPathId (str) : The full path URI of the node
+
+		lUrls (list) : Locations to try in order
+
+		sAgent (str, optional) : The HTTP User-Agent
+
+		rTimeOut (float, optional) : Connection timeout in seconds
+
+	Returns: (dict, str, str)
+		The node definition in the same format as _das2.get_node(), plus the
+		ETag and Last-Modified header values, which may be None.
+
+	Raises:
+		_das2.Error : If the node could not be read from any location
+	"""
+	dHdrs = {}
+	if sAgent: dHdrs['User-Agent'] = sAgent
+
+	lErrs = []
+	for sUrl in lUrls:
+		try:
+			with urlopen(Request(sUrl, headers=dHdrs), timeout=rTimeOut) as fIn:
+				dDef = json.loads(fIn.read().decode('utf-8'))
+				sEtag = fIn.headers.get('ETag')
+				sModified = fIn.headers.get('Last-Modified')
+		except (HTTPError, URLError, IOError, OSError, ValueError) as e:
+			lErrs.append("%s, %s"%(sUrl, str(e)))
+			continue
+
+		dDef['_url'] = sUrl
+		dDef['_path'] = sPathId
+		return (dDef, sEtag, sModified)
+
+	raise _das2.Error("Couldn't download node %s: %s"%(sPathId, "; ".join(lErrs)))
+
+class NodeCache(object):
+	"""An on-disk cache of catalog node definitions.
+
+	Nodes are keyed by thier path URI and, for detached nodes, the URL they
+	were loaded from.  Entries younger than the maximum age are used without
+	any network traffic.  Older entries are revalidated with a conditional
+	HTTP GET (If-None-Match / If-Modified-Since) and are only re-downloaded
+	if the server says they changed.  If the server can't be reached, stale
+	entries are used anyway.  Instances may be shared between threads.
+
+	Members:
+		- .dir - The cache directory
+		- .max_age - Seconds before an entry is revalidated
+		- .offline - If True, never contact a server, only cached nodes are
+		     available.
+		- .hits - Nodes answered from the cache, including revalidated ones
+		- .misses - Nodes that had to be downloaded in full
+		- .revalidated - Conditional requests sent to servers
+	"""
+
+	def __init__(self, sDir=None, rMaxAge=g_rDefMaxAge, bOffline=False, sAgent=None):
+		"""Open (or create) a catalog node cache
+
+		Args:
+			sDir (str, optional) : The cache directory, defaults to
+				$XDG_CACHE_HOME/das2py/nodes or $HOME/.cache/das2py/nodes
+
+			rMaxAge (float, optional) : Entries are used without checking the
+				server for this many seconds.
+
+			bOffline (bool, optional) : Never contact a server
+
+			sAgent (str, optional) : The HTTP User-Agent for revalidation
+		"""
+		if sDir == None: sDir = _defCacheDir('nodes')
+		self.dir = sDir
+		self.max_age = rMaxAge
+		self.offline = bOffline
+		self.agent = sAgent
+		self.hits = 0
+		self.misses = 0
+		self.revalidated = 0
+		self._lock = threading.Lock()
+
+		if not os.path.isdir(sDir): os.makedirs(sDir)
+
+	def _path(self, sPathId, sUrl):
+		sKey = cache_key({'path':sPathId, 'url':sUrl})
+		return os.path.join(self.dir, "%s.json"%sKey)
+
+	def _read(self, sFile):
+		try:
+			with open(sFile, 'r') as fIn:
+				return json.load(fIn)
+		except (IOError, OSError):
+			return None
+		except ValueError as e:
+			perr("Removing damaged node cache entry %s, %s\n"%(sFile, str(e)))
+			try:
+				os.remove(sFile)
+			except OSError:
+				pass
+			return None
+
+	def _write(self, sFile, dEntry):
+		sTmp = "%s.%d.%d.tmp"%(sFile, os.getpid(), threading.get_ident())
+		try:
+			with open(sTmp, 'w') as fOut:
+				json.dump(dEntry, fOut)
+			os.replace(sTmp, sFile)
+		except (IOError, OSError) as e:
+			perr("Could not write node cache entry %s, %s\n"%(sFile, str(e)))
+
+	def _count(self, sCounter):
+		with self._lock:
+			setattr(self, sCounter, getattr(self, sCounter) + 1)
+
+	def _revalidate(self, dEntry):
+		# Send a conditional GET for a cached node.  Returns (bChanged, dDef)
+		# where dDef is the new definition if the node changed.
+		dHdrs = {}
+		if self.agent: dHdrs['User-Agent'] = self.agent
+		if dEntry.get('etag'): dHdrs['If-None-Match'] = dEntry['etag']
+		if dEntry.get('modified'): dHdrs['If-Modified-Since'] = dEntry['modified']
+
+		self._count('revalidated')
+		try:
+			fIn = urlopen(Request(dEntry['url'], headers=dHdrs), timeout=10.0)
+		except HTTPError as e:
+			if e.code == 304: return (False, None)
+			raise
+
+		with fIn:
+			sEtag = fIn.headers.get('ETag')
+			sModified = fIn.headers.get('Last-Modified')
+
+			# File URLs and some servers never answer 304, compare validators
+			if (sEtag and sEtag == dEntry.get('etag')) or \
+			   ((not sEtag) and sModified and sModified == dEntry.get('modified')):
+				return (False, None)
+
+			dDef = json.loads(fIn.read().decode('utf-8'))
+
+		dDef['_url'] = dEntry['url']
+		dDef['_path'] = dEntry['node']['_path']
+		dEntry['etag'] = sEtag
+		dEntry['modified'] = sModified
+		return (True, dDef)
+
+	def get(self, sPathId, sUrl=None, sAgent=None, lUrls=None):
+		"""Get a node definition, from the cache if possible.
+
+		Args:
+			sPathId (str) : The full path URI of the node
+
+			sUrl (str, optional) : Load the node directly from this URL instead
+				of looking it up in the global catalog.
+
+			sAgent (str, optional) : HTTP User-Agent for the catalog lookup
+
+			lUrls (list, optional) : On a cache miss, try downloading from these
+				locations with _http_node() before falling back to the C
+				catalog lookup.
+
+		Returns: dict
+			The node definition in the same format as _das2.get_node()
+
+		Raises:
+			CatalogError : If running offline and the node is not cached
+			_das2.Error : If the node could not be loaded
+		"""
+		sFile = self._path(sPathId, sUrl)
+		dEntry = self._read(sFile)
+
+		if dEntry != None:
+			rAge = time.time() - dEntry['checked']
+			if self.offline or (self.max_age is None) or (rAge < self.max_age):
+				self._count('hits')
+				return dEntry['node']
+
+			try:
+				(bChanged, dDef) = self._revalidate(dEntry)
+			except (HTTPError, URLError, IOError, OSError, ValueError) as e:
+				perr("Using stale catalog entry for %s, %s\n"%(sPathId, str(e)))
+				self._count('hits')
+				return dEntry['node']
+
+			dEntry['checked'] = time.time()
+			if bChanged: dEntry['node'] = dDef
+			self._write(sFile, dEntry)
+			self._count('misses' if bChanged else 'hits')
+			return dEntry['node']
+
+		if self.offline:
+			raise CatalogError(sUrl, "Node %s is not in the catalog cache and "
+			                   "offline mode is on"%sPathId)
+
+		(dDef, sEtag, sModified) = (None, None, None)
+		if lUrls:
+			try:
+				(dDef, sEtag, sModified) = _http_node(sPathId, lUrls, sAgent or self.agent)
+			except _das2.Error:
+				pass
+
+		# Without validators the first revalidation fetches them
+		if dDef == None:
+			if sUrl: dDef = _das2.get_node(sPathId, sAgent, sUrl)
+			else: dDef = _das2.get_node(sPathId, sAgent)
+		self._count('misses')
+
+		if (dDef != None) and (dDef.get('_url') != None):
+			dEntry = {'checked':time.time(), 'url':dDef['_url'], 'etag':sEtag,
+			          'modified':sModified, 'node':dDef}
+			self._write(sFile, dEntry)
+
+		return dDef
+
+	def clear(self):
+		"""Remove all cached nodes"""
+		for sName in os.listdir(self.dir):
+			if sName.endswith('.json'):
+				try:
+					os.remove(os.path.join(self.dir, sName))
+				except OSError:
+					pass
+
+# ########################################################################### #
+# The process wide caches
+
+g_cache = None
+g_icache = None
+g_ncache = None
+
+def set_cache(sDir=None, nMaxBytes=g_nDefMaxBytes, rTtl=g_rDefTtl):
+	"""Turn on caching of stream reads for das2.read_http and HttpStreamSrc
+	queries.
+
+	Caching is off by default.  Once enabled, individual reads may still skip
+	the cache by passing cache=False.
+
+	Args:
+		sDir (str, optional) : The cache directory, see StreamCache
+
+		nMaxBytes (int, optional) : The cache size limit in bytes
+
+		rTtl (float, optional) : Entry lifetime in seconds
+
+	Returns: StreamCache
+		The new process wide cache
+	"""
+	global g_cache
+	g_cache = StreamCache(sDir, nMaxBytes, rTtl)
+	return g_cache
+
+def get_cache():
+	"""Get the process wide stream cache, or None if caching is off"""
+	return g_cache
+
+def set_interval_cache(nMaxBytes=g_nDefMemBytes):
+	"""Turn on in-memory caching of time ranges for HttpStreamSrc queries.
+
+	Once enabled, HttpStreamSrc.get() only downloads the parts of a requested
+	time range that have not already been read with the same options.  The
+	stream cache (see set_cache()) may be used as well, it then holds the
+	downloaded gaps.
+
+	Args:
+		nMaxBytes (int, optional) : The memory limit for held datasets
+
+	Returns: IntervalCache
+		The new process wide interval cache
+	"""
+	global g_icache
+	g_icache = IntervalCache(nMaxBytes)
+	return g_icache
+
+def get_interval_cache():
+	"""Get the process wide interval cache, or None if it is off"""
+	return g_icache
+
+def set_node_cache(sDir=None, rMaxAge=g_rDefMaxAge, bOffline=False, sAgent=None):
+	"""Turn on disk caching of catalog nodes for das2.get_node() and stub
+	loading.
+
+	With the cache on, walking a catalog a second time, even from a new
+	process, only needs a conditional request per node once entries are older
+	than rMaxAge, and none at all before then.
+
+	Args:
+		sDir (str, optional) : The cache directory, see NodeCache
+
+		rMaxAge (float, optional) : Seconds before entries are revalidated
+
+		bOffline (bool, optional) : Only use cached nodes, never contact a
+			server.
+
+		sAgent (str, optional) : The HTTP User-Agent for revalidation
+
+	Returns: NodeCache
+		The new process wide node cache
+	"""
+	global g_ncache
+	g_ncache = NodeCache(sDir, rMaxAge, bOffline, sAgent)
+	return g_ncache
+
+def get_node_cache():
+	"""Get the process wide node cache, or None if it is off"""
+	return g_ncache
+
+def clear_cache(bDisable=False):
+	"""Remove all entries from the process wide stream, interval and node
+	caches
+
+	Args:
+		bDisable (bool, optional) : If True, also turn caching off
+	"""
+	global g_cache, g_icache, g_ncache
+	if g_cache != None: g_cache.clear()
+	if g_icache != None: g_icache.clear()
+	if g_ncache != None: g_ncache.clear()
+	if bDisable:
+		g_cache = None
+		g_icache = None
+		g_ncache = None
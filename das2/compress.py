@@ -0,0 +1,402 @@
+# The MIT License
+#
+# Copyright 2024 Chris Piker
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Streaming decompression of gzip and zstd compressed das streams
+
+Compressed input is recognized by its leading magic bytes, or for HTTP
+responses by the Content-Encoding header, and is decoded a chunk at a time
+as it's read so memory use does not depend on the stream size.  zstd
+support requires either Python 3.14 or the zstandard package.
+"""
+
+import os
+import io
+import zlib
+import queue
+import tempfile
+import threading
+
+try:
+	from compression import zstd as _zstd  # Python 3.14 and later
+except ImportError:
+	try:
+		import zstandard as _zstd
+	except ImportError:
+		_zstd = None
+
+# Leading bytes of each compressed format
+g_dMagic = {
+	b'\x1f\x8b': 'gzip',
+	b'\x28\xb5\x2f\xfd': 'zstd'
+}
+
+# HTTP Content-Encoding values and the formats they select
+g_dEncodings = {
+	'gzip':'gzip', 'x-gzip':'gzip', 'deflate':'deflate', 'zstd':'zstd',
+	'identity':None, 'none':None
+}
+
+# Size of each compressed read, also the largest decoded block held back
+g_nChunk = 256*1024
+
+# Decoded chunks prepared in the background, see _ReadAhead
+g_nAhead = 1024*1024
+g_nAheadChunks = 4
+
+def sniff_compression(xHead):
+	"""Get the compression format from the first few bytes of a stream
+
+	Args:
+		xHead (bytes) : At least the first four bytes of the stream
+
+	Returns (str): 'gzip', 'zstd' or None if the bytes don't start with a
+		known compression signature.
+	"""
+	for (xMagic, sFmt) in g_dMagic.items():
+		if xHead[:len(xMagic)] == xMagic: return sFmt
+	return None
+
+def accept_encodings():
+	"""The HTTP Content-Encoding values that decompress() can handle
+
+	Returns (list): Encoding names suitable for an Accept-Encoding header
+	"""
+	lEnc = ['gzip', 'deflate']
+	if _zstd: lEnc.insert(0, 'zstd')
+	return lEnc
+
+class _Prefixed(io.RawIOBase):
+	"""Put bytes consumed while sniffing back in front of an input"""
+	def __init__(self, xHead, fIn):
+		self.xHead = xHead
+		self.fIn = fIn
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		if self.xHead:
+			n = min(len(b), len(self.xHead))
+			b[:n] = self.xHead[:n]
+			self.xHead = self.xHead[n:]
+			return n
+		x = self.fIn.read(len(b))
+		b[:len(x)] = x
+		return len(x)
+
+class _Inflate(io.RawIOBase):
+	"""Decode gzip or zlib data as it's read
+
+	Each call hands out at most the requested number of bytes, unconsumed
+	input stays in the decompressor so neither side grows past a chunk.
+	Concatenated gzip members, as made by appending to an archive, are
+	decoded one after another.  Seeking is limited to rewinding to the start,
+	and only if the compressed input is seekable.
+	"""
+	def __init__(self, fIn, nWbits):
+		self.fIn = fIn
+		self.nWbits = nWbits
+		self.dec = zlib.decompressobj(nWbits)
+		self.xIn = b''
+		self.nPos = 0
+		self.nStart = fIn.tell() if self.seekable() else None
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		fSeekable = getattr(self.fIn, 'seekable', None)
+		return bool(fSeekable and fSeekable())
+
+	def tell(self):
+		return self.nPos
+
+	def seek(self, nOffset, nWhence=io.SEEK_SET):
+		if (nWhence == io.SEEK_CUR) and (nOffset == 0):
+			return self.nPos
+		if (nWhence != io.SEEK_SET) or (nOffset not in (0, self.nPos)) or \
+		   (not self.seekable()):
+			raise io.UnsupportedOperation("Compressed streams can only be rewound")
+		if nOffset == 0:
+			self.fIn.seek(self.nStart)
+			self.dec = zlib.decompressobj(self.nWbits)
+			self.xIn = b''
+			self.nPos = 0
+		return self.nPos
+
+	def readinto(self, b):
+		while True:
+			if self.dec.eof:
+				self.xIn = self.dec.unused_data
+				if not self.xIn:
+					self.xIn = self.fIn.read(g_nChunk)
+					if not self.xIn: return 0
+				self.dec = zlib.decompressobj(self.nWbits)
+
+			if not self.xIn:
+				self.xIn = self.fIn.read(g_nChunk)
+				if not self.xIn:
+					raise ValueError("Compressed stream ended early")
+
+			try:
+				xOut = self.dec.decompress(self.xIn, len(b))
+			except zlib.error as e:
+				raise ValueError("Corrupt compressed stream, %s"%str(e))
+			self.xIn = self.dec.unconsumed_tail
+			if xOut:
+				b[:len(xOut)] = xOut
+				self.nPos += len(xOut)
+				return len(xOut)
+
+def _readAhead(dec, qChunks, evStop):
+	"""Fill the read-ahead queue, runs in a background thread"""
+	try:
+		while True:
+			buf = bytearray(g_nAhead)
+			n = dec.readinto(buf)
+			item = memoryview(buf)[:n] if n else None
+			while not evStop.is_set():
+				try:
+					qChunks.put(item, timeout=0.25)
+					break
+				except queue.Full:
+					pass
+			if (item is None) or evStop.is_set(): return
+	except Exception as e:
+		qChunks.put(e)
+
+class _ReadAhead(io.RawIOBase):
+	"""Decompress in a background thread while the caller parses
+
+	zlib releases the GIL while inflating, so this overlaps decompression
+	with packet handling.  At most g_nAheadChunks decoded chunks wait in the
+	queue, the thread blocks when the reader falls behind.
+	"""
+	def __init__(self, dec):
+		self.dec = dec
+		self.nPos = 0
+		self._start()
+
+	def _start(self):
+		self.qChunks = queue.Queue(g_nAheadChunks)
+		self.evStop = threading.Event()
+		self.view = None
+		self.bEof = False
+		# The thread must not reference self, or close() would never be
+		# called by the garbage collector
+		self.thread = threading.Thread(
+			target=_readAhead, args=(self.dec, self.qChunks, self.evStop),
+			name="das2-decompress", daemon=True
+		)
+		self.thread.start()
+
+	def _stop(self):
+		self.evStop.set()
+		while self.thread.is_alive():
+			try:
+				self.qChunks.get(timeout=0.25)
+			except queue.Empty:
+				pass
+
+	def readable(self):
+		return True
+
+	def seekable(self):
+		return self.dec.seekable()
+
+	def tell(self):
+		return self.nPos
+
+	def seek(self, nOffset, nWhence=io.SEEK_SET):
+		if (nWhence == io.SEEK_CUR) and (nOffset == 0):
+			return self.nPos
+		if (nWhence != io.SEEK_SET) or (nOffset not in (0, self.nPos)):
+			raise io.UnsupportedOperation("Compressed streams can only be rewound")
+		if nOffset == 0:
+			self._stop()
+			self.dec.seek(0)
+			self.nPos = 0
+			self._start()
+		return self.nPos
+
+	def readinto(self, b):
+		while not self.view:
+			if self.bEof: return 0
+			item = self.qChunks.get()
+			if isinstance(item, Exception):
+				self.bEof = True
+				raise item
+			if item is None:
+				self.bEof = True
+				return 0
+			self.view = item
+
+		n = min(len(b), len(self.view))
+		b[:n] = self.view[:n]
+		self.view = self.view[n:]
+		self.nPos += n
+		return n
+
+	def close(self):
+		if not self.closed: self.evStop.set()
+		super().close()
+
+def _zstdReader(fIn):
+	if _zstd is None:
+		raise ValueError(
+			"Reading zstd compressed streams requires Python 3.14 or the "+\
+			"zstandard package"
+		)
+	if hasattr(_zstd, 'ZstdFile'):
+		return _zstd.ZstdFile(fIn, 'rb')
+	return _zstd.ZstdDecompressor().stream_reader(
+		fIn, read_size=g_nChunk, read_across_frames=True
+	)
+
+def decompress(fIn, encoding=None):
+	"""Decode compressed input transparently
+
+	Args:
+		fIn (file) : A binary input stream.  Objects with a peek() method,
+			such as files opened in 'rb' mode and HTTP responses, are
+			sniffed without consuming any input.
+
+		encoding (str, optional) : The compression format, one of the
+			Content-Encoding names in g_dEncodings.  If not given, the
+			Content-Encoding header of HTTP responses is used for 'deflate'
+			streams, which have no reliable magic bytes.  gzip and zstd
+			input is always recognized by its magic bytes.
+
+	Returns (file):
+		fIn itself if the input is not compressed, otherwise a readable
+		binary file object that yields the decompressed bytes.
+
+	Raises:
+		ValueError : If the encoding is not supported
+	"""
+	if encoding == None:
+		headers = getattr(fIn, 'headers', None)
+		if headers != None:
+			encoding = headers.get('Content-Encoding')
+
+	sFmt = None
+	if encoding:
+		sEnc = encoding.strip().lower()
+		if sEnc not in g_dEncodings:
+			raise ValueError("Unsupported stream encoding '%s'"%encoding)
+		sFmt = g_dEncodings[sEnc]
+
+	# Trust the data over the label for the formats that have magic bytes,
+	# some servers and proxies decode content without removing the header
+	if hasattr(fIn, 'peek'):
+		xHead = fIn.peek(4)[:4]
+	else:
+		xHead = fIn.read(4)
+		fIn = _Prefixed(xHead, fIn)
+
+	sMagic = sniff_compression(xHead)
+	if sMagic or (sFmt != 'deflate'): sFmt = sMagic
+
+	if sFmt == None:
+		return fIn
+	if sFmt == 'zstd':
+		return _zstdReader(fIn)
+
+	# Automatic header detection handles both zlib and gzip wrapped data
+	return io.BufferedReader(_ReadAhead(_Inflate(fIn, 32 + zlib.MAX_WBITS)), g_nChunk)
+
+class FileFeed(object):
+	"""Decompress a file for readers that only take file names
+
+	Readers such as _das2.read_file() open files themselves.  For compressed
+	files this object decodes the file into a pipe from a background thread
+	and provides the pipe's name, so the reader gets the decompressed stream
+	with memory use bounded by the pipe buffer.  Where pipes can't be opened
+	by name the file is decompressed to a temporary file instead.
+
+	Use as a context manager:
+
+		>>> with FileFeed('survey.d3b.gz') as sPath:
+		...     (dHdr, lDs) = _das2.read_file(sPath)
+	"""
+	def __init__(self, sFile):
+		self.sFile = sFile
+		self.sPath = sFile
+		self.fIn = None
+		self.fOut = None
+		self.thread = None
+		self.nRead = None
+		self.error = None
+
+	def __enter__(self):
+		self.fIn = open(self.sFile, 'rb')
+		fDec = decompress(self.fIn)
+		if fDec is self.fIn:
+			self.fIn.close()
+			return self.sPath
+
+		if os.path.isdir('/dev/fd'):
+			(self.nRead, nWrite) = os.pipe()
+			self.sPath = '/dev/fd/%d'%self.nRead
+			self.fOut = os.fdopen(nWrite, 'wb')
+			self.thread = threading.Thread(
+				target=self._feed, args=(fDec,), name="das2-decompress", daemon=True
+			)
+			self.thread.start()
+		else:
+			fTmp = tempfile.NamedTemporaryFile(suffix='.das', delete=False)
+			self.sPath = fTmp.name
+			with fTmp:
+				self._copy(fDec, fTmp)
+			self.fIn.close()
+		return self.sPath
+
+	def _copy(self, fDec, fOut):
+		while True:
+			xChunk = fDec.read(g_nChunk)
+			if not xChunk: break
+			fOut.write(xChunk)
+
+	def _feed(self, fDec):
+		try:
+			self._copy(fDec, self.fOut)
+		except BrokenPipeError:
+			pass   # Reader stopped early
+		except Exception as e:
+			self.error = e
+		finally:
+			try:
+				self.fOut.close()
+			except OSError:
+				pass
+			self.fIn.close()
+
+	def __exit__(self, exType, exValue, tb):
+		if self.thread:
+			# Unblocks the feeder if the reader quit before the end
+			os.close(self.nRead)
+			self.thread.join()
+			if self.error and (exType == None):
+				raise ValueError("Could not decompress %s, %s"%(self.sFile, str(self.error)))
+		elif self.sPath != self.sFile:
+			os.remove(self.sPath)
+		return False
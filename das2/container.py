@@ -21,6 +21,11 @@
 # SOFTWARE.
 """Looking up data sources and sub catalogs of das catalogs"""
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _das2
+
 from . node import *
 from . source import *
 from . streamsrc import *
@@ -86,10 +91,91 @@ class Catalog(Node):
 					"Handling of sub-source type %s has not been implemented"%dDef['type']
 				)
 
-	def load(self):
-		super(Catalog, self).load()
+	def load(self, direct=False):
+		super(Catalog, self).load(direct)
 		self._load_stubs()
 
+	def prefetch(self, depth=None, workers=8):
+		"""Load all the stub nodes below this catalog.
+
+		The sub tree is expanded breadth first.  All stubs at one level are
+		downloaded at once on a pool of threads, then the next level is
+		started.  Nodes that fail to load are left as stubs and reported in
+		the statistics.  Combine with das2.set_node_cache() to make the next
+		walk of the same tree nearly free.
+
+		Args:
+			depth (int, optional) : How many levels below this catalog to load,
+				defaults to all of them.
+
+			workers (int, optional) : The maximum number of simultaneous
+				downloads.
+
+		Returns: (dict, dict)
+			A flat index mapping the path URI of every node seen (this one
+			included) to it's type name, and a dictionary of statistics with
+			the keys:
+
+			  - 'nodes'   - The number of nodes in the index
+			  - 'loaded'  - The number of stubs that were loaded
+			  - 'failed'  - A dictionary of path URI to error message
+			  - 'levels'  - The number of levels expanded
+			  - 'seconds' - Total wall clock time
+			  - 'level_seconds' - Wall clock time for each level
+
+		Example:
+
+			>>> cat = das2.get_catalog('site:/uiowa/juno')
+			>>> (dIndex, dStats) = cat.prefetch(workers=16)
+			>>> lSrcs = [s for s in dIndex if dIndex[s] == 'HttpStreamSrc']
+		"""
+		rStart = time.time()
+		if self.bStub: self.load(True)
+
+		dIndex = {self.path: self.type()}
+		dFailed = {}
+		lLevelSecs = []
+		nLoaded = 0
+
+		def load(node):
+			try:
+				node.load(True)
+			except (CatalogError, _das2.Error, KeyError, NotImplementedError) as e:
+				return str(e)
+			return None
+
+		lLevel = [self]
+		nWorkers = max(1, int(workers))
+		with ThreadPoolExecutor(max_workers=nWorkers) as pool:
+			while len(lLevel) > 0:
+				if (depth != None) and (len(lLevelSecs) >= depth): break
+				rLevel = time.time()
+
+				lSubs = []
+				for cat in lLevel:
+					for sKey in cat.subs:
+						node = cat.subs[sKey]
+						dIndex[node.path] = node.type()
+						lSubs.append(node)
+
+				lStubs = [node for node in lSubs if node.bStub]
+				for (node, sErr) in zip(lStubs, pool.map(load, lStubs)):
+					if sErr == None: nLoaded += 1
+					else: dFailed[node.path] = sErr
+
+				lLevel = [
+					node for node in lSubs
+					if isinstance(node, Catalog) and (not node.bStub)
+				]
+				lLevelSecs.append(time.time() - rLevel)
+
+		dStats = {
+			'nodes':len(dIndex), 'loaded':nLoaded, 'failed':dFailed,
+			'levels':len(lLevelSecs), 'seconds':time.time() - rStart,
+			'level_seconds':lLevelSecs
+		}
+		return (dIndex, dStats)
+
 
 	# Providing the dictionary interface, take from page:
 	# https://docs.python.org/3/reference/datamodel.html?emulating-container-types#emulating-container-types
@@ -39,6 +39,9 @@ from . util import *
 
 g_sIdxNames = "ijklmnpqrstuvwxyz" # Printing aid
 
+# How much DatasetAccumulator output arrays grow when they run out of room
+g_rAccumGrowth = 1.25
+
 lVer = numpy.__version__.split('.')
 for i in range(len(lVer)):
 	sInt = ''
@@ -447,6 +450,125 @@ class Quantity(namedtuple('Quantity', 'value unit')):
 # I'm going to just go with my own class which allows for some creative
 # indexing, though not a fancy as pandas dataframes.
 
+class RaggedArray(object):
+	"""Values that are ragged in the last index, stored compactly.
+
+	Rows are stored end to end in a single flat values array, much like the
+	compressed sparse row layout used by scipy.  Memory use is proportional to
+	the number of values actually read, not the length of the longest row.
+
+	Special members of this class are:
+
+	  - .values - The flat ndarray (possibly masked) of all values
+	  - .offsets - An int64 ndarray one longer than the number of rows, row r
+	        is values[offsets[r]:offsets[r+1]]
+	  - .rowshape - The shape of the leading (non-ragged) indices
+	"""
+
+	def __init__(self, values, offsets, rowshape=None):
+		"""Create a ragged array from a flat values array and row offsets
+
+		Args:
+			values (ndarray) : All values, rows stored end to end
+
+			offsets (ndarray) : Integer start point of each row in values,
+				followed by the total number of values.
+
+			rowshape (tuple, optional) : The shape of the leading indices,
+				defaults to (len(offsets) - 1,).  Rows are stored in C order over
+				these indices.
+		"""
+		self.values = values
+		self.offsets = numpy.asarray(offsets, dtype=numpy.int64)
+
+		nRows = len(self.offsets) - 1
+		if rowshape is None: rowshape = (nRows,)
+		rowshape = tuple(rowshape)
+		if int(numpy.prod(rowshape)) != nRows:
+			raise DatasetError("Row shape %s does not match %d row offsets"%(
+				rowshape, nRows))
+		if (nRows >= 0) and (self.offsets[-1] != len(values)):
+			raise DatasetError("Final offset %d does not match %d values"%(
+				self.offsets[-1], len(values)))
+
+		self.rowshape = rowshape
+		self._padded = None
+
+	@property
+	def lengths(self):
+		"""The number of valid values in each row, as an ndarray of rowshape"""
+		return numpy.diff(self.offsets).reshape(self.rowshape)
+
+	@property
+	def shape(self):
+		"""The shape of the padded array, i.e. rowshape + (longest row,)"""
+		nMax = int(numpy.diff(self.offsets).max()) if len(self.offsets) > 1 else 0
+		return self.rowshape + (nMax,)
+
+	@property
+	def dtype(self):
+		return self.values.dtype
+
+	@property
+	def nbytes(self):
+		return self.values.nbytes + self.offsets.nbytes
+
+	def __len__(self):
+		return self.rowshape[0] if self.rowshape else 0
+
+	def row(self, *idx):
+		"""Get the valid values for one row (no padding)
+
+		Args:
+			idx (int) : One index for each leading dimension
+		"""
+		r = int(numpy.ravel_multi_index(idx, self.rowshape))
+		return self.values[self.offsets[r]:self.offsets[r+1]]
+
+	def masked(self, nCols=None):
+		"""Get a cubic masked array with short rows padded out.
+
+		The array is built the first time it's requested (for the default
+		width) and then cached.
+
+		Args:
+			nCols (int, optional) : The width of the padded last index,
+				defaults to the length of the longest row.
+
+		Returns: numpy.ma.MaskedArray
+		"""
+		nLongest = self.shape[-1]
+		if nCols is None: nCols = nLongest
+		if nCols < nLongest:
+			raise DatasetError("Can't pad rows of length %d to %d"%(nLongest, nCols))
+
+		if (self._padded is not None) and (self._padded.shape[-1] == nCols):
+			return self._padded
+
+		aLens = numpy.diff(self.offsets)
+		nRows = len(aLens)
+
+		# Scatter all values in one pass using flat row, column indices
+		aRow = numpy.repeat(numpy.arange(nRows), aLens)
+		aCol = numpy.arange(len(self.values)) - numpy.repeat(self.offsets[:-1], aLens)
+
+		aData = numpy.zeros((nRows, nCols), dtype=self.values.dtype)
+		aData[aRow, aCol] = numpy.ma.getdata(self.values)
+
+		aMask = numpy.arange(nCols)[None,:] >= aLens[:,None]
+		if isinstance(self.values, numpy.ma.MaskedArray):
+			aMask[aRow, aCol] = numpy.ma.getmaskarray(self.values)
+
+		shape = self.rowshape + (nCols,)
+		padded = numpy.ma.MaskedArray(aData.reshape(shape), mask=aMask.reshape(shape))
+		if isinstance(self.values, numpy.ma.MaskedArray):
+			padded.fill_value = self.values.fill_value
+
+		if nCols == nLongest: self._padded = padded
+		return padded
+
+# ########################################################################### #
+
 class Variable(object):
 	"""Data arrays with a stated purpose and units
 
@@ -755,6 +877,89 @@ class Variable(object):
 		bRet = numpy.all( aRavel[:-1] <= aRavel[1:] )
 		return bRet
 
+class RaggedVariable(Variable):
+	"""A Variable with values that are ragged in the last index
+
+	The values are held as a RaggedArray in the .ragged member.  The padded,
+	masked and broadcast ndarray used by generic Variable operations is not
+	built until the .array member is first accessed, so code that works on
+	.ragged directly never pays for the padding.
+
+	Assigning to .array sets .ragged to None, after that only the padded
+	array holds the values.
+	"""
+
+	def __init__(self, dim, role, ragged, units, axis=None, fill=None):
+		"""Create a new RaggedVariable
+
+		Args:
+			ragged (RaggedArray) : The values
+
+			All other arguments are the same as for Variable
+		"""
+		self.dim = dim
+		self.name = role
+		self.units = units
+		self.fill = fill
+		self.subrank = 0
+		self.ragged = ragged
+		self._array = None
+
+		self._scoot = 0
+		if axis != None:
+			if isinstance(axis, int): self._scoot = axis
+			else: self._scoot = axis[0]
+
+		lShape = [None]*self._scoot + list(ragged.shape)
+		self.unique = [False]*self._scoot + [True]*len(ragged.shape)
+
+		ds_shape = list(dim.ds.shape)
+		while len(lShape) < len(ds_shape):
+			lShape.append(None)
+			self.unique.append(False)
+
+		# Short rows are padded out to the dataset size, never the reverse
+		shape = []
+		for i in range(len(lShape)):
+			nDs = ds_shape[i] if i < len(ds_shape) else 1
+			shape.append(max(lShape[i] or 0, nDs))
+
+		self._shape = tuple(shape)
+		self.dim.ds._bcast(self._shape)
+
+	@property
+	def array(self):
+		if self._array is None:
+			iLast = len(self.unique) - 1 - self.unique[::-1].index(True)
+			array = self.ragged.masked(self._shape[iLast])
+
+			if array.shape != self._shape:
+				lSlice = [None]*self._scoot + [slice(None, None, None)]*array.ndim
+				lSlice += [None]*(len(self._shape) - len(lSlice))
+				array = numpy.broadcast_to(array[tuple(lSlice)], self._shape)
+
+			self._array = array
+		return self._array
+
+	@array.setter
+	def array(self, array):
+		# Sorts and such re-order the padded array, the compact values no
+		# longer match it
+		self._array = array
+		self.ragged = None
+
+	def _bcast(self, shape):
+		shape = tuple(shape)
+		if shape == self._shape: return
+
+		if self._array is None:
+			# Nothing built yet, just remember the new shape
+			self.unique += [False]*(len(shape) - len(self._shape))
+			self._shape = shape
+		else:
+			Variable._bcast(self, shape)
+			self._shape = self._array.shape
+
 # ########################################################################### #
 
 class Dimension(object):
@@ -779,9 +984,14 @@ class Dimension(object):
 
 		Add a variable to a dataset can trigger broadcasting of other variables
 		to fill the required index space.
+
+		If values is a RaggedArray a RaggedVariable is created.
 		"""
 
-		_var = Variable(self, role, values, units, axis, fill)
+		if isinstance(values, RaggedArray):
+			_var = RaggedVariable(self, role, values, units, axis, fill)
+		else:
+			_var = Variable(self, role, values, units, axis, fill)
 		self.vars[role] = _var
 
 		# If there happens to be both a reference and offset variable
@@ -1008,12 +1218,27 @@ class Dataset(object):
 				slices to get a subset along an axis.
 
 		Returns:
-			Dimension or Dataset
+			Dimension or Dataset.  Subset datasets have the same rank as this
+			one and their Variable arrays are views of the arrays in this
+			dataset, nothing is copied.  Degenerate axes stay broadcast.
+
+		Example:
+
+			>>> dsPart = ds[1000:2000]       # Records 1000 to 1999
+			>>> dsBand = ds[:, 10:20]        # Frequency bins 10 to 19
 		"""
 		if isinstance(key, (slice, tuple, int)):
-			#TODO: Add code here to create sub datasets by applying a tuple of
-			#      slices to all the variables.
-			raise NotImplementedError("Slicing whole datasets is not yet implemented (but wouldn't be hard to do if desired)")
+			if not isinstance(key, tuple): key = (key,)
+			if len(key) > len(self.shape):
+				raise IndexError("Too many indices for rank %d dataset %s"%(
+					len(self.shape), self.name))
+			for item in key:
+				if not isinstance(item, slice):
+					raise TypeError(
+						"Datasets are indexed by slices, an integer index would "+\
+						"reduce the rank, use ds[i:i+1] instead"
+					)
+			return _ds_subset(self, key)
 
 
 		if key.startswith('coord:'):
@@ -1030,6 +1255,57 @@ class Dataset(object):
 		else:
 			return self.dCoord[key]
 
+	def select(self, **kwargs):
+		"""Get a subset of this dataset by coordinate value ranges
+
+		Each coordinate dimension used must have a Variable that varies in a
+		single index and is sorted ascending, such as time reference values.
+		Ranges are found by binary search on that Variable, so the time taken
+		does not depend on the size of the dataset.  As with slicing, the
+		arrays in the returned dataset are views, not copies.
+
+		Args:
+			kwargs : Coordinate dimension names set to (begin, end) tuples.
+				Values in [begin, end) are kept, None leaves a side open.
+				Time boundaries may be datetime64s, datetimes or strings that
+				DasTime can parse.  Other boundaries may be numbers in the
+				Variable's units or Quantity objects.
+
+		Returns: Dataset
+
+		Raises:
+			KeyError : If a name is not a coordinate dimension of this dataset
+			DatasetError : If a coordinate has no single index Variable
+
+		Example:
+
+			>>> dsHour = ds.select(time=('2017-01-01T10:00', '2017-01-01T11:00'))
+		"""
+		dRanges = {}
+		for sDim in kwargs:
+			(beg, end) = kwargs[sDim]
+			(var, iAxis) = _rangeVar(self, sDim)
+			aVals = numpy.ma.getdata(var.array[var.uniIndex()])
+
+			i0 = 0
+			i1 = len(aVals)
+			if beg is not None:
+				i0 = int(numpy.searchsorted(aVals, _rangeValue(beg, var), 'left'))
+			if end is not None:
+				i1 = int(numpy.searchsorted(aVals, _rangeValue(end, var), 'left'))
+
+			# Several coordinates can limit the same index
+			if iAxis in dRanges:
+				i0 = max(i0, dRanges[iAxis][0])
+				i1 = min(i1, dRanges[iAxis][1])
+			dRanges[iAxis] = (i0, max(i0, i1))
+
+		lSlices = [slice(None, None, None)]*len(self.shape)
+		for iAxis in dRanges:
+			lSlices[iAxis] = slice(*dRanges[iAxis])
+
+		return _ds_subset(self, lSlices)
+
 	def __iter__(self):
 		# In a multithreaded application we would store the iteration state
 		# somewhere else.  This doesn't seem to be a concern in python so
@@ -1348,26 +1624,12 @@ class Dataset(object):
 					perr("INFO:     %d %s\n"%(vi.nOrder, vi.var))
 
 
-		# Setup identity indicies for axis that is not touched.
-		# The indicies makes an array where the first index is the
-		# dimension number.  For each dimension there is a sub array
-		# of the same shape as 'dataset.shape', that gives the identity
-		# index of an array value for fancy indexing.
-		#
-		#  So:
-		#	  aIndices = numpy.indices(ary.shape)
-		#
-		#  Provides indexes such that this:
-		#
-		#    ary == ary[ aIndices[0], aIndices[1], aIndices[2] ]
-		#
-		# Is true
-
-
-		# Make a list of all vars in dataset, we'll need this at least once
+		# Only the non-degenerate part of each variable is re-ordered, the
+		# result is broadcast back out to the dataset shape.  Variables that
+		# don't vary in the sort indices are left alone, so a frequency table
+		# is never expanded into a time by frequency array just to sort on
+		# time.
 		lVars = self._allVars()
-		aIdentOrig = None
-		bMkIdentOrig = True
 
 		# Sort each group. Groups are non-intersecting sets of indices.
 		for grp in lGroups:
@@ -1375,28 +1637,19 @@ class Dataset(object):
 			# Single index sorts, these are straight forward
 			if grp.lUni.count(True) == 1:
 
-				if bMkIdentOrig:
-					aIdentOrig = numpy.indices(self.shape)
-					bMkIdentOrig = False
-
-				lIdx = [aIdentOrig[i] for i in range(len(self.shape))]
 				iSort = grp.lUni.index(True)
 
-				# Single item in single index, these are real easy
-				if len(grp.lVi) == 1:
-					aSortMe = grp.lVi[0].var.array
-
-				# Multiple items in a single index, need a record array
-				else:
-					lArrays = [ vi.var.array for vi in grp.lVi]
-					lNames = [ vi.sName for vi in grp.lVi]
-					aSortMe = numpy.rec.fromarrays(lArrays, names=lNames)
-
-				# The actual sort
-				lIdx[iSort] = numpy.argsort(aSortMe, kind="mergesort", axis=iSort)
+				# The actual sort, if needed.  Data are usually in order, or
+				# nearly so.
+				aOrder = _sortOrder([vi.var.array[vi.var.uniIndex()] for vi in grp.lVi])
+				if aOrder is None:
+					if perr: perr("INFO:   Stage is already sorted\n")
+					continue
 
 				for var in lVars:
-					var.array = var.array[tuple(lIdx)]
+					if not var.unique[iSort]: continue
+					aSub = var.array[_keepIndex(var)].take(aOrder, axis=iSort)
+					var.array = _rebcast(aSub, self.shape)
 
 
 			# Multiple index sorts:
@@ -1414,48 +1667,37 @@ class Dataset(object):
 						"index positions.  You'll need to use Pandas"
 					)
 
-				lReshape = []
-				nRavel = 1
-				bRaveling = False
-				iSort = None
-				for i in range(len(self.shape)):
-					if grp.lUni[i]:
-						if iSort == None:  iSort = i
-						bRaveling = True
-						nRavel *= self.shape[i]
-					else:
-						if bRaveling:
-							lReshape.append(nRavel)
-							bRaveling = False
-						lReshape.append(self.shape[i])
-
-				if bRaveling: lReshape.append(nRavel)
+				lAxes = [i for i in range(len(self.shape)) if grp.lUni[i]]
+				iSort = lAxes[0]
 
 				if perr:
 					perr("INFO: Reshaping for multi-index sort: %s -> %s\n"%(
-					     list(self.shape), lReshape))
-
-				# Make the identity array for this new shape
-				aIdent = numpy.indices(lReshape)
-				lIdx = [aIdent[i] for i in range(len(lReshape))]
+					     list(self.shape), _ravelShape(self.shape, grp.lUni)))
 
 				# Single item multi index.
 				if len(grp.lVi) == 1:
-					aReshaped = grp.lVi[0].var.array.reshape(lReshape)
+					var = grp.lVi[0].var
+					aSortMe = var.array[_keepIndex(var, lAxes)]
 
 				# The biggest difficulty, multi-items multi-indexes
 				else:
-					lArrays = [ vi.var.array for vi in grp.lVi]
+					lArrays = [ vi.var.array[_keepIndex(vi.var, lAxes)] for vi in grp.lVi]
 					lNames = [ vi.sName for vi in grp.lVi]
-					aReshaped = numpy.rec.fromarrays(lArrays, names=lNames).reshape(lReshape)
+					aSortMe = numpy.rec.fromarrays(lArrays, names=lNames)
+
+				aReshaped = aSortMe.reshape(_ravelShape(aSortMe.shape, grp.lUni))
+
+				if (len(grp.lVi) == 1) and _isSorted(aReshaped, iSort):
+					if perr: perr("INFO:   Stage is already sorted\n")
+					continue
 
 				# Issue a warning if duplicates are detected in multi-index
 				# sorting arrays.  This usually means axes are going to get
 				# mushed, which is typically not what people want!
 				if not bShutup:
-					lDupSlice = [slice(1)]*len(lReshape)
+					lDupSlice = [slice(1)]*len(aReshaped.shape)
 					lDupSlice[iSort] = slice(None)
-					aDupTest = aReshaped[lDupSlice].squeeze()
+					aDupTest = aReshaped[tuple(lDupSlice)].ravel()
 					lDup = [item for item,count in Counter(aDupTest).items() if count > 1]
 					if len(lDup) > 0:
 						sys.stderr.write("WARNING: For dataset %s! Duplicate items detected in "
@@ -1463,10 +1705,18 @@ class Dataset(object):
 											  "longer make sense!\n"%self.name)
 
 				# The actual sort
-				lIdx[iSort] = numpy.argsort(aReshaped, kind="mergesort", axis=iSort)
+				aOrder = numpy.argsort(aReshaped, kind="mergesort", axis=iSort)
 
+				# Variables that vary in any of the sort indices end up varying
+				# in all of them, others are not affected
 				for var in lVars:
-					var.array = var.array.reshape(lReshape)[lIdx].reshape(self.shape)
+					if not any(var.unique[i] for i in lAxes): continue
+					aSub = var.array[_keepIndex(var, lAxes)]
+					tKeep = aSub.shape
+					aSub = aSub.reshape(_ravelShape(tKeep, grp.lUni))
+					aSub = numpy.take_along_axis(aSub, aOrder, axis=iSort)
+					var.array = _rebcast(aSub.reshape(tKeep), self.shape)
+					for i in lAxes: var.unique[i] = True
 
 
 	def ravel(self):
@@ -1711,6 +1961,14 @@ def _mk_var_from_raw(dim, dRawDs, sRole, sExp, sUnits, bMask=False):
 	elif sIdx.startswith('[k]'): nAxis = 2
 	else: raise ValueError("I can't parse this %s"%sArray)
 
+	# Arrays ragged in the last index come in flat, with row offsets
+	if sName in dRawDs.get('offsets', {}):
+		aOffs = dRawDs['offsets'][sName]
+		nIdx = sIdx.count('[')
+		tRows = tuple(dim.ds.shape[nAxis:nAxis + nIdx - 1])
+		if int(numpy.prod(tRows)) != len(aOffs) - 1: tRows = None
+		array = RaggedArray(array, aOffs, tRows)
+
 	var = dim.var(sRole, array, sUnits, axis=nAxis, fill=fill)
 
 # #########################
@@ -1751,7 +2009,13 @@ def ds_from_raw(dRawDs):
 	for sProp in dRawDs['props']:
 		ds.props[sProp] = mk_prop_from_raw(dRawDs['props'][sProp])
 
+	# Ragged indices come across as -1, use the longest row instead
 	ds.shape = dRawDs['shape']
+	if min(ds.shape, default=0) < 0:
+		nMax = 0
+		for aOffs in dRawDs.get('offsets', {}).values():
+			if len(aOffs) > 1: nMax = max(nMax, int(numpy.diff(aOffs).max()))
+		ds.shape = [n if n >= 0 else nMax for n in ds.shape]
 
 	for sDim in dRawDs['data']:
 		dRawDim = dRawDs['data'][sDim]
@@ -1864,6 +2128,12 @@ def ds_union(lDs, bAllowRankReduce=True):
 										  ds[sDim][sVar].units))
 
 
+	# Same shape in all but the first index, fill pre-sized arrays
+	if not bFlatten:
+		acc = DatasetAccumulator(nRecs=sum(ds.shape[0] for ds in lDs))
+		for ds in lDs: acc.append(ds)
+		return acc.dataset()
+
 	# Merge all the property dictionaries
 	for sDim in ds0:
 		dimOut = dsOut.dim(sDim)
@@ -1878,18 +2148,445 @@ def ds_union(lDs, bAllowRankReduce=True):
 	for sDim in ds0:
 		dimOut = dsOut[sDim]
 
-		for sVar in ds0[sDim]:
+		# Centers go first, otherwise adding reference and offset variables
+		# would compute a new one
+		for sVar in sorted(ds0[sDim].keys(), key=lambda s: s != 'center'):
 
-			if bFlatten:
-				lArys = [ds[sDim][sVar].array.ravel() for ds in lDs]
-			else:
-				lArys = [ds[sDim][sVar].array for ds in lDs]
+			lVars = [ds[sDim][sVar] for ds in lDs]
+			aOut = _concat([var.array.ravel() for var in lVars])
+			dsOut[sDim].var(sVar, aOut, ds0[sDim][sVar].units)
+
+	return dsOut
 
-			aOut = numpy.concatenate(lArys, axis=0)
+class DatasetAccumulator(object):
+	"""Join datasets one at a time as they are read
 
-			sUnits = ds0[sDim][sVar].units
+	Datasets are appended along the first (record) index into output arrays
+	that grow as needed, so a long run of datasets, such as the chunks from
+	das2.iter_file(), can be joined without holding on to all the pieces.
+	If the total number of records is known ahead of time the arrays are
+	allocated once at their final size.
 
-			dsOut[sDim].var(sVar, aOut, sUnits)
+	Values that don't change by record, such as frequency tables, are kept
+	once for as long as every dataset has the same ones.  Broadcast indices
+	are never expanded.
 
-	return dsOut
+	Example:
+
+		>>> dAcc = {}
+		>>> for (dHdr, lDs) in das2.iter_file('big.d2s'):
+		...    for ds in lDs:
+		...       dAcc.setdefault(ds.name, das2.DatasetAccumulator()).append(ds)
+		>>> lDs = [acc.dataset() for acc in dAcc.values()]
+	"""
+
+	def __init__(self, nRecs=0):
+		"""Start an empty accumulator
+
+		Args:
+			nRecs (int, optional) : The number of records expected.  Output
+				arrays are allocated for this many records up front and then grow
+				geometrically if more arrive.
+		"""
+		self.nRecs = 0
+		self.nCap = max(0, int(nRecs or 0))
+		self.ds0 = None
+		self.props = {}
+		self.dDimProps = {}
+		self.dBufs = {}
+
+	def __len__(self):
+		return self.nRecs
+
+	def append(self, ds):
+		"""Add the records from a dataset
+
+		Args:
+			ds (Dataset) : A dataset with the same dimensions, variables and
+				units as the first one appended, and the same shape in all but
+				the first index.
+
+		Raises:
+			DatasetError: If the dataset can't be joined to the previous ones.
+				Use ds_union() to join datasets of different shapes as scatter
+				data.
+		"""
+		if len(ds.shape) == 0:
+			raise DatasetError("Dataset %s has no record index"%ds.name)
+
+		if self.ds0 is None:
+			self.ds0 = ds
+		else:
+			self._check(ds)
+
+		nNew = ds.shape[0]
+		nNeed = self.nRecs + nNew
+		if nNeed > self.nCap:
+			self.nCap = max(nNeed, int(self.nCap*g_rAccumGrowth))
+
+		self.props.update(ds.props)
+		for sDim in ds:
+			self.dDimProps.setdefault(sDim, {}).update(ds[sDim].props)
+			for sVar in ds[sDim]:
+				tKey = (sDim, sVar)
+				if tKey in self.dBufs:
+					self.dBufs[tKey].append(ds[sDim][sVar], self.nRecs, self.nCap)
+				else:
+					self.dBufs[tKey] = _VarBuffer(ds[sDim][sVar], self.nCap)
+
+		self.nRecs = nNeed
+
+	def extend(self, lDs):
+		"""Add the records from each dataset in a list, see append()"""
+		for ds in lDs: self.append(ds)
+
+	def _check(self, ds):
+		ds0 = self.ds0
+		if (len(ds.shape) != len(ds0.shape)) or (ds.shape[1:] != ds0.shape[1:]):
+			raise DatasetError(
+				"Can not append dataset shape %s to dataset shape %s"%(
+				ds.shape, ds0.shape))
+
+		if ds.keys() != ds0.keys():
+			raise DatasetError("Incompatable dimensions, %s vs %s"%(
+			                 list(ds.keys()), list(ds0.keys())))
+
+		for sDim in ds:
+			if ds0[sDim].keys() != ds[sDim].keys():
+				raise DatasetError("Incompatable variables, %s vs %s"%(
+				                 list(ds[sDim].keys()), list(ds0[sDim].keys())))
+
+			for sVar in ds[sDim]:
+				if ds0[sDim][sVar].units != ds[sDim][sVar].units:
+					raise DatasetError("Incompatable units for %s:%s: %s vs %s"%(
+					                 sDim, sVar, ds0[sDim][sVar].units,
+					                 ds[sDim][sVar].units))
 
+	def dataset(self):
+		"""Get the joined dataset
+
+		Spare room in the output arrays is released first.  More datasets may
+		be appended afterwards, that doesn't change the dataset returned here.
+
+		Returns:
+			Dataset : A new dataset with all the records appended so far.
+
+		Raises:
+			ValueError: If no datasets have been appended
+		"""
+		if self.ds0 is None: raise ValueError("No datasets in group")
+		ds0 = self.ds0
+
+		dsOut = Dataset(ds0.group if ds0.group else 'merged', group=ds0.group)
+		dsOut.rank = ds0.rank
+		dsOut.props = self.props.copy()
+
+		for sDim in ds0:
+			dimOut = dsOut.dim(sDim)
+			dimOut.props = self.dDimProps[sDim].copy()
+
+		self.nCap = self.nRecs
+		for sDim in ds0:
+			# Centers go first, otherwise adding reference and offset variables
+			# would compute a new one
+			for sVar in sorted(ds0[sDim].keys(), key=lambda s: s != 'center'):
+				(values, axis) = self.dBufs[(sDim, sVar)].values(self.nRecs)
+				dsOut[sDim].var(sVar, values, ds0[sDim][sVar].units, axis)
+
+		return dsOut
+
+class _VarBuffer(object):
+	# Growing storage for one variable in a DatasetAccumulator.  Only the
+	# indices the variable is unique in are stored, from the first one
+	# through the last.  Values that don't vary by record are held as a
+	# single table (aShared) until a dataset with different values arrives.
+
+	def __init__(self, var, nCap):
+		self.aShared = None
+		self.aBuf = None
+		self.aMask = None
+		self.bLent = False   # Arrays are in use by an output dataset
+		self.fill = None
+
+		(self.iBeg, self.iEnd) = _uniRange(var.unique)
+		if self.iBeg > 0:
+			self.aShared = var.array[self._sub(var)]
+		else:
+			self.iBeg = 0
+			self.append(var, 0, nCap)
+
+	def _sub(self, var):
+		return tuple(
+			slice(None, None, None) if (self.iBeg <= i < self.iEnd) else 0
+			for i in range(len(var.unique))
+		)
+
+	def _reserve(self, nRecs, nCap, shape, dtype, bMask):
+		# Make room for nCap records, nRecs are in use
+		shape = (nCap,) + tuple(shape)
+		if self.aBuf is None:
+			self.aBuf = numpy.empty(shape, dtype=dtype)
+			self.bLent = False
+
+		elif (self.aBuf.shape[1:] != shape[1:]) or \
+		     (numpy.result_type(self.aBuf.dtype, dtype) != self.aBuf.dtype):
+			# New type, or values now vary in more indices, old values are
+			# repeated in the new ones
+			tOld = (nRecs,) + self.aBuf.shape[1:] + (1,)*(len(shape) - self.aBuf.ndim)
+			aNew = numpy.empty(shape, dtype=numpy.result_type(self.aBuf.dtype, dtype))
+			aNew[:nRecs] = self.aBuf[:nRecs].reshape(tOld)
+			self.aBuf = aNew
+			if self.aMask is not None:
+				aNew = numpy.zeros(shape, dtype=bool)
+				aNew[:nRecs] = self.aMask[:nRecs].reshape(tOld)
+				self.aMask = aNew
+			self.bLent = False
+
+		elif self.aBuf.shape[0] != nCap:
+			self.aBuf = _resize(self.aBuf, nRecs, shape, self.bLent)
+			if self.aMask is not None:
+				self.aMask = _resize(self.aMask, nRecs, shape, self.bLent)
+			self.bLent = False
+
+		if bMask and (self.aMask is None):
+			self.aMask = numpy.zeros(self.aBuf.shape, dtype=bool)
+
+	def append(self, var, nRecs, nCap):
+		# Add a variable's values after the first nRecs records
+		(iBeg, iEnd) = _uniRange(var.unique)
+
+		if self.aShared is not None:
+			if (iBeg == self.iBeg) and (iEnd == self.iEnd) and \
+			   numpy.array_equal(var.array[self._sub(var)], self.aShared):
+				return
+
+			# Values change after all, repeat the table for the previous records
+			aShared = self.aShared
+			self.aShared = None
+			bMask = isinstance(aShared, numpy.ma.MaskedArray)
+			self._reserve(0, nCap, var.array.shape[1:self.iEnd], aShared.dtype, bMask)
+			self.aBuf[:nRecs] = numpy.ma.getdata(aShared)
+			if self.aMask is not None:
+				self.aMask[:nRecs] = numpy.ma.getmaskarray(aShared)
+			if bMask: self.fill = aShared.fill_value
+			self.iBeg = 0
+
+		self.iEnd = max(self.iEnd, iEnd)
+		array = var.array[self._sub(var)]
+		bMask = isinstance(array, numpy.ma.MaskedArray)
+		if bMask and (self.fill is None): self.fill = array.fill_value
+
+		self._reserve(nRecs, nCap, array.shape[1:], array.dtype, bMask)
+		nEnd = nRecs + array.shape[0]
+		self.aBuf[nRecs:nEnd] = numpy.ma.getdata(array)
+		if self.aMask is not None:
+			self.aMask[nRecs:nEnd] = numpy.ma.getmaskarray(array)
+
+	def values(self, nRecs):
+		# Get (values, axis) for Dimension.var, trimmed to nRecs records.  The
+		# arrays are handed over, so they are copied before growing again.
+		if self.aShared is not None: return (self.aShared, self.iBeg)
+
+		self._reserve(nRecs, nRecs, self.aBuf.shape[1:], self.aBuf.dtype, False)
+		self.bLent = True
+		if self.aMask is None: return (self.aBuf, 0)
+		return (numpy.ma.MaskedArray(self.aBuf, self.aMask, fill_value=self.fill), 0)
+
+def _uniRange(lUni):
+	# First and one past the last index in which a variable is unique.
+	# Constants are stored by record.
+	if not any(lUni): return (0, 1)
+	return (lUni.index(True), len(lUni) - lUni[::-1].index(True))
+
+def _resize(array, nRecs, shape, bLent):
+	# Change the number of records an array can hold.  Arrays that no one
+	# else is using are resized in place, which for large arrays usually
+	# just remaps memory instead of copying it.
+	if (not bLent) and array.flags.owndata and array.flags.c_contiguous:
+		array.resize(shape, refcheck=False)
+		return array
+	aNew = numpy.empty(shape, dtype=array.dtype)
+	nKeep = min(nRecs, shape[0])
+	aNew[:nKeep] = array[:nKeep]
+	return aNew
+
+def _concat(lArys):
+	# Join arrays along the first index, keeping masks if there are any
+	if any(isinstance(a, numpy.ma.MaskedArray) for a in lArys):
+		return numpy.ma.concatenate(lArys, axis=0)
+	return numpy.concatenate(lArys, axis=0)
+
+def _isSorted(array, iAxis):
+	# Are the values ascending along an index?  NaNs and masked values are
+	# taken as unsorted, the full sort decides where they go.
+	if numpy.ma.is_masked(array): return False
+	array = numpy.moveaxis(numpy.ma.getdata(array), iAxis, -1)
+	return bool(numpy.all(array[..., :-1] <= array[..., 1:]))
+
+def _sortOrder(lKeys):
+	# Get the stable order that sorts 1-D keys, the first key is the
+	# primary one.  Returns None if the keys are already in order.  Checking
+	# is one pass over the keys, much less work than re-ordering every
+	# variable in the dataset.
+	if len(lKeys[0]) < 2: return None
+
+	if len(lKeys) > 1:
+		lKeys = [numpy.ma.getdata(a) for a in lKeys]
+		aLess = numpy.zeros(len(lKeys[0]) - 1, dtype=bool)
+		aSame = numpy.ones(len(lKeys[0]) - 1, dtype=bool)
+		for a in lKeys:
+			aLess |= aSame & (a[:-1] < a[1:])
+			aSame &= (a[:-1] == a[1:])
+		if numpy.all(aLess | aSame): return None
+
+		# lexsort wants the primary key last
+		return numpy.lexsort(lKeys[::-1])
+
+	# NaN and NaT fail every comparison, so they count as out of order
+	a = lKeys[0]
+	if numpy.ma.is_masked(a) or not numpy.all(a[:-1] <= a[1:]):
+		# numpy's stable sort finds and merges sorted runs on its own, so data
+		# that are only out of order at packet boundaries sort in nearly
+		# linear time.
+		return numpy.argsort(a, kind="mergesort")
+	return None
+
+def _keepIndex(var, lAxes=()):
+	# Index a variable's backing array without expanding broadcast values.
+	# The result keeps every index, unique ones (and those in lAxes) at full
+	# size, degenerate ones at size 1.
+	return tuple(
+		slice(None, None, None) if (var.unique[i] or (i in lAxes)) else slice(0, 1)
+		for i in range(len(var.unique))
+	)
+
+def _rebcast(array, shape):
+	# Broadcast a compact array back out to a dataset shape, masks included.
+	# Arrays that are already full size are returned as is, so they stay
+	# writable.
+	if tuple(array.shape) == tuple(shape): return array
+
+	if isinstance(array, numpy.ma.MaskedArray):
+		return numpy.ma.MaskedArray(
+			numpy.broadcast_to(array.data, shape),
+			mask=numpy.broadcast_to(numpy.ma.getmaskarray(array), shape),
+			fill_value=array.fill_value
+		)
+	return numpy.broadcast_to(array, shape)
+
+def _ravelShape(shape, lUni):
+	# Shape with the run of unique indices merged into a single index
+	lReshape = []
+	nRavel = 1
+	bRaveling = False
+	for i in range(len(shape)):
+		if lUni[i]:
+			bRaveling = True
+			nRavel *= shape[i]
+		else:
+			if bRaveling:
+				lReshape.append(nRavel)
+				bRaveling = False
+			lReshape.append(shape[i])
+
+	if bRaveling: lReshape.append(nRavel)
+	return lReshape
+
+def _var_subset(var, tSlices):
+	# Slice a variable's non-degenerate values so that the result can be
+	# handed back to Dimension.var without materializing broadcast axes.
+	# Returns (values, axis)
+
+	lUni = [i for i in range(len(var.unique)) if var.unique[i]]
+
+	# Compact ragged rows stay compact when only the first index is sliced,
+	# unless the padded array has replaced them
+	if isinstance(var, RaggedVariable) and (var.ragged is not None) and \
+	   (lUni[0] == 0) and (len(var.ragged.rowshape) == 1) and \
+	   (tSlices[0].step in (None, 1)) and \
+	   all(s == slice(None, None, None) for s in tSlices[1:]):
+		aOffs = var.ragged.offsets
+		(i0, i1, _) = tSlices[0].indices(len(aOffs) - 1)
+		i1 = max(i0, i1)
+		aSubOffs = aOffs[i0:i1+1] - aOffs[i0]
+		return (RaggedArray(var.ragged.values[aOffs[i0]:aOffs[i1]], aSubOffs), 0)
+
+	if lUni and (lUni == list(range(lUni[0], lUni[-1] + 1))):
+		tSub = tuple(tSlices[i] if var.unique[i] else 0 for i in range(len(var.unique)))
+		return (var.array[tSub], lUni[0])
+
+	# Non-contiguous unique axes, keep the full (view) array
+	return (var.array[tSlices], None)
+
+def _rangeVar(ds, sDim):
+	# Get the Variable of a coordinate dimension to search for value ranges,
+	# and the index it varies in.  Returns (Variable, int)
+	if sDim not in ds.dCoord:
+		raise KeyError("No coordinate dimension %s in dataset %s"%(sDim, ds.name))
+	dim = ds.dCoord[sDim]
+
+	lRoles = [s for s in ('reference', 'center', 'min', 'max') if s in dim.vars]
+	lRoles += sorted(s for s in dim.vars if s not in lRoles)
+	for sRole in lRoles:
+		var = dim.vars[sRole]
+		lUni = [i for i in range(len(var.unique)) if var.unique[i]]
+		if len(lUni) == 1: return (var, lUni[0])
+
+	raise DatasetError(
+		"No variable in coordinate %s of dataset %s depends on a single index"%(
+		sDim, ds.name)
+	)
+
+def _rangeValue(value, var):
+	# Convert a range boundary to the type of a Variable's array
+	if var.array.dtype.kind == 'M':
+		if isinstance(value, numpy.datetime64): return value.astype('M8[ns]')
+		if isinstance(value, datetime.datetime): return numpy.datetime64(value, 'ns')
+		return numpy.datetime64(dastime.DasTime(str(value)).isoc(6), 'ns')
+
+	if isinstance(value, Quantity):
+		if value.unit != var.units:
+			return _das2.convert(value.value, value.unit, var.units)
+		return value.value
+
+	return value
+
+def _ds_subset(ds, tSlices):
+	"""Get a new dataset holding a rectangular subset of another one
+
+	Only slice objects are accepted so the rank of the output is the same as
+	the input.  Arrays in the new dataset are views of the originals where
+	numpy allows it.
+
+	Args:
+		ds (Dataset) : The source dataset
+
+		tSlices (tuple) : One slice object per index, trailing indices may be
+			omitted.
+
+	Returns: Dataset
+	"""
+	tSlices = tuple(tSlices) + (slice(None, None, None),)*(len(ds.shape) - len(tSlices))
+
+	dsOut = Dataset(ds.name, ds.group)
+	dsOut.rank = ds.rank
+	dsOut.props = ds.props.copy()
+	dsOut.shape = tuple(
+		len(range(*tSlices[i].indices(ds.shape[i]))) for i in range(len(ds.shape))
+	)
+
+	for (dDims, fNew) in ((ds.dData, dsOut.data), (ds.dCoord, dsOut.coord)):
+		for sDim in dDims:
+			dim = dDims[sDim]
+			dimOut = fNew(sDim)
+			dimOut.props = dim.props.copy()
+
+			# Centers go first, otherwise adding reference and offset
+			# variables would compute new ones
+			lRoles = sorted(dim.vars, key=lambda s: s != 'center')
+			for sRole in lRoles:
+				var = dim.vars[sRole]
+				(values, axis) = _var_subset(var, tSlices)
+				dimOut.var(sRole, values, var.units, axis, var.fill)
+
+	return dsOut
@@ -26,6 +26,7 @@ import _das2
 import sys
 
 from . util import CatalogError
+from . cache import get_node_cache, _http_node
 
 # This is a node object.  It has 2-phase construction.  A minimal version
 # may be in memory representing just a reference to an item from a higher
@@ -56,6 +57,33 @@ DETACHED = False
 STUB   = True
 FULL   = False
 
+def _get_def(sPathId, sUrl=None, lUrls=None):
+	"""Get a node definition dictionary, from the node cache if it's enabled.
+
+	Args:
+		sPathId (str) : The full path URI of the node
+
+		sUrl (str, optional) : Load directly from this URL instead of looking
+			up the path in the global catalog.
+
+		lUrls (list, optional) : Try downloading directly from these locations
+			first, see cache._http_node().  The C catalog lookup is the fallback.
+
+	Returns: dict
+		The same output as _das2.get_node()
+	"""
+	ncache = get_node_cache()
+	if ncache != None: return ncache.get(sPathId, sUrl, None, lUrls)
+
+	if lUrls:
+		try:
+			return _http_node(sPathId, lUrls)[0]
+		except _das2.Error:
+			pass
+
+	if sUrl: return _das2.get_node(sPathId, None, sUrl)
+	return _das2.get_node(sPathId)
+
 class Node(object):
 	"""This represents a catalog node.  It has a 2-phase construction sequence
 	A minimal version may be in memory representing just a referenced item from
@@ -111,7 +139,7 @@ class Node(object):
 		return self.__class__.__name__
 
 
-	def load(self):
+	def load(self, direct=False):
 		"""Convert a stub node into a full node.
 
 		This method does nothing if called on a fully loaded node.  Interally the
@@ -121,6 +149,12 @@ class Node(object):
 
 		All new properties are merged into the self.props dictionary.
 
+		Args:
+			direct (bool, optional) : Download the definition from self.urls
+				instead of looking it up in the C catalog tree.  Direct loads
+				don't hold the GIL while waiting on the network so different
+				nodes can be loaded from different threads at the same time.
+
 		Returns: None
 		"""
 
@@ -130,15 +164,16 @@ class Node(object):
 		dDef = {}
 		if self.bGlobal:
 			try:
-				dDef = _das2.get_node(self.path)
+				dDef = _get_def(self.path, None, self.urls if direct else None)
 				self.url = dDef['_url']
 			except _das2.Error as e:
-				raise CatalogError("Couldn't load node %s: %s"%(self.path, str(e)))
+				raise CatalogError(self.urls, "Couldn't load node %s: %s"%(
+					self.path, str(e)))
 		else:
 			bGotIt = False
 			for sUrl in self.props['urls']:
 				try:
-					dDef = _das2.get_node(self.path, None, sUrl)
+					dDef = _get_def(self.path, sUrl, [sUrl] if direct else None)
 					self.url = dDef['_url']
 					bGotIt = True
 					break
@@ -146,15 +181,14 @@ class Node(object):
 					pass
 
 			if not bGotIt:
-				raise CatalogError("Could not load node %s from any of %s"%(
-					self.path, self.props['urls']))
+				raise CatalogError(self.props['urls'], "Could not load node %s"%self.path)
 
 		# Catalog sanity check, make sure full definition is the same type as
 		# the sub definition
 		if self.props['type'] != dDef['type']:
-			raise CatalogError("Catalog inconsistency, expected type "+\
-			                   "%s at url %s but type was %s"%(
-									 self.props['type'], dDef['_url'], dDef['type']))
+			raise CatalogError(dDef['_url'], "Catalog inconsistency, expected "+\
+			                   "type %s but type was %s"%(
+									 self.props['type'], dDef['type']))
 
 		# Over-write properties with new entries.
 		for key in dDef:
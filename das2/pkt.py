@@ -54,7 +54,9 @@ def fwrite(thing, stuff):
 
 ##############################################################################
 class HdrBuf(object):
-	"""Write a Das2 or QStream UTF-8 buffer"""
+	"""Write a Das2, das3 or QStream UTF-8 buffer.  For das3 streams (sFmt
+	'das3') packet ID 0 is sent as a stream header and all others as data
+	headers."""
 	
 	def __init__(self, nPktId, sFmt='das2'):
 		if nPktId < 0 or nPktId > 99:
@@ -82,7 +84,11 @@ class HdrBuf(object):
 		uOut = u"".join(self.lText)
 		xOut = uOut.encode('utf-8')
 		nLen = len(xOut)
-		sHdr = '[%02d]%06d'%(self.nPktId, nLen)
+		if self.sFmt == 'das3':
+			if self.nPktId == 0: sHdr = '|Sx||%d|'%nLen
+			else: sHdr = '|Hx|%d|%d|'%(self.nPktId, nLen)
+		else:
+			sHdr = '[%02d]%06d'%(self.nPktId, nLen)
 		xHdr = sHdr.encode('utf-8')
 		
 		fwrite(fOut, xHdr)
@@ -0,0 +1,400 @@
+# The MIT License
+#
+# Copyright 2024 Chris Piker
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Packet statistics and read throughput for das streams
+
+Answers the usual questions about a slow or oversized stream: which packet
+IDs the bytes go to, how much of the stream is headers, how many bytes text
+encodings cost over binary ones, how fast records arrive and how long each
+packet type takes to decode.
+"""
+
+import sys
+import json
+import time
+import argparse
+from urllib.request import urlopen, Request
+
+import numpy
+
+import _das2
+from . reader import PacketReader, DataHdrPkt, DataPkt
+from . compress import accept_encodings, FileFeed
+
+# Most time bins kept per packet ID, bins widen to stay under this
+g_nMaxBins = 4096
+
+# How often the read progress is sampled, in seconds
+g_rArrivalStep = 0.25
+
+class _Timeline(object):
+	"""Record counts in bins of data time, bins double in width whenever
+	there are too many of them, so memory use is bounded for long streams.
+	"""
+	def __init__(self):
+		self.nWidth = 1000000000   # ns
+		self.dBins = {}
+
+	def add(self, aTimes):
+		aTimes = aTimes.astype('M8[ns]').ravel()
+		aNs = aTimes[~numpy.isnat(aTimes)].view('i8')
+		if len(aNs) == 0: return
+
+		(aBins, aCounts) = numpy.unique(aNs // self.nWidth, return_counts=True)
+		for (nBin, nCount) in zip(aBins.tolist(), aCounts.tolist()):
+			self.dBins[nBin] = self.dBins.get(nBin, 0) + nCount
+
+		while len(self.dBins) > g_nMaxBins:
+			self.nWidth *= 2
+			dBins = {}
+			for (nBin, nCount) in self.dBins.items():
+				dBins[nBin // 2] = dBins.get(nBin // 2, 0) + nCount
+			self.dBins = dBins
+
+	def summary(self):
+		if len(self.dBins) == 0: return None
+		lBins = sorted(self.dBins.items())
+		rWidth = self.nWidth / 1e9
+		nRecs = sum(n for (i, n) in lBins)
+		nBeg = lBins[0][0]*self.nWidth
+		nEnd = (lBins[-1][0] + 1)*self.nWidth
+		def iso(nNs):
+			return str(numpy.datetime64(nNs, 'ns'))
+		return {
+			'begin':iso(nBeg), 'end':iso(nEnd), 'bin_sec':rWidth,
+			'mean_rate':nRecs / ((nEnd - nBeg) / 1e9),
+			'max_rate':max(n for (i, n) in lBins) / rWidth,
+			'bins':[[iso(i*self.nWidth), n] for (i, n) in lBins]
+		}
+
+def _fieldInfo(hdr):
+	"""Get the value encodings of a packet type and how big the records
+	would be if all numbers and times were sent as 8 byte binary values.
+
+	Returns (list, int, int): The (field name, encoding, shape) tuples, the
+		number of text values in each record and the binary record size.
+	"""
+	lFields = []
+	nText = 0
+	nBinary = 0
+	for (sName, sType, tShape, sUnits, sKind) in hdr.fields():
+		nItems = int(numpy.prod(tShape)) if tShape else 1
+		dt = numpy.dtype(sType)
+		lFields.append((sName, sType, list(tShape) if tShape else []))
+		if (dt.kind == 'S') and (sKind in ('time', 'number')):
+			nText += nItems
+			nBinary += 8*nItems
+		else:
+			nBinary += dt.itemsize*nItems
+	return (lFields, nText, nBinary)
+
+def _openSource(source, rTimeOut, sAgent):
+	"""Returns (file, str, bool): The input, its name and whether it should
+	be closed after reading."""
+	if not isinstance(source, str):
+		return (source, getattr(source, 'name', '<stream>'), False)
+
+	if source.startswith('http://') or source.startswith('https://'):
+		dHdrs = {'Accept-Encoding': ', '.join(accept_encodings())}
+		if sAgent: dHdrs['User-Agent'] = sAgent
+		return (urlopen(Request(source, headers=dHdrs), timeout=rTimeOut), source, True)
+
+	return (open(source, 'rb'), source, True)
+
+def profile_stream(source, decode=True, c_reader=False, timeout=10.0, agent=None):
+	"""Read a whole das stream and gather packet statistics.
+
+	Args:
+		source (str, file) : A file name, an http(s) URL or a binary file
+			object to read.
+
+		decode (bool, optional) : Decode the fixed length data packets with
+			DataHdrPkt.values() and time the decoding for each packet ID.
+			This is also needed for the record time line.
+
+		c_reader (bool, optional) : Read the source a second time with the
+			das2C reader, for comparison.  Needs a file name or URL.
+
+		timeout (float, optional) : Connection timeout for URLs, in seconds
+
+		agent (str, optional) : The HTTP User-Agent for URLs
+
+	Returns (dict):
+		Totals for the stream, with a 'packets' item that gives counts, bytes,
+		value encodings, decode times and a record time line for each packet
+		ID.  The 'arrival' item samples [seconds, bytes, records] as reading
+		progresses.  See format_profile() for a readable summary.
+
+	Example:
+
+		>>> dProf = das2.profile_stream('waves.d2s')
+		>>> print(das2.format_profile(dProf))
+	"""
+	(fIn, sName, bClose) = _openSource(source, timeout, agent)
+
+	dIds = {}
+	dOther = {}
+	nHdrBytes = 0
+	nDataBytes = 0
+	nRecs = 0
+	lArrival = []
+
+	rStart = time.perf_counter()
+	rNextSample = rStart + g_rArrivalStep
+	try:
+		reader = PacketReader(fIn)
+		(sContent, sVersion, sTagStyle, bUsingNs) = reader.streamType()
+
+		nPrev = 0
+		for pkt in reader:
+			if isinstance(pkt, DataPkt):
+				dId = dIds.get(pkt.id)
+				if dId == None:
+					dId = _newId(dIds, pkt.id)
+
+				aFirst = numpy.frombuffer(pkt.content, dtype=numpy.uint8).reshape(1, -1)
+				aRun = reader._takeRun(pkt.length, None)
+				nPkts = 1 + len(aRun)
+				nRecs += nPkts
+				dId['records'] += nPkts
+				dId['data_bytes'] += reader.nOffset - nPrev
+				nDataBytes += reader.nOffset - nPrev
+
+				hdr = dId['_hdr']
+				if decode and (hdr != None) and (hdr.dtype() != None) and \
+				   (pkt.length == hdr.dtype().itemsize):
+					rBeg = time.perf_counter()
+					for aPkts in (aFirst, aRun):
+						if len(aPkts) == 0: continue
+						dVals = hdr.values(aPkts.view(hdr.dtype())[:,0])
+						if dId['_time']: dId['_timeline'].add(dVals[dId['_time']])
+					dId['decode_sec'] += time.perf_counter() - rBeg
+					dId['decoded'] += nPkts
+
+			elif isinstance(pkt, DataHdrPkt):
+				dId = dIds.get(pkt.id)
+				if dId == None:
+					dId = _newId(dIds, pkt.id)
+				dId['headers'] += 1
+				dId['header_bytes'] += reader.nOffset - nPrev
+				nHdrBytes += reader.nOffset - nPrev
+
+				dId['_hdr'] = pkt
+				dId['record_len'] = None
+				dId['_time'] = None
+				if pkt.dtype() != None:
+					(dId['fields'], dId['text_values'], dId['binary_len']) = _fieldInfo(pkt)
+					dId['record_len'] = pkt.dtype().itemsize
+					for (sField, sType, tShape, sUnits, sKind) in pkt.fields():
+						if sKind == 'time':
+							dId['_time'] = sField
+							break
+
+			elif pkt.tag == 'Sx':
+				nHdrBytes += reader.nOffset - nPrev
+
+			else:
+				dOther[pkt.tag] = dOther.get(pkt.tag, 0) + reader.nOffset - nPrev
+
+			nPrev = reader.nOffset
+
+			rNow = time.perf_counter()
+			if rNow >= rNextSample:
+				lArrival.append([round(rNow - rStart, 6), nPrev, nRecs])
+				rNextSample = rNow + g_rArrivalStep
+	finally:
+		if bClose: fIn.close()
+
+	rSecs = time.perf_counter() - rStart
+	lArrival.append([round(rSecs, 6), nPrev, nRecs])
+
+	dPkts = {}
+	for nId in sorted(dIds):
+		dId = dIds[nId]
+		dId['timeline'] = dId['_timeline'].summary()
+		if dId['decoded'] > 0 and dId['decode_sec'] > 0:
+			dId['decode_recs_per_sec'] = dId['decoded'] / dId['decode_sec']
+		if dId['record_len']:
+			# Whole records only, tags aren't part of the encoding choice
+			dId['binary_bytes'] = dId['binary_len']*dId['records']
+		dPkts[nId] = dict((k, v) for (k, v) in dId.items() if not k.startswith('_'))
+
+	dProf = {
+		'source':sName, 'content':sContent, 'version':sVersion,
+		'bytes':nPrev, 'seconds':rSecs,
+		'bytes_per_sec':nPrev / rSecs if rSecs > 0 else None,
+		'records':nRecs,
+		'records_per_sec':nRecs / rSecs if rSecs > 0 else None,
+		'header_bytes':nHdrBytes, 'data_bytes':nDataBytes,
+		'other_bytes':dOther,
+		'header_ratio':nHdrBytes / nDataBytes if nDataBytes > 0 else None,
+		'packets':dPkts, 'arrival':lArrival, 'c_reader':None
+	}
+
+	if c_reader:
+		if not isinstance(source, str):
+			raise ValueError("The das2C reader comparison needs a file name or URL")
+		rBeg = time.perf_counter()
+		if source.startswith('http://') or source.startswith('https://'):
+			if agent: _das2.read_server(source, timeout, agent)
+			else: _das2.read_server(source, timeout)
+		else:
+			with FileFeed(source) as sPath:
+				_das2.read_file(sPath)
+		rCSecs = time.perf_counter() - rBeg
+		dProf['c_reader'] = {
+			'seconds':rCSecs,
+			'bytes_per_sec':nPrev / rCSecs if rCSecs > 0 else None,
+			'records_per_sec':nRecs / rCSecs if rCSecs > 0 else None
+		}
+
+	return dProf
+
+def _newId(dIds, nId):
+	dId = {
+		'headers':0, 'header_bytes':0, 'records':0, 'data_bytes':0,
+		'record_len':None, 'fields':[], 'text_values':0, 'binary_len':None,
+		'decoded':0, 'decode_sec':0.0, '_hdr':None, '_time':None,
+		'_timeline':_Timeline()
+	}
+	dIds[nId] = dId
+	return dId
+
+# ########################################################################## #
+
+def _bytes(n):
+	for sUnit in ('B', 'KB', 'MB', 'GB'):
+		if n < 1024 or sUnit == 'GB': break
+		n /= 1024.0
+	return "%.1f %s"%(n, sUnit) if sUnit != 'B' else "%d B"%n
+
+def format_profile(dProf):
+	"""Make a short text report from the output of profile_stream()"""
+	lOut = []
+	out = lOut.append
+
+	out("Source:  %s"%dProf['source'])
+	out("Content: %s %s, %s in %.3f s (%s/s)"%(
+		dProf['content'], dProf['version'], _bytes(dProf['bytes']),
+		dProf['seconds'], _bytes(dProf['bytes_per_sec'] or 0)
+	))
+	nTotal = max(1, dProf['bytes'])
+	out("Headers: %s (%.1f%%), data: %s (%.1f%%)"%(
+		_bytes(dProf['header_bytes']), 100.0*dProf['header_bytes'] / nTotal,
+		_bytes(dProf['data_bytes']), 100.0*dProf['data_bytes'] / nTotal
+	))
+	for (sTag, nBytes) in sorted(dProf['other_bytes'].items()):
+		out("|%s| packets: %s"%(sTag, _bytes(nBytes)))
+	out("Records: %d (%.0f/s)"%(dProf['records'], dProf['records_per_sec'] or 0))
+
+	if dProf['c_reader']:
+		out("das2C reader: %.3f s (%s/s)"%(
+			dProf['c_reader']['seconds'], _bytes(dProf['c_reader']['bytes_per_sec'] or 0)
+		))
+
+	for (nId, dId) in sorted(dProf['packets'].items()):
+		out("")
+		out("Packet ID %d: %d header(s), %d records, %s (%.1f%% of stream)"%(
+			nId, dId['headers'], dId['records'], _bytes(dId['data_bytes']),
+			100.0*dId['data_bytes'] / nTotal
+		))
+		if dId['record_len'] == None:
+			out("   Variable length or undefined records")
+		else:
+			out("   Record: %d bytes, %s"%(
+				dId['record_len'], ", ".join(
+					"%s %s%s"%(sName, sType, lShape if lShape else '')
+					for (sName, sType, lShape) in dId['fields']
+				)
+			))
+		if dId['text_values'] > 0:
+			out("   %d text values per record, as 8 byte binary: %s (%.0f%%)"%(
+				dId['text_values'], _bytes(dId['binary_bytes']),
+				100.0*dId['binary_bytes'] / max(1, dId['records']*dId['record_len'])
+			))
+		if dId['decoded'] > 0:
+			out("   Decode: %.3f s (%.0f records/s)"%(
+				dId['decode_sec'], dId.get('decode_recs_per_sec', 0)
+			))
+		dTl = dId['timeline']
+		if dTl:
+			out("   Times: %s to %s, %.3g records/s mean, %.3g max (%g s bins)"%(
+				dTl['begin'], dTl['end'], dTl['mean_rate'], dTl['max_rate'],
+				dTl['bin_sec']
+			))
+
+	return "\n".join(lOut)
+
+def main():
+	"""Print statistics for das streams"""
+
+	psr = argparse.ArgumentParser(
+		description="Print packet statistics and read throughput for das streams"
+	)
+
+	psr.add_argument(
+		'-j', '--json', default=False, action='store_true', dest='bJson',
+		help="Print the full profile as a JSON object on a single line"
+	)
+
+	psr.add_argument(
+		'-n', '--no-decode', default=True, action='store_false', dest='bDecode',
+		help="Only count packets, don't decode data values"
+	)
+
+	psr.add_argument(
+		'-c', '--c-reader', default=False, action='store_true', dest='bCReader',
+		help="Read each source a second time using das2C for comparison"
+	)
+
+	psr.add_argument(
+		'-t', '--timeout', default=10.0, type=float, dest='rTimeOut',
+		metavar='SEC', help="Connection timeout for URLs, default %(default)s"
+	)
+
+	psr.add_argument(
+		'lSources', help='Files or http(s) URLs to read', nargs='+',
+		metavar='source'
+	)
+
+	opts = psr.parse_args()
+
+	nRet = 0
+	for (i, sSrc) in enumerate(opts.lSources):
+		try:
+			dProf = profile_stream(sSrc, opts.bDecode, opts.bCReader, opts.rTimeOut)
+		except Exception as e:
+			sys.stderr.write("ERROR: %s, %s\n"%(sSrc, str(e)))
+			nRet = 13
+			continue
+
+		if opts.bJson:
+			print(json.dumps(dProf))
+		else:
+			if i > 0: print()
+			print(format_profile(dProf))
+
+	return nRet
+
+# ########################################################################## #
+if __name__ == "__main__":
+	sys.exit(main())
@@ -26,11 +26,15 @@ das-basic-stream, but das-basic-doc is in the works.
 """
 
 import sys
+import os
 import os.path
 from os.path import join as pjoin
 from os.path import dirname as dname  
 from io import BytesIO
 import re
+import threading
+from mmap import mmap as MMap, ACCESS_READ
+import numpy
 try:
 	from typing import Union
 except:
@@ -39,6 +43,8 @@ except:
 import xml.parsers.expat  # Switch das2C to use libxml2 as well?
 from lxml import etree
 
+from das2.compress import decompress, sniff_compression
+
 
 class HeaderError(Exception):
 	def __init__(self, line, message):
@@ -63,6 +69,18 @@ g_lValidTags = (
 	'XX'  # Extra packet, content completely unknown
 )
 
+# Size of each PacketReader input buffer chunk
+g_nDefBufSize = 4*1024*1024
+
+# Most distinct data headers each PacketReader keeps parsed
+g_nMaxHdrs = 1024
+
+# Row type of the PacketReader packet index.  The offset and length are for
+# the packet body, not the tag.
+g_dtPktIndex = numpy.dtype([
+	('tag','S2'), ('id','i4'), ('offset','i8'), ('length','i8')
+])
+
 # ########################################################################### #
 
 g_sDas2BasicStream  = 'das-basic-stream-v2.2.xsd'
@@ -85,20 +103,34 @@ def getSchemaName(sContent, sVersion, bNameSpace=False):
 
 	return None
 	
+# Compiled schemas by (content, version, namespace), see loadSchema()
+g_dSchemas = {}
+g_lockSchemas = threading.Lock()
+
 def loadSchema(sContent, sVersion, bNameSpace=False):
 	"""Load the appropriate das2 schema file from the package data location
 	typcially this one of the files:
 
 		$ROOT_DAS2_PKG/xsd/*.xsd
 
+	Compiled schemas are cached, so only the first call for any given
+	content, version and namespace combination reads the XSD file.
+
 	Args:
 		sContent - one of 'das-baisc-stream' or 'das-basic-doc'
 		sVersion - The stream version number, typically 2.2 or 3.0
 
 	Returns (schema, location):
-		schema - An lxml.etree.XMLSchema object
+		schema - An lxml.etree.XMLSchema object, shared by all callers
 		location - Where the schema was loaded from
 	"""
+	tKey = (sContent, sVersion, bool(bNameSpace))
+	with g_lockSchemas:
+		if tKey not in g_dSchemas:
+			g_dSchemas[tKey] = _compileSchema(sContent, sVersion, bNameSpace)
+		return g_dSchemas[tKey]
+
+def _compileSchema(sContent, sVersion, bNameSpace):
 	sMyDir = dname(os.path.abspath( __file__))
 	sSchemaDir = pjoin(sMyDir)
 	
@@ -118,7 +150,8 @@ def loadSchema(sContent, sVersion, bNameSpace=False):
 	except:
 		fSchema = open(sPath)
 
-	schema_doc = etree.parse(fSchema)
+	with fSchema:
+		schema_doc = etree.parse(fSchema)
 	schema = etree.XMLSchema(schema_doc)
 	
 	return (schema,sPath)
@@ -380,10 +413,11 @@ class Packet(object):
 		length - The original length of the packet before decoding UTF-8
 		     strings.
 			
-		content - Exther a bytestr (data packets) or a string (header 
-		     packets.  If the packet is a header then the bytes are 
-			  decode as utf-8. If the packet contains data the a raw
-			  bytestr is returned.
+		content - Either a bytestr (header packets) or a memoryview (data
+		     packets).  Header bytes are utf-8 text.  Data packet content
+		     refers directly to the reader's input buffer unless the
+		     reader was created with copy=True, call bytes() on it to get
+		     a stand alone copy.
 	"""
 
 	def __init__(self, sver, tag, id, length, content):
@@ -461,6 +495,80 @@ class DataHdrPkt(HdrPkt):
 		
 		return self.nDatLen
 
+	def fields(self):
+		"""The values in each data packet, in packet order.
+
+		Returns: A list of (name, dtype, shape, units, kind) tuples, or None
+			for variable length packets.  Names are the das2.2 plane name
+			(or element name if it's empty) and 'dimension.role' for das3
+			streams, for example 'time.reference'.  The kind is one of:
+
+			  - 'time'   - Text times or numbers in das epoch units
+			  - 'number' - Binary numbers or numbers encoded as text
+			  - 'text'   - Any other text values
+			  - 'opaque' - Raw bytes, such as images
+		"""
+		(lFields, bComplete) = _pktFields(self)
+		if not bComplete: return None
+		return [t[:5] for t in lFields]
+
+	def dtype(self):
+		"""Get a numpy structured type for the packets defined by this header.
+
+		Returns: numpy.dtype or None
+			A structured type with one named field per value, see fields(),
+			or None for variable length packets.
+		"""
+		if not hasattr(self, '_dtype'):
+			self._dtype = None
+			lFields = self.fields()
+			if lFields != None:
+				self._dtype = numpy.dtype([
+					(sName, sType, tShape) for (sName, sType, tShape, _, _) in lFields
+				])
+		return self._dtype
+
+	def decode(self, xData):
+		"""Decode the payloads of one or more data packets.
+
+		Args:
+			xData (bytes-like) : The content of one data packet, or the
+				concatenated content of many.
+
+		Returns: numpy.ndarray
+			A structured array with one record per packet.  The array refers
+			to xData, it's not a copy.  Use values() to convert the records.
+		"""
+		dt = self.dtype()
+		if dt == None:
+			raise ValueError("Packets for ID %d are not a fixed length"%self.id)
+		return numpy.frombuffer(xData, dtype=dt)
+
+	def values(self, aRecs):
+		"""Convert decoded packet records to usable arrays.
+
+		Args:
+			aRecs (numpy.ndarray) : Records from decode() or
+				PacketReader.records()
+
+		Returns: dict
+			Maps each field name to an array.  Times are datetime64[ns],
+			numbers (even those sent as text) are in native byte order,
+			text and opaque values are left as they are.
+		"""
+		dOut = {}
+		for (sName, sType, tShape, sUnits, sKind) in self.fields():
+			aVals = aRecs[sName]
+			if sKind == 'time':
+				aVals = _toTime64(aVals, sUnits)
+			elif sKind == 'number':
+				if aVals.dtype.kind == 'S':
+					aVals = aVals.astype('f8')
+				else:
+					aVals = aVals.astype(aVals.dtype.newbyteorder('='), copy=False)
+			dOut[sName] = aVals
+		return dOut
+
 class DataPkt(Packet):
 	"""A packet of data to display or otherwise use"""
 	def __init__(self, sver, tag, id, length, content):
@@ -468,6 +576,275 @@ class DataPkt(Packet):
 
 	# Nothing special defined for data packets yet
 
+# ########################################################################## #
+# Packet value types
+
+def _das2ItemType(sType):
+	"""Get the numpy type of a das2.2 value from it's type attribute.
+
+	Args:
+		sType (str) - A das2.2 type name, such as 'little_endian_real4',
+			'ascii11' or 'time24'.
+
+	Returns: A numpy dtype string.  Text values are returned as fixed length
+		byte strings, 'S11' for example.
+	"""
+	nSize = _getDas2ValSz(sType, None)
+	if sType.startswith('little_endian_real'): return '<f%d'%nSize
+	if sType.startswith('sun_real'): return '>f%d'%nSize
+	if sType.startswith('ascii') or sType.startswith('time'): return 'S%d'%nSize
+	raise ValueError("Unknown das2 value type '%s'"%sType)
+
+def _das3ItemType(sEncoding, nBytes):
+	"""Get the numpy type of a das3 value from a <packet> element encoding.
+
+	Args:
+		sEncoding (str) - The encoding attribute, such as 'LEreal' or 'utf8'
+		nBytes (int) - The itemBytes attribute
+
+	Returns: A numpy dtype string.  Text values are fixed length byte
+		strings, opaque values (png, jpeg, none) are raw 'V' items and byte
+		values longer than one byte are sub-arrays, '8u1' for example.
+	"""
+	if sEncoding == 'utf8': return 'S%d'%nBytes
+	if sEncoding in ('byte', 'ubyte'):
+		# Multi-byte items are kept as small arrays of bytes
+		sType = 'i1' if sEncoding == 'byte' else 'u1'
+		return sType if nBytes == 1 else '%d%s'%(nBytes, sType)
+	if sEncoding in ('png', 'jpeg', 'none'): return 'V%d'%nBytes
+
+	dKinds = {'int':'i', 'uint':'u', 'real':'f'}
+	if (sEncoding[:2] in ('LE','BE')) and (sEncoding[2:] in dKinds):
+		return '%s%s%d'%(
+			'<' if sEncoding[:2] == 'LE' else '>', dKinds[sEncoding[2:]], nBytes
+		)
+	raise ValueError("Unknown das3 value encoding '%s'"%sEncoding)
+
+# Epoch time units, the epoch and the number of nanoseconds per unit
+g_dEpochs = {
+	't2000':('2000-01-01', 1000000000), 'us2000':('2000-01-01', 1000),
+	'mj1958':('1958-01-01', 86400000000000), 't1970':('1970-01-01', 1000000000),
+	'ms1970':('1970-01-01', 1000000), 'us1970':('1970-01-01', 1000),
+	'ns1970':('1970-01-01', 1),
+	'TT2000':('2000-01-01T11:58:55.816', 1)
+}
+
+# Leap seconds inserted since 2000, only needed for TT2000 values
+g_aLeapSecs = numpy.array(
+	['2006-01-01', '2009-01-01', '2012-07-01', '2015-07-01', '2017-01-01'],
+	dtype='M8[ns]'
+)
+
+g_ptrnTime = re.compile(
+	r'\s*(\d{4})-(\d{2})-(\d{2})(?:[T ](\d{1,2})(?::(\d{2})(?::(\d{2}(?:\.\d*)?))?)?)?\s*Z?\s*$'
+)
+
+def _parseTime(sTime):
+	"""Parse an ISO-8601 calendar or day-of-year time string, bytes are
+	accepted too.
+
+	Returns: A numpy.datetime64 in nanoseconds
+	"""
+	if isinstance(sTime, bytes): sTime = sTime.decode('utf-8')
+
+	# Day of year strings don't have a month field, rewrite them
+	m = re.match(r'\s*(\d{4})-(\d{3})(?=$|[T ])(.*)$', sTime)
+	if m:
+		dt = numpy.datetime64(m.group(1), 'D') + numpy.timedelta64(int(m.group(2)) - 1, 'D')
+		sTime = '%s%s'%(dt, m.group(3))
+
+	m = g_ptrnTime.match(sTime)
+	if not m:
+		raise ValueError("Unknown time format '%s'"%sTime)
+
+	dt = numpy.datetime64('%s-%s-%s'%m.group(1, 2, 3), 'ns')
+	if m.group(4): dt += numpy.timedelta64(int(m.group(4)), 'h')
+	if m.group(5): dt += numpy.timedelta64(int(m.group(5)), 'm')
+	if m.group(6): dt += numpy.timedelta64(int(round(float(m.group(6))*1e9)), 'ns')
+	return dt
+
+def _toTime64(aValues, sUnits):
+	"""Convert an array of das time values to datetime64[ns].
+
+	Args:
+		aValues (ndarray) - Either text times (any string dtype) or numbers
+			in one of the epoch units listed in g_dEpochs.
+		sUnits (str) - The units of the values, only used for numbers.
+
+	Returns: A datetime64[ns] array with the same shape as aValues
+	"""
+	aValues = numpy.asarray(aValues)
+	if aValues.dtype.kind in 'SU':
+		# Numpy parses plain ISO-8601 calendar times in bulk, anything else
+		# goes through _parseTime one by one
+		aText = numpy.char.strip(aValues.astype('S'), b' \t\r\n\x00Z')
+		aDays = None
+		nSize = aText.dtype.itemsize
+		if nSize >= 8:
+			# Rewrite YYYY-DDD day of year times as YYYY-01-01 plus DDD-1 days
+			aChars = aText.reshape(-1).view('u1').reshape(-1, nSize)
+			aDigits = aChars[:,5:8].astype('i4') - ord('0')
+			if (len(aChars) > 0) and (aChars[:,4] == ord('-')).all() and \
+			   ((aDigits >= 0) & (aDigits <= 9)).all() and \
+			   numpy.isin(aChars[:,8], (0, ord('T'))).all():
+				aCal = numpy.zeros((len(aChars), nSize + 2), dtype='u1')
+				aCal[:,0:5] = aChars[:,0:5]
+				aCal[:,5:10] = numpy.frombuffer(b'01-01', dtype='u1')
+				aCal[:,10:] = aChars[:,8:]
+				aText = aCal.view('S%d'%(nSize + 2)).reshape(aValues.shape)
+				aDays = (aDigits * [100, 10, 1]).sum(axis=1) - 1
+		try:
+			aOut = aText.astype('U').astype('M8[ns]')
+			if aDays is not None:
+				aOut += aDays.reshape(aValues.shape).astype('m8[D]')
+			return aOut
+		except ValueError:
+			pass
+
+		aOut = numpy.empty(aValues.shape, dtype='M8[ns]')
+		aFlat = aOut.reshape(-1)
+		for (i, sTime) in enumerate(aValues.reshape(-1)):
+			aFlat[i] = _parseTime(sTime)
+		return aOut
+
+	if sUnits not in g_dEpochs:
+		raise ValueError("Values in units of '%s' are not times"%sUnits)
+
+	(sEpoch, nScale) = g_dEpochs[sUnits]
+	if aValues.dtype.kind == 'f':
+		aNs = numpy.round(aValues*nScale).astype('i8')
+	else:
+		aNs = aValues.astype('i8')*nScale
+
+	if sUnits == 'TT2000':
+		# Find the leap seconds using TT2000 values for each one, not UTC
+		aLeaps = (g_aLeapSecs - numpy.datetime64(sEpoch, 'ns')).astype('i8') + \
+			numpy.arange(1, len(g_aLeapSecs) + 1)*1000000000
+		aNs = aNs - numpy.searchsorted(aLeaps, aNs, side='right')*1000000000
+
+	return numpy.datetime64(sEpoch, 'ns') + aNs.astype('m8[ns]')
+
+def _fromTime64(aTimes, sUnits):
+	"""Convert datetime64 values to numbers in a das epoch unit, the inverse
+	of _toTime64().
+
+	Returns: An int64 array for TT2000 and ns1970, float64 for the others
+	"""
+	if sUnits not in g_dEpochs:
+		raise ValueError("Values in units of '%s' are not times"%sUnits)
+
+	aTimes = numpy.asarray(aTimes).astype('M8[ns]')
+	(sEpoch, nScale) = g_dEpochs[sUnits]
+	aNs = (aTimes - numpy.datetime64(sEpoch, 'ns')).astype('i8')
+	if sUnits == 'TT2000':
+		aNs = aNs + numpy.searchsorted(g_aLeapSecs, aTimes, side='right')*1000000000
+	if nScale == 1: return aNs
+	return aNs / float(nScale)
+
+def _localName(el):
+	# Element name without any namespace, None for comments and the like
+	if not isinstance(el.tag, str): return None
+	return etree.QName(el).localname
+
+def _pktFields(pkt):
+	"""Get the values in each data packet defined by a header, in order.
+
+	Args:
+		pkt (DataHdrPkt) - The header for the data packets
+
+	Returns: (list, bool)
+		A list of (name, dtype, shape, units, kind, offset) tuples and
+		True if all values were listed, or False if listing stopped at a
+		variable length value.  See DataHdrPkt.fields() for the tuple items.
+	"""
+	elRoot = pkt.docTree().getroot()
+
+	lFields = []
+	nOffset = 0
+
+	def add(sName, sType, nItems, sUnits, sKind):
+		lNames = [t[0] for t in lFields]
+		sUnique = sName
+		i = 1
+		while sUnique in lNames:
+			i += 1
+			sUnique = "%s_%d"%(sName, i)
+
+		tShape = () if nItems == 1 else (nItems,)
+		lFields.append((sUnique, sType, tShape, sUnits, sKind, nOffset))
+		return numpy.dtype(sType).itemsize * nItems
+
+	if pkt.sver < '3':
+		for child in elRoot:
+			if 'type' not in child.attrib: return (lFields, False)
+			sType = child.attrib['type']
+			sUnits = child.attrib.get('units', child.attrib.get('zUnits', ''))
+
+			nItems = 1
+			if (child.tag == 'yscan') and ('nitems' in child.attrib):
+				nItems = int(child.attrib['nitems'], 10)
+
+			sKind = 'number'
+			if sType.startswith('time') or \
+			   ((child.tag == 'x') and (sUnits in g_dEpochs)):
+				sKind = 'time'
+
+			nOffset += add(
+				child.attrib.get('name') or child.tag, _das2ItemType(sType),
+				nItems, sUnits, sKind
+			)
+		return (lFields, True)
+
+	for axis in elRoot:
+		sAxis = _localName(axis)
+		if sAxis in (None, 'extension', 'properties'): continue
+		sDim = axis.attrib.get('name') or axis.attrib.get('physDim') or sAxis
+
+		for array in axis:
+			if _localName(array) not in ('scalar','vector','object'): continue
+			sRole = array.attrib.get('use', 'center')
+			sUnits = array.attrib.get('units', '')
+			sSemantic = array.attrib.get('semantic', '')
+
+			for el in array:
+				if _localName(el) != 'packet': continue
+				sItems = el.attrib.get('numItems', '*')
+				sBytes = el.attrib.get('itemBytes', '*')
+				if (sItems == '*') or (sBytes == '*'): return (lFields, False)
+
+				sEnc = el.attrib['encoding']
+				if sEnc in ('png', 'jpeg', 'none'): sKind = 'opaque'
+				elif (sUnits in g_dEpochs) or \
+				     ((sEnc == 'utf8') and (sSemantic == 'datetime')):
+					sKind = 'time'
+				elif (sEnc == 'utf8') and (sSemantic not in ('real','integer','bool')):
+					sKind = 'text'
+				else:
+					sKind = 'number'
+
+				nOffset += add(
+					"%s.%s"%(sDim, sRole), _das3ItemType(sEnc, int(sBytes, 10)),
+					int(sItems, 10), sUnits, sKind
+				)
+
+	return (lFields, True)
+
+def _timeField(pkt):
+	"""Find the first time value in a data packet.
+
+	Args:
+		pkt (DataHdrPkt) - The header for the data packets
+
+	Returns: (offset, dtype, units) or None
+		The byte offset of the value in each data packet, it's numpy type
+		and the units string.  None is returned if the packets don't have a
+		time value at a fixed location.
+	"""
+	for (sName, sType, tShape, sUnits, sKind, nOffset) in _pktFields(pkt)[0]:
+		if (sKind == 'time') and (tShape == ()):
+			return (nOffset, sType, sUnits)
+	return None
+
 # ########################################################################## #
 def streamType(xFirst):
 	"""Read the first bytes of the stream and try to determine the stream 
@@ -553,10 +930,51 @@ def streamType(xFirst):
 class PacketReader:
 	"""This packet reader can handle either das v2.2 or v3.0 streams as
 	well as das v3.0 documents
+
+	Input is read in large chunks into a reusable buffer and data packet
+	payloads are handed out as memoryviews into that buffer, so iterating
+	over a stream costs roughly one read call per chunk instead of several
+	per packet.
 	"""
 	
-	def __init__(self, fIn):
+	def __init__(self, fIn, copy=False, bufsize=g_nDefBufSize, mmap=False,
+		index=None):
+		"""Read packets from a file-like object.
+
+		Args:
+			fIn (file) : A binary stream, anything with a read() method will
+				do, though objects with readinto() are handled without
+				intermediate copies.
+
+			copy (bool, optional) : By default the content of data packets is
+				a memoryview into the reader's buffer, which avoids copying
+				each payload.  The views stay valid after the next packet is
+				read, but they keep a buffer chunk alive for as long as they
+				are referenced.  Set this to True to get independent bytes
+				objects instead.
+
+			bufsize (int, optional) : The size of each read buffer chunk.
+				Packets larger than this get a chunk of their own.
+
+			mmap (bool, optional) : Memory map the file instead of reading it.
+				fIn must be a regular file, the whole file is mapped no matter
+				the current read position.  The stream is scanned once to
+				build a packet index which makes len(), reader[n],
+				packets() and seek_time() available.  Data packets are slices
+				of the map.
+
+			index (bool, str, optional) : Only used in mmap mode.  Save the
+				packet index to this sidecar file and re-use it when the
+				stream has the same size and modification time, skipping the
+				scan.  If True the index is saved next to the stream file
+				with the extra extension '.pktidx'.
+
+		gzip and zstd compressed input is decompressed as it's read, see
+		das2.compress.decompress().  Compressed files can't be memory mapped.
+		"""
+		if not mmap: fIn = decompress(fIn)
 		self.fIn = fIn
+		self.bCopy = copy
 		self.lPktSize = [None]*1000
 		self.lPktDef  = [False]*1000
 		self.nOffset = 0
@@ -564,6 +982,34 @@ class PacketReader:
 		self.sVersion = "2.2"
 		self.sTagStyle = "fixed"  # Other choices are "var" and "none"
 		self.bUsingNs = False # True if explicit namespaces in use
+
+		self.map = None      # The memory map, if any
+		self.aIndex = None   # Packet index, mmap mode only
+		self.iNext = 0       # Next packet to return in mmap mode
+		self.dTimes = {}     # Data packet times by ID, see seek_time()
+		self.xTag = None     # Tag of the last data packet read from the buffer
+		self.dHdrs = {}      # First data header packet by content, see _dataHdr()
+
+		# Input buffer, bytes [iBeg:iEnd] of the current chunk are unread
+		self.nBufSize = max(int(bufsize), 65536)
+		self.iBeg = 0
+		self.bEof = False
+		if mmap:
+			self.map = MMap(fIn.fileno(), 0, access=ACCESS_READ)
+			if sniff_compression(self.map[:4]):
+				self.map.close()
+				raise ValueError("Compressed streams can't be memory mapped")
+			self.buf = self.map
+			self.iEnd = len(self.map)
+			self.bEof = True
+		else:
+			self.buf = bytearray(self.nBufSize)
+			self.iEnd = 0
+		self.view = memoryview(self.buf)
+
+		self.fReadInto = getattr(fIn, 'readinto1', None)
+		if self.fReadInto == None:
+			self.fReadInto = getattr(fIn, 'readinto', None)
 		
 		# See if this stream is using variable tags and try to guess the content
 		# using the first 1024 bytes.  Assume a das2.2 stream unless we see
@@ -571,9 +1017,10 @@ class PacketReader:
 		# stream header may have many xml schema and namespace references for
 		# the all-in-one XML documents
 		
-		self.xFirst = fIn.read(65536)
+		self._fill(65536)
+		xFirst = bytes(self.view[self.iBeg:min(self.iEnd, self.iBeg + 65536)])
 
-		(self.sContent, self.sVersion, self.sTagStyle, self.bUsingNs) = streamType(self.xFirst)
+		(self.sContent, self.sVersion, self.sTagStyle, self.bUsingNs) = streamType(xFirst)
 
 		if self.sContent not in ('das-basic-stream', 'das-basic-doc'):
 			raise ValueError("Support stream type '%s' has not been implemented"%self.sContent)
@@ -582,20 +1029,66 @@ class PacketReader:
 			raise ValueError(
 				"Support for reading documents instead of packetize streams has not been implemented"
 			)
+
+		if self.map is not None:
+			if index is True:
+				sName = getattr(fIn, 'name', None)
+				index = (sName + '.pktidx') if isinstance(sName, str) else None
+			self._loadIndex(index)
 			
 	def streamType(self):
 		return (self.sContent, self.sVersion, self.sTagStyle, self.bUsingNs)		
+
+	def _fill(self, nBytes):
+		"""Make sure at least nBytes are buffered, unless the input ends first.
+
+		Returns: The number of unread bytes in the buffer
+		"""
+		nHave = self.iEnd - self.iBeg
+		if (nHave >= nBytes) or self.bEof:
+			return nHave
+
+		# Not enough room left in this chunk, carry the unread bytes over to a
+		# new one.  The old chunk is never written again since data packet
+		# views handed out earlier may still point into it.
+		if self.iBeg + nBytes > len(self.buf):
+			buf = bytearray(max(self.nBufSize, nBytes))
+			buf[0:nHave] = self.view[self.iBeg:self.iEnd]
+			self.buf = buf
+			self.view = memoryview(buf)
+			self.iBeg = 0
+			self.iEnd = nHave
+
+		while self.iEnd - self.iBeg < nBytes:
+			if self.fReadInto:
+				nRead = self.fReadInto(self.view[self.iEnd:])
+			else:
+				xRead = self.fIn.read(len(self.buf) - self.iEnd)
+				nRead = len(xRead)
+				self.view[self.iEnd:self.iEnd + nRead] = xRead
+
+			if not nRead:
+				self.bEof = True
+				break
+			self.iEnd += nRead
+
+		return self.iEnd - self.iBeg
+
+	def _take(self, nBytes):
+		"""Consume up to nBytes from the input, returned as a memoryview"""
+		nBytes = min(nBytes, self._fill(nBytes))
+		view = self.view[self.iBeg:self.iBeg + nBytes]
+		self.iBeg += nBytes
+		return view
 		
 	def _read(self, nBytes):
-		xOut = b''
-		if len(self.xFirst) > 0:
-			xOut = self.xFirst[0:nBytes]
-			self.xFirst = self.xFirst[nBytes:]
-			
-		if len(xOut) < nBytes:
-			xOut += self.fIn.read(nBytes - len(xOut))
+		"""Consume up to nBytes from the input, returned as bytes"""
+		return bytes(self._take(nBytes))
 
-		return xOut
+	def _payload(self, nBytes):
+		"""Consume a data packet body, copied only if requested"""
+		if self.bCopy: return self._read(nBytes)
+		return self._take(nBytes)
 
 	def setDataSize(self, nPktId, nBytes):
 		"""Callback used when parsing das2.2 and earlier streams.  These had
@@ -609,6 +1102,395 @@ class PacketReader:
 		
 		self.lPktSize[nPktId] = nBytes
 		
+	def _dataHdr(self, sTag, nPktId, nLen, xDoc):
+		"""Make a data header packet and set the data packet size for its ID.
+
+		Servers often repeat the same headers many times in a stream, so
+		each distinct header is parsed once.  The parse tree and packet size
+		are kept by content and handed to every packet with the same bytes,
+		which saves DataHdrPkt.docTree() from parsing them again.  So is the
+		record type, if dtype() has been called on an earlier copy.
+		"""
+		pkt = DataHdrPkt(self.sVersion, sTag, nPktId, nLen, xDoc)
+
+		first = self.dHdrs.get(xDoc)
+		if first == None:
+			if self.sVersion == '2.2':
+				pkt.tree = Das22HdrParser().parse(BytesIO(xDoc))
+			else:
+				pkt.tree = etree.parse(BytesIO(xDoc))
+
+			# Note, the size can be None!
+			pkt.nDatLen = _getPktLen(pkt.tree.getroot(), self.sVersion, nPktId, False)
+
+			if len(self.dHdrs) >= g_nMaxHdrs: self.dHdrs.clear()
+			self.dHdrs[xDoc] = pkt
+		else:
+			pkt.tree = first.tree
+			pkt.nDatLen = first.nDatLen
+			if hasattr(first, '_dtype'): pkt._dtype = first._dtype
+
+		return pkt
+
+	def _loadIndex(self, sFile):
+		"""Get the packet index from a sidecar file, or by scanning the map"""
+		st = os.fstat(self.fIn.fileno())
+		aStamp = numpy.array([st.st_size, st.st_mtime_ns], dtype='i8')
+
+		if sFile and os.path.isfile(sFile):
+			try:
+				with numpy.load(sFile) as npz:
+					if numpy.array_equal(npz['stamp'], aStamp):
+						self.aIndex = npz['index']
+						return
+			except (IOError, OSError, ValueError, KeyError):
+				pass # Unreadable or foreign file, just re-scan
+
+		lRows = []
+		lRuns = []
+		while True:
+			try:
+				pkt = self._nextPkt()
+			except StopIteration:
+				break
+			lRows.append((pkt.tag, pkt.id, self.nOffset - pkt.length, pkt.length))
+			if not isinstance(pkt, DataPkt): continue
+
+			# Index the identical packets that follow in one go
+			nOffset = self.nOffset
+			nRun = len(self._takeRun(pkt.length, None))
+			if nRun == 0: continue
+			lRuns.append(numpy.array(lRows, dtype=g_dtPktIndex))
+			lRows = []
+			aRun = numpy.empty(nRun, dtype=g_dtPktIndex)
+			aRun['tag'] = pkt.tag
+			aRun['id'] = pkt.id
+			aRun['length'] = pkt.length
+			nStride = len(self.xTag) + pkt.length
+			aRun['offset'] = nOffset + len(self.xTag) + nStride*numpy.arange(nRun)
+			lRuns.append(aRun)
+
+		lRuns.append(numpy.array(lRows, dtype=g_dtPktIndex))
+		self.aIndex = numpy.concatenate(lRuns)
+		self.iBeg = 0
+		self.nOffset = 0
+
+		if not sFile: return
+
+		# Write then rename so that other readers never see partial indexes
+		sTmp = "%s.%d.tmp"%(sFile, os.getpid())
+		try:
+			with open(sTmp, 'wb') as fOut:
+				numpy.savez(fOut, index=self.aIndex, stamp=aStamp)
+			os.replace(sTmp, sFile)
+		except (IOError, OSError) as e:
+			sys.stderr.write("Could not write packet index %s, %s\n"%(sFile, str(e)))
+			try:
+				os.remove(sTmp)
+			except OSError:
+				pass
+
+	def _index(self):
+		if self.aIndex is None:
+			raise ValueError("Random packet access requires a reader opened with mmap=True")
+		return self.aIndex
+
+	def __len__(self):
+		"""The number of packets in the stream, mmap mode only"""
+		if self.aIndex is None:
+			# TypeError, since list() and friends probe len() for a size hint
+			raise TypeError("Stream length is only known in mmap mode")
+		return len(self.aIndex)
+
+	def __getitem__(self, n):
+		"""Get packet number n from the stream, mmap mode only.
+
+		Header packets are parsed without regard to the packets that came
+		before them, so the reader's das2.2 data length table is not updated.
+		"""
+		(xTag, nId, nOffset, nLen) = self._index()[n]
+		sTag = xTag.decode('utf-8')
+		nId = int(nId)
+		nOffset = int(nOffset)
+		nLen = int(nLen)
+
+		if sTag == 'Pd':
+			xData = self.view[nOffset:nOffset + nLen]
+			if self.bCopy: xData = bytes(xData)
+			return DataPkt(self.sVersion, sTag, nId, nLen, xData)
+
+		xDoc = bytes(self.view[nOffset:nOffset + nLen])
+		if sTag == 'Hx':
+			return self._dataHdr(sTag, nId, nLen, xDoc)
+		return HdrPkt(self.sVersion, sTag, nId, nLen, xDoc)
+
+	def packets(self, id=None, tag='Pd'):
+		"""Iterate over selected packets, mmap mode only.
+
+		Args:
+			id (int, optional) : Only return packets with this ID
+			tag (str, optional) : Only return packets with this tag, use None
+				for all tags.  Defaults to data packets.
+
+		Returns: A generator of Packet objects, does not change the position
+			of the main iterator.
+		"""
+		aIndex = self._index()
+		aMask = numpy.ones(len(aIndex), dtype=bool)
+		if id != None: aMask &= (aIndex['id'] == id)
+		if tag != None: aMask &= (aIndex['tag'] == tag.encode('utf-8'))
+		return (self[n] for n in numpy.flatnonzero(aMask))
+
+	def _pktTimes(self, nPktId):
+		"""Get the packet numbers and first time value of all data packets with
+		a given ID.  Packets after a header without a time field are skipped.
+		"""
+		if nPktId in self.dTimes: return self.dTimes[nPktId]
+
+		aIndex = self._index()
+		aRows = numpy.flatnonzero(
+			(aIndex['id'] == nPktId) & numpy.isin(aIndex['tag'], (b'Hx', b'Pd'))
+		)
+		aHdrs = numpy.flatnonzero(aIndex['tag'][aRows] == b'Hx')
+		aBytes = numpy.frombuffer(self.map, dtype=numpy.uint8)
+
+		lNums = []
+		lTimes = []
+		for (i, iHdr) in enumerate(aHdrs):
+			iEnd = aHdrs[i+1] if (i+1) < len(aHdrs) else len(aRows)
+			aData = aRows[iHdr+1:iEnd]
+			if len(aData) == 0: continue
+
+			tField = _timeField(self[aRows[iHdr]])
+			if tField == None: continue
+			(nOffset, sType, sUnits) = tField
+			dt = numpy.dtype(sType)
+			aData = aData[aIndex['length'][aData] >= nOffset + dt.itemsize]
+
+			# Gather just the time bytes from every packet in one step
+			aStart = aIndex['offset'][aData] + nOffset
+			aRaw = aBytes[aStart[:,None] + numpy.arange(dt.itemsize)]
+			lTimes.append(_toTime64(aRaw.view(dt).reshape(-1), sUnits))
+			lNums.append(aData)
+
+		del aBytes
+		if len(lNums) == 0:
+			tOut = None
+		else:
+			tOut = (numpy.concatenate(lNums), numpy.concatenate(lTimes))
+		self.dTimes[nPktId] = tOut
+		return tOut
+
+	def seek_time(self, time, id=None):
+		"""Move the iterator to the first data packet at or after a given time,
+		mmap mode only.
+
+		Packets are assumed to be in time order for each packet ID.  Only the
+		first time value in each packet is checked, which is found without
+		decoding the rest of the packet.
+
+		Args:
+			time (str, datetime, numpy.datetime64) : The time to find
+			id (int, optional) : Only consider data packets with this ID,
+				by default the earliest matching packet of any ID is used.
+
+		Returns: int
+			The number of the packet that will be returned next, or len(self)
+			if all data packets are before the given time.
+		"""
+		aIndex = self._index()
+		if isinstance(time, (str, bytes)):
+			time = _parseTime(time)
+		else:
+			time = numpy.datetime64(time, 'ns')
+
+		if id != None:
+			lIds = [id]
+		else:
+			lIds = sorted(set(aIndex['id'][aIndex['tag'] == b'Pd'].tolist()))
+
+		nNext = len(aIndex)
+		bTimes = False
+		for nPktId in lIds:
+			tTimes = self._pktTimes(nPktId)
+			if tTimes == None: continue
+			bTimes = True
+			(aNums, aTimes) = tTimes
+			i = numpy.searchsorted(aTimes, time, side='left')
+			if i < len(aNums): nNext = min(nNext, int(aNums[i]))
+
+		if not bTimes:
+			raise ValueError("No data packets%s have a fixed time value location"%(
+				"" if id == None else " with ID %d"%id
+			))
+
+		self.iNext = nNext
+		return nNext
+
+	def _takeRun(self, nLen, nMax):
+		"""Consume the buffered packets that directly follow the last data
+		packet and have the same tag (thus the same ID and length).
+
+		Returns: A numpy.uint8 array of shape (N, nLen) that views the packet
+			bodies in the buffer.  N may be 0.
+		"""
+		nTag = len(self.xTag)
+		nStride = nTag + nLen
+		nAvail = (self.iEnd - self.iBeg) // nStride
+		if nMax != None: nAvail = min(nAvail, nMax)
+		if nAvail == 0: return numpy.empty((0, nLen), dtype=numpy.uint8)
+
+		aPkts = numpy.frombuffer(
+			self.buf, dtype=numpy.uint8, count=nAvail*nStride, offset=self.iBeg
+		).reshape(nAvail, nStride)
+
+		aSame = (aPkts[:,:nTag] == numpy.frombuffer(self.xTag, dtype=numpy.uint8)).all(axis=1)
+		nRun = nAvail if aSame.all() else int(numpy.argmin(aSame))
+
+		self.iBeg += nRun*nStride
+		self.nOffset += nRun*nStride
+		return aPkts[:nRun, nTag:]
+
+	def _runs(self, nMax):
+		"""Yield (header, list) tuples for each run of consecutive, same ID
+		fixed length data packets.  Lists contain uint8 arrays of shape
+		(N, packet_length), which may be strided views into the input.
+		"""
+		dHdrs = {}
+		hdr = None
+		lRun = []
+		nRun = 0
+
+		if self.aIndex is not None:
+			# Find runs from the index, data rows that continue the previous row
+			aIndex = self.aIndex[self.iNext:]
+			aData = (aIndex['tag'] == b'Pd')
+			aCont = numpy.zeros(len(aIndex), dtype=bool)
+			aCont[1:] = aData[1:] & aData[:-1] & \
+				(aIndex['id'][1:] == aIndex['id'][:-1]) & \
+				(aIndex['length'][1:] == aIndex['length'][:-1])
+			aStarts = numpy.flatnonzero(~aCont)
+			aEnds = numpy.append(aStarts[1:], len(aIndex))
+			aBytes = numpy.frombuffer(self.map, dtype=numpy.uint8)
+
+			for (iBeg, iEnd) in zip(aStarts.tolist(), aEnds.tolist()):
+				if not aData[iBeg]:
+					pkt = self[self.iNext]
+					if isinstance(pkt, DataHdrPkt): dHdrs[pkt.id] = pkt
+					self.iNext += 1
+					continue
+
+				nId = int(aIndex['id'][iBeg])
+				nLen = int(aIndex['length'][iBeg])
+				if nId not in dHdrs:
+					# Started after a seek, find the header before this point
+					aHdrs = numpy.flatnonzero(
+						(self.aIndex['tag'][:self.iNext] == b'Hx') &
+						(self.aIndex['id'][:self.iNext] == nId)
+					)
+					if len(aHdrs) > 0: dHdrs[nId] = self[int(aHdrs[-1])]
+				hdr = dHdrs.get(nId)
+				nStep = (iEnd - iBeg) if nMax == None else nMax
+				for i in range(iBeg, iEnd, nStep):
+					aOffsets = aIndex['offset'][i:min(i + nStep, iEnd)]
+
+					# Same tag and length, packets are usually evenly spaced
+					aDelta = numpy.diff(aOffsets)
+					if (len(aDelta) > 0) and (aDelta == aDelta[0]).all():
+						aPkts = numpy.lib.stride_tricks.as_strided(
+							aBytes[int(aOffsets[0]):], shape=(len(aOffsets), nLen),
+							strides=(int(aDelta[0]), 1), writeable=False
+						)
+					else:
+						aPkts = aBytes[aOffsets[:,None] + numpy.arange(nLen)]
+
+					self.iNext += len(aOffsets)
+					yield (hdr, [aPkts])
+			return
+
+		for pkt in self:
+			if not isinstance(pkt, DataPkt):
+				if nRun > 0: yield (hdr, lRun)
+				lRun = []
+				nRun = 0
+				if isinstance(pkt, DataHdrPkt): dHdrs[pkt.id] = pkt
+				continue
+
+			if (nRun > 0) and ((pkt.id != hdr.id) or (pkt.length != lRun[0].shape[1]) \
+			   or ((nMax != None) and (nRun >= nMax))):
+				yield (hdr, lRun)
+				lRun = []
+				nRun = 0
+
+			hdr = dHdrs.get(pkt.id)
+			lRun.append(numpy.frombuffer(pkt.content, dtype=numpy.uint8).reshape(1, -1))
+			nRun += 1
+
+			# The rest of the run, if it's already in the buffer
+			aPkts = self._takeRun(pkt.length, None if nMax == None else nMax - nRun)
+			if len(aPkts) > 0:
+				lRun.append(aPkts)
+				nRun += len(aPkts)
+
+		if nRun > 0: yield (hdr, lRun)
+
+	def records(self, id=None, max_recs=None):
+		"""Decode fixed length data packets in bulk.
+
+		Runs of consecutive data packets with the same ID are decoded as a
+		single structured array using the type from DataHdrPkt.dtype(), one
+		record per packet.  Packets that follow the current one and are
+		already in the read buffer (or the map) are picked up in a single
+		numpy operation, so most packets never become Packet objects.  Data
+		packets without a fixed length layout are skipped, iterate over the
+		reader to get those.
+
+		This consumes the reader, or in mmap mode continues from the current
+		position.
+
+		Args:
+			id (int, optional) : Only return records for this packet ID
+			max_recs (int, optional) : Split runs longer than this, which
+				bounds memory use when reading streams.
+
+		Returns: A generator of (DataHdrPkt, numpy.ndarray) tuples.  Use
+			DataHdrPkt.values() to convert the records to usual types.  When
+			a run sits in a single buffer chunk (or in the map) the records
+			are a view of it unless the reader was created with copy=True.
+
+		Example:
+
+			>>> reader = das2.PacketReader(open('waves.d3b', 'rb'))
+			>>> for (hdr, aRecs) in reader.records():
+			...    dVals = hdr.values(aRecs)
+		"""
+		for (hdr, lRun) in self._runs(max_recs):
+			if (hdr == None) or ((id != None) and (hdr.id != id)): continue
+			dt = hdr.dtype()
+			if (dt == None) or (lRun[0].shape[1] != dt.itemsize): continue
+
+			if len(lRun) == 1:
+				aPkts = lRun[0]
+				if self.bCopy: aPkts = aPkts.copy()
+			else:
+				aPkts = numpy.concatenate(lRun)
+
+			# View each row of bytes as one record, no copy needed
+			aRecs = aPkts.view(dt)[:,0]
+			yield (hdr, aRecs)
+
+	def close(self):
+		"""Release the memory map, if any.  The map stays open while views
+		from data packets are still held elsewhere.
+		"""
+		if self.map is None: return
+		self.dTimes = {}
+		try:
+			self.view.release()
+			self.map.close()
+		except BufferError:
+			pass # Outstanding packet views, the map closes when they do
+		
 	def __iter__(self):
 		return self
 		
@@ -628,6 +1510,17 @@ class PacketReader:
 		The reader can iterate over all das2 streams, unless it has been
 		set to strict mode
 		"""
+		if self.aIndex is not None:
+			if self.iNext >= len(self.aIndex):
+				raise StopIteration
+			pkt = self[self.iNext]
+			self.nOffset = int(self.aIndex['offset'][self.iNext]) + pkt.length
+			self.iNext += 1
+			return pkt
+
+		return self._nextPkt()
+
+	def _nextPkt(self):
 		x4 = self._read(4)
 		if len(x4) != 4:
 			raise StopIteration
@@ -730,13 +1623,9 @@ class PacketReader:
 				# the higher level information just to get the size of a packet.
 				# Every other networking protocol in the world knows to include
 				# either lengths or terminators.  Geeeze.  Well... go parse it.
-				parser = Das22HdrParser()
-				fPkt = BytesIO(xDoc)
-				docTree = parser.parse(fPkt)
-				elRoot = docTree.getroot()
-				self.lPktSize[nPktId] = _getPktLen(elRoot, self.sVersion, nPktId, False)
-
-				return DataHdrPkt(self.sVersion, sTag, nPktId, nLen, xDoc)
+				pkt = self._dataHdr(sTag, nPktId, nLen, xDoc)
+				self.lPktSize[nPktId] = pkt.nDatLen
+				return pkt
 
 			elif (x4 == b'[xx]') or (x4 == b'[XX]'):
 				if sDoc.startswith('<exception'): sTag = 'Ex'
@@ -761,12 +1650,13 @@ class PacketReader:
 					"Internal error, unknown length for data packet %d"%nPktId
 				)
 			
-			xData = self._read(self.lPktSize[nPktId])
+			xData = self._payload(self.lPktSize[nPktId])
 			self.nOffset += len(xData)
 			
 			if len(xData) != self.lPktSize[nPktId]:
 				raise ValueError("Premature end of packet data for id %d"%nPktId)
 			
+			self.xTag = x4
 			return DataPkt(self.sVersion, 'Pd', nPktId, len(xData), xData)
 
 		raise ValueError(
@@ -783,23 +1673,27 @@ class PacketReader:
 		
 		nBegOffset = self.nOffset - 4
 		
-		# Accumulate the packet tag
-		xTag = x4
-		nPipes = 2
-		while nPipes < 4:
-			x1 = self._read(1)
-			if len(x1) == 0: break
-			self.nOffset += 1
-			xTag += x1
-			
-			if x1 == b'|':
-				nPipes += 1
-			
-			if len(xTag) > 38:
+		# Accumulate the packet tag, the remaining two pipes have to be found
+		# in the next 34 bytes
+		nAvail = min(self._fill(34), 34)
+		iEnd = self.iBeg + nAvail
+		iPipe = self.buf.find(b'|', self.iBeg, iEnd)
+		if iPipe >= 0:
+			iPipe = self.buf.find(b'|', iPipe + 1, iEnd)
+
+		if iPipe < 0:
+			if nAvail < 34:
+				xTag = x4 + self._read(nAvail)  # Truncated, caught below
+				self.nOffset += nAvail
+			else:
+				xTag = x4 + bytes(self.view[self.iBeg:iEnd])
 				raise ValueError(
 					"Sanity limit of 38 bytes exceeded for packet tag '%s'"%(
 						str(xTag)[2:-1])
 				)
+		else:
+			xTag = x4 + self._read(iPipe + 1 - self.iBeg)
+			self.nOffset += len(xTag) - 4
 		
 		try:
 			lTag = [x.decode('utf-8') for x in xTag.split(b'|')[1:4] ]
@@ -840,7 +1734,8 @@ class PacketReader:
 				"Invalid packet length %d bytes at offset %d"%(nLen, nBegOffset)
 			)
 					
-		xDoc = self._read(nLen)
+		if sTag in ('Pd','XX'): xDoc = self._payload(nLen)
+		else: xDoc = self._read(nLen)
 		self.nOffset += len(xDoc)
 			
 		if len(xDoc) != nLen:
@@ -864,14 +1759,9 @@ class PacketReader:
 
 				# Sanity check, make sure packet is big enough to hold minimum
 				# size das3/basic data.
-				fPkt = BytesIO(xDoc)
-				docTree = etree.parse(fPkt)
-				elRoot = docTree.getroot()
-
-				# Note, this can be None!
-				self.lPktSize[nPktId] = _getPktLen(elRoot, self.sVersion, nPktId, False)
-
-				return DataHdrPkt(self.sVersion, sTag, nPktId, nLen, xDoc)
+				pkt = self._dataHdr(sTag, nPktId, nLen, xDoc)
+				self.lPktSize[nPktId] = pkt.nDatLen
+				return pkt
 			else:
 				return HdrPkt(self.sVersion, sTag, nPktId, nLen, xDoc)
 		else:
@@ -883,4 +1773,5 @@ class PacketReader:
 				))
 
 			# Return the bytes
+			self.xTag = xTag
 			return DataPkt(self.sVersion, 'Pd', nPktId, nLen, xDoc)
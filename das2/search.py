@@ -0,0 +1,448 @@
+# The MIT License
+#
+# Copyright 2024 Chris Piker
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Local full text search of catalog nodes
+
+Node definitions gathered by a catalog crawl are boiled down to a few fields
+(path, name, title, description, variable names and time coverage) which are
+saved as JSON.  An inverted index of words to nodes is built from these
+in memory, so searches never touch the network.
+"""
+
+import os
+import os.path
+import re
+import sys
+import json
+import bisect
+import hashlib
+import threading
+from collections import namedtuple
+
+from . dastime import DasTime
+from . cache import _defCacheDir
+
+perr = sys.stderr.write
+
+g_reWord = re.compile(r'[a-z0-9]+')
+g_reYear = re.compile(r'^(19|20|21)[0-9]{2}$')
+g_reDate = re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$|^[0-9]{4}-[0-9]{3}$')
+
+# Score for a word found in each field of a node summary
+g_dWeights = {'name':4, 'title':3, 'path':2, 'vars':2, 'text':1}
+
+def _words(sText):
+	return g_reWord.findall(sText.lower()) if sText else []
+
+def _isoTime(value):
+	# Normalize a time range end point, None if it can't be understood
+	if value is None: return None
+	sVal = str(value).strip()
+	if sVal.lower() == 'now': return DasTime.now().isoc(0)
+	try:
+		return DasTime(sVal).isoc(0)
+	except ValueError:
+		return None
+
+def _nodeRange(dDef):
+	# Get the time coverage of a source from the settable range of the time
+	# coordinate, returns (begin, end) ISO strings or None
+	try:
+		dTime = dDef['interface']['coordinates']['time']
+	except (KeyError, TypeError):
+		return None
+
+	for sAsp in ('minimum', 'maximum'):
+		try:
+			lRange = dTime[sAsp]['set']['range']
+		except (KeyError, TypeError):
+			continue
+		if isinstance(lRange, list) and (len(lRange) == 2):
+			sBeg = _isoTime(lRange[0])
+			sEnd = _isoTime(lRange[1])
+			if sBeg and sEnd: return (sBeg, sEnd)
+
+	return None
+
+def _nodeVars(dDef):
+	# Coordinate and data variable names and titles from the interface
+	lOut = []
+	dIface = dDef.get('interface')
+	if not isinstance(dIface, dict): return lOut
+
+	for sSect in ('coordinates', 'data'):
+		dSect = dIface.get(sSect)
+		if not isinstance(dSect, dict): continue
+		for sVar in dSect:
+			lOut.append(sVar)
+			dVar = dSect[sVar]
+			if isinstance(dVar, dict):
+				for sKey in ('name', 'title'):
+					if isinstance(dVar.get(sKey), str): lOut.append(dVar[sKey])
+	return lOut
+
+def node_summary(sPath, sType, dDef):
+	"""Reduce a catalog node definition to the fields used for searching
+
+	Args:
+		sPath (str) : The node's path URI
+
+		sType (str) : The node type, for example 'HttpStreamSrc'
+
+		dDef (dict) : The node definition, i.e. Node.props
+
+	Returns: dict
+		A JSON compatible dictionary with the keys 'path', 'type', 'name',
+		'title', 'text', 'vars', 'range' and 'sig'.  The 'sig' value is a hash
+		of the full definition used to detect changes.
+	"""
+	lText = []
+	for sKey in ('description', 'summary'):
+		if isinstance(dDef.get(sKey), str): lText.append(dDef[sKey])
+
+	dClean = {k:v for (k,v) in dDef.items() if not k.startswith('_')}
+	sSig = hashlib.sha256(
+		json.dumps(dClean, sort_keys=True, default=str).encode('utf-8')
+	).hexdigest()
+
+	return {
+		'path':sPath, 'type':sType,
+		'name':str(dDef.get('name', '')), 'title':str(dDef.get('title', '')),
+		'text':' '.join(lText), 'vars':_nodeVars(dDef), 'range':_nodeRange(dDef),
+		'sig':sSig
+	}
+
+SearchResult = namedtuple('SearchResult', 'path type title score range')
+
+# ########################################################################### #
+
+class SearchIndex(object):
+	"""An inverted index over catalog node summaries.
+
+	Summaries are saved to a JSON file, the word index is rebuilt in memory
+	when the file is loaded.  Instances may be shared between threads.
+
+	Members:
+		- .file - The JSON file backing this index, may be None
+	"""
+
+	def __init__(self, sFile=None):
+		"""Create an index, loading the existing contents of sFile if present
+
+		Args:
+			sFile (str, optional) : The file for saving summaries, use None for
+				an in-memory only index.
+		"""
+		self.file = sFile
+		self._dDocs = {}     # path -> summary
+		self._dPost = {}     # word -> {path: score}
+		self._lVocab = None  # Sorted words for prefix matching, lazy
+		self._lock = threading.Lock()
+
+		if sFile and os.path.isfile(sFile):
+			try:
+				with open(sFile, 'r') as fIn:
+					lDocs = json.load(fIn)
+			except (IOError, OSError, ValueError) as e:
+				perr("Ignoring unreadable search index %s, %s\n"%(sFile, str(e)))
+				lDocs = []
+			for dDoc in lDocs: self._post(dDoc)
+
+	def __len__(self):
+		return len(self._dDocs)
+
+	def __contains__(self, sPath):
+		return sPath in self._dDocs
+
+	def _post(self, dDoc):
+		# Add a summary to the postings, caller holds the lock
+		sPath = dDoc['path']
+		self._dDocs[sPath] = dDoc
+
+		dScore = {}
+		for sField in ('name', 'title', 'text'):
+			for sWord in _words(dDoc[sField]):
+				dScore[sWord] = dScore.get(sWord, 0) + g_dWeights[sField]
+		for sWord in _words(' '.join(dDoc['vars'])):
+			dScore[sWord] = dScore.get(sWord, 0) + g_dWeights['vars']
+		for sWord in _words(sPath.split(':')[-1]):
+			dScore[sWord] = dScore.get(sWord, 0) + g_dWeights['path']
+
+		for (sWord, nScore) in dScore.items():
+			dPaths = self._dPost.get(sWord)
+			if dPaths is None:
+				self._dPost[sWord] = {sPath:nScore}
+				self._lVocab = None
+			else:
+				dPaths[sPath] = nScore
+
+	def _unpost(self, sPath):
+		# Remove a summary from the postings, caller holds the lock
+		dDoc = self._dDocs.pop(sPath, None)
+		if dDoc is None: return
+
+		sAll = ' '.join([dDoc['name'], dDoc['title'], dDoc['text']] + dDoc['vars'])
+		for sWord in set(_words(sAll) + _words(sPath.split(':')[-1])):
+			dPaths = self._dPost.get(sWord)
+			if dPaths is None: continue
+			dPaths.pop(sPath, None)
+			if len(dPaths) == 0:
+				del self._dPost[sWord]
+				self._lVocab = None
+
+	def add(self, sPath, sType, dDef):
+		"""Add or update a single node
+
+		Args:
+			sPath (str) : The node's path URI
+
+			sType (str) : The node type
+
+			dDef (dict) : The node definition
+
+		Returns: bool
+			True if the index changed, False if the node was already indexed
+			with an identical definition.
+		"""
+		dDoc = node_summary(sPath, sType, dDef)
+		with self._lock:
+			dOld = self._dDocs.get(sPath)
+			if (dOld is not None) and (dOld['sig'] == dDoc['sig']): return False
+			self._unpost(sPath)
+			self._post(dDoc)
+		return True
+
+	def remove(self, sPath):
+		"""Drop a node from the index"""
+		with self._lock:
+			self._unpost(sPath)
+
+	def update(self, cat):
+		"""Refresh the index from a loaded catalog tree.
+
+		All loaded nodes below cat (cat included) are added.  Nodes are only
+		re-indexed if thier definition changed, and previously indexed nodes
+		below cat that are no longer in the tree are removed.  Stub nodes are
+		skipped, use Catalog.prefetch() first to load the whole tree.
+
+		Args:
+			cat (Catalog) : The top of the tree to index
+
+		Returns: (int, int)
+			The number of nodes added or changed, and the number removed.
+		"""
+		nChanged = 0
+		setSeen = set()
+
+		lTodo = [cat]
+		while lTodo:
+			node = lTodo.pop()
+			setSeen.add(node.path)
+			if node.bStub: continue
+
+			if self.add(node.path, node.type(), node.props): nChanged += 1
+			if getattr(node, 'subs', None): lTodo += list(node.subs.values())
+
+		# Forget nodes that disappeared from under this catalog
+		sPrefix = cat.path.rstrip('/')
+		nRemoved = 0
+		with self._lock:
+			for sPath in list(self._dDocs.keys()):
+				if sPath in setSeen: continue
+				if sPath == sPrefix or sPath.startswith(sPrefix + '/'):
+					self._unpost(sPath)
+					nRemoved += 1
+
+		return (nChanged, nRemoved)
+
+	def save(self, sFile=None):
+		"""Write the node summaries to disk
+
+		Args:
+			sFile (str, optional) : Output file, defaults to .file
+		"""
+		if sFile is None: sFile = self.file
+		if sFile is None: raise ValueError("No file given for saving the search index")
+
+		sDir = os.path.dirname(sFile)
+		if sDir and not os.path.isdir(sDir): os.makedirs(sDir, exist_ok=True)
+
+		with self._lock:
+			lDocs = list(self._dDocs.values())
+
+		sTmp = "%s.%d.tmp"%(sFile, os.getpid())
+		with open(sTmp, 'w') as fOut:
+			json.dump(lDocs, fOut)
+		os.replace(sTmp, sFile)
+
+	def _match(self, sWord):
+		# Get {path:score} for all words starting with sWord, caller holds lock
+		if self._lVocab is None: self._lVocab = sorted(self._dPost.keys())
+
+		dOut = {}
+		i = bisect.bisect_left(self._lVocab, sWord)
+		while (i < len(self._lVocab)) and self._lVocab[i].startswith(sWord):
+			sVocab = self._lVocab[i]
+			# Exact matches count more than prefix matches
+			nBoost = 2 if sVocab == sWord else 1
+			for (sPath, nScore) in self._dPost[sVocab].items():
+				dOut[sPath] = max(dOut.get(sPath, 0), nScore*nBoost)
+			i += 1
+		return dOut
+
+	def search(self, sQuery, limit=20, type=None):
+		"""Find catalog nodes matching all the words in a query.
+
+		Words match the start of words in node names, titles, descriptions,
+		paths and variable names.  Words that look like a year (2017) or a
+		date (2017-03-01, 2017-060) instead restrict the results to sources
+		with time coverage that overlaps that period.  Nodes without known
+		coverage are not excluded.
+
+		Args:
+			sQuery (str) : Space separated search words
+
+			limit (int, optional) : Maximum number of results, None for all
+
+			type (str, optional) : Only return nodes of this type, for example
+				'HttpStreamSrc'
+
+		Returns: list
+			SearchResult tuples (path, type, title, score, range) with the best
+			matches first.
+		"""
+		lWords = []
+		lRanges = []
+		for sTok in sQuery.lower().split():
+			if g_reYear.match(sTok):
+				lRanges.append(("%s-01-01T00:00:00"%sTok, "%d-01-01T00:00:00"%(int(sTok)+1)))
+			elif g_reDate.match(sTok) and _isoTime(sTok):
+				sBeg = _isoTime(sTok)
+				lRanges.append((sBeg, (DasTime(sBeg) + 86400.0).isoc(0)))
+			else:
+				lWords += _words(sTok)
+
+		with self._lock:
+			if lWords:
+				dScores = None
+				for sWord in lWords:
+					dHits = self._match(sWord)
+					if dScores is None:
+						dScores = dHits
+					else:
+						dScores = {
+							s: dScores[s] + dHits[s] for s in dScores if s in dHits
+						}
+					if not dScores: break
+			else:
+				dScores = {s:1 for s in self._dDocs}
+
+			lOut = []
+			for (sPath, nScore) in dScores.items():
+				dDoc = self._dDocs[sPath]
+				if type and (dDoc['type'] != type): continue
+
+				tRange = dDoc['range']
+				if tRange and lRanges:
+					if not all((tRange[0] < sEnd) and (sBeg < tRange[1])
+					           for (sBeg, sEnd) in lRanges):
+						continue
+
+				lOut.append(SearchResult(
+					sPath, dDoc['type'], dDoc['title'], nScore,
+					tuple(tRange) if tRange else None
+				))
+
+		lOut.sort(key=lambda r: (-r.score, r.path))
+		if limit: lOut = lOut[:limit]
+		return lOut
+
+# ########################################################################### #
+# The default index
+
+g_index = None
+
+def _defIndexFile():
+	return os.path.join(_defCacheDir('search'), 'nodes.json')
+
+def get_search_index():
+	"""Get the process wide search index, loading it from disk on first use
+
+	Returns: SearchIndex
+	"""
+	global g_index
+	if g_index is None: g_index = SearchIndex(_defIndexFile())
+	return g_index
+
+def update_search_index(sPathId=None, sUrl=None, depth=None, workers=8):
+	"""Crawl a catalog and refresh the process wide search index from it.
+
+	Only nodes whose definitions changed since the last update are re-indexed.
+	The index is saved to disk so later processes can search right away.
+	Turning on the node cache (see das2.set_node_cache()) makes repeat updates
+	cheap as unchanged nodes only need a conditional request.
+
+	Args:
+		sPathId (str, optional) : The catalog to index, see das2.get_catalog()
+
+		sUrl (str, optional) : A direct load URL for the catalog
+
+		depth (int, optional) : How many levels to crawl, defaults to all
+
+		workers (int, optional) : The maximum number of simultaneous downloads
+
+	Returns: dict
+		The crawl statistics from Catalog.prefetch() plus the keys 'changed'
+		and 'removed' giving the number of index updates.
+	"""
+	from . import get_catalog   # Avoid circular import at load time
+
+	cat = get_catalog(sPathId, sUrl)
+	(dIndex, dStats) = cat.prefetch(depth, workers)
+
+	idx = get_search_index()
+	(dStats['changed'], dStats['removed']) = idx.update(cat)
+	idx.save()
+	return dStats
+
+def search(sQuery, limit=20, type=None):
+	"""Search the local index of catalog nodes.
+
+	The index is built by update_search_index(), searches don't use the
+	network.  See SearchIndex.search() for the query syntax.
+
+	Args:
+		sQuery (str) : Space separated search words, e.g. "juno waves 2017"
+
+		limit (int, optional) : Maximum number of results
+
+		type (str, optional) : Only return nodes of this type
+
+	Returns: list
+		SearchResult tuples, best matches first
+
+	Example:
+
+		>>> das2.update_search_index('site:/uiowa')
+		>>> for r in das2.search("juno waves electric 2017"): print(r.path)
+	"""
+	return get_search_index().search(sQuery, limit, type)
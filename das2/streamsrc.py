@@ -28,12 +28,16 @@ that provide a data stream.
 """
 import sys
 import json
+import threading
+import numpy
+from concurrent.futures import ThreadPoolExecutor
 import _das2
 from . dastime import DasTime
 from . node import Node
 from . source import Source
 from . dataset import *
 from . util import *
+from . cache import get_cache, get_interval_cache, cache_key, _time64
 
 # Modules that moved from python2 to python3
 try:
@@ -49,6 +53,54 @@ except NameError:
 	
 perr = sys.stderr.write
 
+g_dSecsPer = {
+	's':1.0, 'sec':1.0, 'second':1.0, 'seconds':1.0, 'ms':1e-3,
+	'min':60.0, 'minute':60.0, 'minutes':60.0, 'h':3600.0, 'hr':3600.0,
+	'hour':3600.0, 'hours':3600.0, 'd':86400.0, 'day':86400.0, 'days':86400.0
+}
+
+def _toSeconds(value):
+	# Convert '3600 s', '1 day', 60.0 and friends to seconds, None if unknown
+	if isinstance(value, (int, float)): return float(value)
+	if not isinstance(value, basestring): return None
+
+	lParts = value.strip().split()
+	if len(lParts) == 0: return None
+	try:
+		rVal = float(lParts[0])
+	except ValueError:
+		return None
+	if len(lParts) == 1: return rVal
+	sUnits = lParts[1].lower()
+	if sUnits in g_dSecsPer: return rVal * g_dSecsPer[sUnits]
+	try:
+		return _das2.convert(rVal, lParts[1], 's')
+	except Exception:
+		return None
+
+def _mergeSplit(lRet):
+	# Join (header, datasets) results from consecutive time ranges, one
+	# dataset per dataset ID in the order first seen
+	dHdr = lRet[0][0]
+	lIds = []
+	dPieces = {}
+	for (dPieceHdr, lDs) in lRet:
+		for ds in lDs:
+			if ds.name not in dPieces:
+				lIds.append(ds.name)
+				dPieces[ds.name] = []
+			dPieces[ds.name].append(ds)
+
+	lOut = []
+	for sId in lIds:
+		lDs = [ds for ds in dPieces[sId] if min(ds.shape, default=0) > 0]
+		if len(lDs) == 0: lDs = dPieces[sId][:1]
+		dsOut = ds_union(lDs)
+		dsOut.name = sId
+		lOut.append(dsOut)
+
+	return (dHdr, lOut)
+
 # ########################################################################### #
 
 class HttpStreamSrc(Source):
@@ -79,14 +131,15 @@ class HttpStreamSrc(Source):
 		super(HttpStreamSrc, self).__init__(dDef, bStub, bGlobal)
 
 		self.lBadBase = []
+		self._lock = threading.Lock()  # Guards lBadBase for batch queries
 
 	# ####################################################################### #
-	def load(self):
+	def load(self, direct=False):
 		# Extra intialization on load.  Copy descriptions up to aspects if not
 		# present.  This is done so that parts of the coordinate and data
 		# properties dictionaries can just be handed off.
 
-		super(HttpStreamSrc, self).load()
+		super(HttpStreamSrc, self).load(direct)
 
 	
 	# ####################################################################### #
@@ -328,7 +381,87 @@ class HttpStreamSrc(Source):
 		return sOut
 
 	# ####################################################################### #
-	def protoGet(self, dQuery, verbose=False):
+	def _protoBases(self):
+		# Get the list of base URLs, checking the source definition on the way
+		if self.bStub: self.load()
+
+		if 'protocol' not in self.props:
+			raise CatalogError(self.url, "'protocol' not present is data source definition")
+
+		dProto = self.props['protocol']
+
+		if ('base_urls' not in dProto) or \
+			(not isinstance(dProto['base_urls'], list)):
+			raise CatalogError(self.url, "'base_urls not present in protocol section, or is not a list")
+
+		return dProto['base_urls']
+
+	def _protoUrl(self, sBaseUrl, dQuery):
+		# Make a full GET URL from a base URL and protocol level query
+		sJoin = ''
+		if sBaseUrl.find('?') == -1:
+			sJoin = "?"
+		else:
+			sJoin = '&'
+
+		lParams = []
+		for k in dQuery:
+			if type(dQuery[k]) == str:
+				sParam = "%s=%s"%(k, quote_plus(dQuery[k]))
+			else:
+				sParam = "%s=%s"%(k, dQuery[k])
+			lParams.append(sParam)
+
+		sGet = "&".join(lParams)
+		return "%s%s%s"%(sBaseUrl, sJoin, sGet)
+
+	def _protoRead(self, sBaseUrl, dQuery, verbose=False):
+		# Read raw datasets from one base URL, returns (dHdr, lRawDs) or None
+		# if the read failed, in which case the base URL is marked as bad.
+		sUrl = self._protoUrl(sBaseUrl, dQuery)
+		try:
+			if verbose: perr("Requesting: %s\n"%sUrl)
+			tRet = _das2.read_server(sUrl)
+		except Exception as e:
+			perr("Couldn't read URL '%s', %s\n"%(sUrl, str(e)))
+			# put this URL on the naughty list
+			with self._lock:
+				if sBaseUrl not in self.lBadBase: self.lBadBase.append(sBaseUrl)
+			return None
+
+		with self._lock:
+			if sBaseUrl in self.lBadBase: self.lBadBase.remove(sBaseUrl)
+		return tRet
+
+	def _protoCook(self, dHdr, lDs):
+		# Convert raw datasets and stream header properties
+		lOut = []
+		for ds in lDs:
+			lOut.append(ds_from_raw(ds))
+
+		# Adapt the header properties
+		dRawProps = dHdr['props']
+		dDictProps = {}
+		for sProp in dRawProps:
+			dDictProps[sProp] = mk_prop_from_raw(dRawProps[sProp])
+
+		dHdr['props'] = dDictProps    # Now replace them
+
+		return (dHdr, lOut)
+
+	def _protoOrder(self, lBases, iStart):
+		# Rotate the base URLs to start at iStart, known bad URLs go last
+		n = iStart % len(lBases)
+		lOrder = lBases[n:] + lBases[:n]
+		with self._lock:
+			# If all the URLs are on the bad-base list, erase the list so they
+			# can try again
+			if len(self.lBadBase) >= len(lBases): self.lBadBase = []
+			lBad = list(self.lBadBase)
+
+		return [s for s in lOrder if s not in lBad] + [s for s in lOrder if s in lBad]
+
+	def protoGet(self, dQuery, verbose=False, cache=True):
 		"""Query for data using server specific HTTP GET key,value pairs.
 
 		This function is called by query() to communicate with an HTTP server.
@@ -340,82 +473,105 @@ class HttpStreamSrc(Source):
 		   dQuery (dict) : A dictionary of key, value pairs to send as a GET
 		      query to one of the URLs identified in .props['protocol']['base_urls'].
 
+		   cache (bool, optional) : If False, skip the stream cache (if any,
+		      see das2.set_cache()) for this query.
+
 		Returns:
-			list : A list of `das2.Dataset` objects or None if the query failed.
+			tuple : A stream header dictionary and a list of `das2.Dataset` objects
 
 		Raises:
 			das2.CatalogError : If there is a problem with the source definition
 				itself
-			das2.ServerError : If there is a problem not related to authentication
-				when downloading data
+			das2.SourceError : If data could not be downloaded from any of the
+				base URLs
 		"""
 
-		if self.bStub: self.load()
-		
-		if 'protocol' not in self.props:
-			raise CatalogError(self.url, "'protocol' not present is data source definition")
-			
-		dProto = self.props['protocol']
+		lBases = self._protoBases()
+
+		tRaw = self._protoFetch(lBases, dQuery, 0, True, verbose, cache)
+		if tRaw is not None:
+			return self._protoCook(*tRaw)
+
+		raise SourceError(self.url, "Unable to retrieve data")
+
+	def _protoFetch(self, lBases, dQuery, iStart, bSkipBad, verbose, cache):
+		# Get raw datasets for a query from the stream cache or from the first
+		# base URL that works.  Returns None if all base URLs fail.
+		stCache = get_cache() if cache else None
+		if stCache != None:
+			sKey = self._cacheKey(dQuery)
+			tRaw = stCache.get(sKey)
+			if tRaw is not None:
+				if verbose: perr("Cache hit: %s\n"%sKey)
+				return tRaw
+
+		for sBaseUrl in self._protoOrder(lBases, iStart):
+			if bSkipBad:
+				with self._lock:
+					if sBaseUrl in self.lBadBase: continue
+
+			tRaw = self._protoRead(sBaseUrl, dQuery, verbose)
+			if (tRaw is not None) and (tRaw[1] is not None):
+				if stCache != None: stCache.put(sKey, *tRaw)
+				return tRaw
+
+		return None
+
+	def _cacheKey(self, dQuery):
+		# Normalize a protocol query for use as a cache key, times are put
+		# in a single format so equivalent queries map to the same entry.
+		dNorm = {k: str(v) for (k,v) in dQuery.items()}
+		try:
+			lTime = self._timeParams()
+		except ValueError:
+			lTime = []
+		for sParam in lTime:
+			if sParam not in dNorm: continue
+			try:
+				dNorm[sParam] = DasTime(dNorm[sParam]).isoc(6)
+			except ValueError:
+				pass
 
-		if ('base_urls' not in dProto) or \
-			(not isinstance(dProto['base_urls'], list)):
-			raise CatalogError(self.url, "'base_urls not present in protocol section, or is not a list")
+		return cache_key({'source':self.path, 'query':dNorm})
 
-		# If all the URLs are on the bad-base list, erase the list so they can
-		# try again
-		if len(self.lBadBase) == len(dProto['base_urls']):
-			self.lBadBase = []
+	def protoGetMany(self, lQueries, max_workers=4, verbose=False, cache=True):
+		"""Run many protocol level queries concurrently.
 
-		# Change this up when the definition changes
-		dHdr = None
-		lDs = None
-		for i in range(0, len(dProto['base_urls'])):
-			sBaseUrl = dProto['base_urls'][i]
+		Queries are spread round-robin across all the mirrors listed in
+		.props['protocol']['base_urls'].  If a mirror fails the query is retried
+		on the others.  The C reader releases the global interpreter lock while
+		downloading so the work runs in parallel on a thread pool.
 
-			if sBaseUrl in self.lBadBase: continue
+		Note: das2C opens a new connection for each request, so connections are
+		   not kept alive between queries to the same host.
 
-			sJoin = ''
-			if sBaseUrl.find('?') == -1:
-				sJoin = "?"
-			else:
-				sJoin = '&'
+		Args:
+			lQueries (list) : A list of dictionaries, see protoGet()
 
-			lParams = []
-			for k in dQuery:
-				if type(dQuery[k]) == str:
-					sParam = "%s=%s"%(k, quote_plus(dQuery[k]))
-				else:
-					sParam = "%s=%s"%(k, dQuery[k])
-				lParams.append(sParam)
+			max_workers (int, optional) : The maximum number of simultaneous
+				downloads.
 
-			sGet = "&".join(lParams)
-			sUrl = "%s%s%s"%(sBaseUrl, sJoin, sGet)
+			cache (bool, optional) : If False, skip the stream cache.
 
-			try:
-				#print("Reading %s"%sUrl)
-				if verbose: perr("Requesting: %s\n"%sUrl)
-				(dHdr, lDs) = _das2.read_server(sUrl)
-			except Exception as e:
-				sys.stderr.write("Couldn't read URL '%s', %s\n"%(sUrl, str(e)))
-				# put this URL on the naughty list
-				self.lBadBase.append(sBaseUrl)
-
-		if lDs != None:
-			lOut = []
-			for ds in lDs:
-				lOut.append(ds_from_raw(ds))
-
-			# Adapt the header properties 
-			dRawProps = dHdr['props']
-			dDictProps = {}
-			for sProp in dRawProps:
-				dDictProps[sProp] = mk_prop_from_raw(dRawProps[sProp])
-			
-			dHdr['props'] = dDictProps    # Now replace them
+		Returns:
+			list : One (header, datasets) tuple for each query in the same order
+				as lQueries, or None for queries that failed on all mirrors.
 
-			return (dHdr, lOut)
+		Raises:
+			das2.CatalogError : If there is a problem with the source definition
+				itself
+		"""
 
-		raise SourceError(sUrl, "Unable to retrieve data")
+		lBases = self._protoBases()
+		if len(lQueries) == 0: return []
+
+		def fetch(i):
+			tRaw = self._protoFetch(lBases, lQueries[i], i, False, verbose, cache)
+			return None if tRaw is None else self._protoCook(*tRaw)
+
+		nWorkers = max(1, min(int(max_workers), len(lQueries)))
+		with ThreadPoolExecutor(max_workers=nWorkers) as pool:
+			return list(pool.map(fetch, range(len(lQueries))))
 
 
 	# ######################################################################## #
@@ -997,11 +1153,236 @@ class HttpStreamSrc(Source):
 					
 	
 	# ######################################################################## #
-	def get(self, dQuery=None, verbose=False):
+	def get(self, dQuery=None, verbose=False, split=None, max_workers=4, retries=2,
+	        cache=True):
 		"""Get data using the public API for this source.
 
 		see :py:meth:`Source.query`
+
+		Long time ranges may be split into sub-intervals that are downloaded
+		concurrently and then joined back together with ds_union.  Only the
+		sub-intervals that fail are retried.
+
+		Args:
+			split (bool, float, optional) : If given, split the time coordinate
+				range into pieces this many seconds long.  If True the piece size
+				is taken from the source's time coordinate 'cacheRange' or
+				'tagWidth' properties, defaulting to one day.
+
+			max_workers (int, optional) : The maximum number of simultaneous
+				downloads when splitting.
+
+			retries (int, optional) : How many more times to try failed
+				sub-intervals when splitting.
+
+			cache (bool, optional) : If False, don't read or write the stream
+				cache (if enabled, see das2.set_cache()) and don't use the
+				interval cache (if enabled, see das2.set_interval_cache()).
+				With the interval cache on, only the parts of the time range not
+				already held for the same query options are downloaded.
+
+		Returns:
+			tuple : A stream header dictionary and a list of `das2.Dataset`
+				objects.  Split and interval cached queries return one merged dataset per dataset ID
+				with records in time order.
 		"""
+		if dQuery == None:
+			return self._getExample(None)
+
+		if isinstance(dQuery, basestring):
+			return self._getExample(dQuery)
+
+		dProto = self._mkProto(dQuery)
+
+		icache = get_interval_cache() if cache else None
+		if icache != None:
+			tRet = self._getInterval(
+				icache, dProto, split, max_workers, retries, verbose
+			)
+			if tRet is not None: return tRet
+
+		if not split:
+			return self.protoGet(dProto, verbose, cache)
+
+		if split is True: rSecs = self._splitSecs()
+		else: rSecs = float(split)
+
+		lProto = self._splitProto(dProto, rSecs)
+		if len(lProto) < 2:
+			return self.protoGet(dProto, verbose, cache)
+
+		return _mergeSplit(
+			self._getPieces(lProto, max_workers, retries, verbose, cache)
+		)
+
+	def _getPieces(self, lProto, max_workers, retries, verbose, cache):
+		# Download protocol queries concurrently, retrying failures.  Raises
+		# SourceError naming the time ranges that could not be read.
+		lRet = self.protoGetMany(lProto, max_workers, verbose, cache)
+
+		for i in range(retries):
+			lRetry = [j for j in range(len(lRet)) if lRet[j] is None]
+			if len(lRetry) == 0: break
+			if verbose:
+				perr("Retrying %d of %d sub-intervals\n"%(len(lRetry), len(lRet)))
+			lAgain = self.protoGetMany(
+				[lProto[j] for j in lRetry], max_workers, verbose, cache
+			)
+			for j, tRet in zip(lRetry, lAgain): lRet[j] = tRet
+
+		(sMin, sMax) = self._timeParams()
+		lFailed = [
+			"%s to %s"%(lProto[j].get(sMin), lProto[j].get(sMax))
+			for j in range(len(lRet)) if lRet[j] is None
+		]
+		if len(lFailed) > 0:
+			raise SourceError(self.url, "Unable to retrieve data for %s"%(
+				", ".join(lFailed)))
+
+		return lRet
+
+	def _getInterval(self, icache, dProto, split, max_workers, retries, verbose):
+		# Answer a time range query from the interval cache, downloading only
+		# the gaps.  Returns None if the query doesn't have a time range, or
+		# the cache has nothing for it.
+		try:
+			(sMin, sMax) = self._timeParams()
+		except ValueError:
+			return None
+		if (sMin not in dProto) or (sMax not in dProto): return None
+
+		try:
+			t0 = _time64(dProto[sMin])
+			t1 = _time64(dProto[sMax])
+		except ValueError:
+			return None
+		if t1 <= t0: return None
+
+		# Everything but the time range (resolution included) selects a series
+		dOpts = {k: str(v) for (k,v) in dProto.items() if k not in (sMin, sMax)}
+		sKey = cache_key({'source':self.path, 'query':dOpts})
+
+		# Slivers below the protocol time precision aren't worth a request
+		lGaps = [
+			(g0, g1) for (g0, g1) in icache.gaps(sKey, t0, t1)
+			if (g1 - g0) >= numpy.timedelta64(1, 'ms')
+		]
+		if verbose and lGaps:
+			perr("Interval cache needs %d gap(s) from the server\n"%len(lGaps))
+
+		# Gap edges keep full precision, they are the cached interval limits
+		lProto = []
+		lGapIdx = []
+		for (i, (g0, g1)) in enumerate(lGaps):
+			dGap = dict(dProto)
+			dGap[sMin] = str(g0.astype('M8[us]'))
+			dGap[sMax] = str(g1.astype('M8[us]'))
+			if split:
+				rSecs = self._splitSecs() if split is True else float(split)
+				lPieces = self._splitProto(dGap, rSecs)
+			else:
+				lPieces = [dGap]
+			lProto += lPieces
+			lGapIdx += [i]*len(lPieces)
+
+		lRet = []
+		if lProto:
+			lRet = self._getPieces(lProto, max_workers, retries, verbose, True)
+
+		lFresh = []
+		for (i, (g0, g1)) in enumerate(lGaps):
+			(dHdr, lDs) = _mergeSplit(
+				[lRet[j] for j in range(len(lRet)) if lGapIdx[j] == i]
+			)
+			lFresh.append(icache.add(sKey, g0, g1, dHdr, lDs))
+
+		# Ranges shorter than the protocol precision with nothing held are
+		# left to the server
+		lServed = icache.serve(sKey, t0, t1, 'time', lFresh)
+		if len(lServed) == 0: return None
+
+		return _mergeSplit(lServed)
+
+	def _timeParams(self):
+		# Get the HTTP parameters that set the time coordinate minimum and
+		# maximum.  Raises ValueError if there are none.
+		try:
+			dTime = self.props['interface']['coordinates']['time']
+			return (dTime['minimum']['set']['param'], dTime['maximum']['set']['param'])
+		except (KeyError, TypeError):
+			raise ValueError("Time range is not settable for source %s"%self.path)
+
+	def _splitSecs(self):
+		# Default sub-interval length in seconds for split queries
+		try:
+			dTime = self.props['interface']['coordinates']['time']
+		except (KeyError, TypeError):
+			dTime = {}
+
+		for (sProp, nRecs) in (('cacheRange', 1), ('tagWidth', 10000)):
+			if sProp not in dTime: continue
+			value = dTime[sProp]
+			if isinstance(value, dict): value = value.get('value')
+			rSecs = _toSeconds(value)
+			if rSecs and (rSecs > 0): return rSecs * nRecs
+
+		return 86400.0
+
+	def _splitProto(self, dProto, rSecs):
+		# Make copies of a protocol query, one for each sub-interval
+		if rSecs <= 0: raise ValueError("Split interval must be positive")
+
+		(sMin, sMax) = self._timeParams()
+		if (sMin not in dProto) or (sMax not in dProto): return [dProto]
+
+		dtBeg = DasTime(str(dProto[sMin]))
+		dtEnd = DasTime(str(dProto[sMax]))
+
+		lOut = []
+		dt0 = dtBeg
+		while dt0 < dtEnd:
+			dt1 = dt0 + rSecs
+
+			# Edges are sent to the millisecond, don't leave an empty piece
+			# at the end due to round off
+			if (dt1 > dtEnd) or ((dtEnd - dt1) < 0.001): dt1 = dtEnd
+			dPiece = dict(dProto)
+			dPiece[sMin] = dt0.isoc(3)
+			dPiece[sMax] = dt1.isoc(3)
+			lOut.append(dPiece)
+			dt0 = dt1
+
+		return lOut
+
+	def get_many(self, lQueries, max_workers=4, verbose=False, cache=True):
+		"""Get data for many queries at once using a pool of download threads.
+
+		This is much faster than calling get() in a loop when fetching many
+		short intervals, for example a year of data as daily queries.
+
+		Args:
+			lQueries (list) : A list of query dictionaries, each in the same
+				format as the argument to get().
+
+			max_workers (int, optional) : The maximum number of simultaneous
+				downloads, requests are spread across all mirrors of this source.
+
+			cache (bool, optional) : If False, skip the stream cache.
+
+		Returns:
+			list : One (header, datasets) tuple for each query, in the same order
+				as lQueries.  Queries that failed on all mirrors give None.
+
+		Example:
+
+			>>> lDays = [('2017-001','2017-002'), ('2017-002','2017-003')]
+			>>> lRet = src.get_many([{'time':t} for t in lDays], max_workers=8)
+		"""
+		lProto = [self._mkProto(dQuery) for dQuery in lQueries]
+		return self.protoGetMany(lProto, max_workers, verbose, cache)
+
+	def _mkProto(self, dQuery):
+		# Convert a public API query into a protocol level (HTTP GET) query
 
 		# {'time':('2008-223T09:06', '2008-223T09:13'), '80khz':True }
 		# The format is:
@@ -1032,11 +1413,7 @@ class HttpStreamSrc(Source):
 		# the settable things and associated setters are in a flat namespace
 		# first!  This will shorten the code quite a bit. --cwp 2019-03-29
 		
-		if dQuery == None:
-			return self._getExample(None)
-		
-		if isinstance(dQuery, basestring):
-			return self._getExample(dQuery)
+		if self.bStub: self.load()
 			
 		#print("Orig Query: %s"%dQuery)
 		
@@ -1229,4 +1606,4 @@ class HttpStreamSrc(Source):
 		#for sParam in lKeys:
 		#	print(sParam, "=", dProto[sParam])
 		
-		return self.protoGet(dProto, verbose)
+		return dProto
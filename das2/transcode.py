@@ -0,0 +1,303 @@
+# The MIT License
+#
+# Copyright 2024 Chris Piker
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Re-encode das streams, text values to binary
+
+Text encoded streams are several times larger than binary ones and far
+slower to read.  Data packets are converted in batches, all the buffered
+packets for a packet ID go through numpy at once, even when packets for
+different IDs are interleaved.
+"""
+
+import re
+from io import BytesIO
+
+import numpy
+from lxml import etree
+
+from . reader import PacketReader, DataHdrPkt, DataPkt, _toTime64, _fromTime64
+from . reader import _localName, g_dEpochs
+from . pkt import HdrBuf, fwrite
+
+# Most data packets held before converting and writing them
+g_nMaxBatch = 16384
+
+g_reDas2Plane = re.compile(rb'<(x|y|yscan|z)(\s[^>]*)?>')
+g_reDas2Attr = re.compile(rb'\s(type|units)\s*=\s*("[^"]*"|\'[^\']*\')')
+
+# Storage attribute values for das3 output types
+g_dStorage = {'<i8':'long', '<f8':'double', '<f4':'float'}
+
+class _Plan(object):
+	"""How to convert the data packets defined by one header"""
+
+	def __init__(self, lConv, xTag):
+		# Each item is (name, input type, shape, conversion, output type, units)
+		self.lConv = lConv
+		self.dtIn = numpy.dtype([(t[0], t[1], t[2]) for t in lConv])
+		self.dtOut = numpy.dtype(
+			[('_tag', 'S%d'%len(xTag))] + [(t[0], t[4], t[2]) for t in lConv]
+		)
+		self.xTag = xTag
+
+	def convert(self, aRows):
+		"""Convert an (N, input length) uint8 array to output records"""
+		aIn = aRows.view(self.dtIn)[:,0]
+		aOut = numpy.empty(len(aIn), dtype=self.dtOut)
+		aOut['_tag'] = self.xTag
+		for (sName, sIn, tShape, sConv, sOut, sUnits) in self.lConv:
+			if sConv == 'copy':
+				aOut[sName] = aIn[sName]
+			elif sConv == 'time':
+				aOut[sName] = _fromTime64(_toTime64(aIn[sName], 'UTC'), sUnits)
+			else:
+				try:
+					aOut[sName] = aIn[sName].astype(sOut)
+				except ValueError as e:
+					raise ValueError("Can't convert text values of %s, %s"%(sName, str(e)))
+		return aOut
+
+def _das2Hdr(pkt, nRealBytes):
+	"""Make binary versions of a das2.2 data header and its packets.
+
+	Returns: (bytes, _Plan) or (None, None) if the header has no text values
+		or the packets are not a fixed length.
+	"""
+	lFields = pkt.fields()
+	if not lFields: return (None, None)
+
+	lConv = []
+	for (sName, sType, tShape, sUnits, sKind) in lFields:
+		if numpy.dtype(sType).kind != 'S':
+			lConv.append((sName, sType, tShape, 'copy', sType, sUnits))
+		elif sKind == 'time' and (sUnits not in g_dEpochs):
+			lConv.append((sName, sType, tShape, 'time', '<f8', 'us2000'))
+		elif sKind == 'time':
+			# Text numbers in epoch units, don't lose precision
+			lConv.append((sName, sType, tShape, 'real', '<f8', sUnits))
+		else:
+			lConv.append((sName, sType, tShape, 'real', '<f%d'%nRealBytes, sUnits))
+
+	if all(t[3] == 'copy' for t in lConv): return (None, None)
+
+	# Rewrite the planes in place, which keeps das2.2 properties as they are
+	iConv = iter(lConv)
+	def plane(m):
+		(sName, sIn, tShape, sConv, sOut, sUnits) = next(iConv)
+		if sConv == 'copy': return m.group(0)
+		sType = 'little_endian_real%d'%numpy.dtype(sOut).itemsize
+		def attr(mAttr):
+			if mAttr.group(1) == b'type':
+				return b' type="%s"'%sType.encode('utf-8')
+			if sConv == 'time':
+				return b' units="%s"'%sUnits.encode('utf-8')
+			return mAttr.group(0)
+		return g_reDas2Attr.sub(attr, m.group(0))
+
+	xDoc = g_reDas2Plane.sub(plane, bytes(pkt.content))
+	return (xDoc, _Plan(lConv, b':%02d:'%pkt.id))
+
+def _das3Hdr(pkt, nRealBytes):
+	"""Make binary versions of a das3 data header and its packets.
+
+	Returns: (bytes, _Plan) or (None, None) if the header has no text values
+		or the packets are not a fixed length.
+	"""
+	lFields = pkt.fields()
+	if not lFields: return (None, None)
+
+	# Parse a new tree, the packet's own tree is shared with other packets
+	bDecl = bytes(pkt.content[:5]) == b'<?xml'
+	tree = etree.parse(BytesIO(bytes(pkt.content)))
+
+	lConv = []
+	iField = iter(lFields)
+	for axis in tree.getroot():
+		if _localName(axis) in (None, 'extension', 'properties'): continue
+		for array in axis:
+			if _localName(array) not in ('scalar','vector','object'): continue
+			for el in array:
+				if _localName(el) != 'packet': continue
+				(sName, sType, tShape, sUnits, sKind) = next(iField)
+				sSemantic = array.attrib.get('semantic', '')
+
+				if (numpy.dtype(sType).kind != 'S') or (sKind not in ('time','number')) \
+				   or (sSemantic == 'bool'):
+					lConv.append((sName, sType, tShape, 'copy', sType, sUnits))
+					continue
+
+				if (sKind == 'time') and (sUnits not in g_dEpochs):
+					tConv = (sName, sType, tShape, 'time', '<i8', 'TT2000')
+					array.attrib['units'] = 'TT2000'
+				elif sKind == 'time':
+					tConv = (sName, sType, tShape, 'real', '<f8', sUnits)
+				elif sSemantic == 'integer':
+					tConv = (sName, sType, tShape, 'int', '<i8', sUnits)
+				else:
+					tConv = (sName, sType, tShape, 'real', '<f%d'%nRealBytes, sUnits)
+				lConv.append(tConv)
+
+				sOut = tConv[4]
+				el.attrib['encoding'] = 'LEint' if sOut == '<i8' else 'LEreal'
+				el.attrib['itemBytes'] = '%d'%numpy.dtype(sOut).itemsize
+				if 'storage' in array.attrib:
+					array.attrib['storage'] = g_dStorage[sOut]
+
+				# Text only attributes
+				for sAttr in ('valTerm', 'itemTerm'):
+					if sAttr in el.attrib: del el.attrib[sAttr]
+
+	if all(t[3] == 'copy' for t in lConv): return (None, None)
+
+	xDoc = etree.tostring(tree, encoding='utf-8', xml_declaration=bDecl)
+	if not xDoc.endswith(b'\n'): xDoc += b'\n'
+
+	nLen = numpy.dtype([(t[0], t[4], t[2]) for t in lConv]).itemsize
+	return (xDoc, _Plan(lConv, b'|Pd|%d|%d|'%(pkt.id, nLen)))
+
+def _otherTag(pkt, sVersion):
+	# Tag for packets that are copied as is, other than data packets
+	if sVersion == '2.2':
+		if pkt.tag == 'Sx': return b'[00]%06d'%len(pkt.content)
+		if pkt.tag == 'Hx': return b'[%02d]%06d'%(pkt.id, len(pkt.content))
+		return b'[xx]%06d'%len(pkt.content)
+	xId = b'%d'%pkt.id if pkt.id > 0 else b''
+	return b'|%s|%s|%d|'%(pkt.tag.encode('utf-8'), xId, len(pkt.content))
+
+def transcode(source, dest, encoding='binary', real_bytes=8):
+	"""Re-write a das stream with binary values instead of text.
+
+	The stream version does not change.  For das2.2 streams text numbers
+	become little_endian_real values and text times become
+	little_endian_real8 values in us2000 units.  For das3 streams utf8
+	numbers become LEreal (or LEint for integer semantics) values and
+	datetimes become LEint TT2000 values.  Anything else, including
+	variable length packets, is copied as is.
+
+	Args:
+		source (str, file) : The file name or binary file object to read
+
+		dest (str, file) : The file name or binary file object to write
+
+		encoding (str, optional) : The output value encoding, only 'binary'
+			is supported.
+
+		real_bytes (int, optional) : Output size of text numbers, 8 or 4.
+			Use 4 when the text values have at most 6 significant digits to
+			make the output about half as big again.
+
+	Returns (int): The number of data packets converted.
+
+	Example:
+
+		>>> das2.transcode('survey.d2t', 'survey.d2s')
+	"""
+	if encoding != 'binary':
+		raise ValueError("Unknown output encoding '%s', expected 'binary'"%encoding)
+	if real_bytes not in (4, 8):
+		raise ValueError("Output reals must be 4 or 8 bytes, not %s"%real_bytes)
+
+	bCloseIn = isinstance(source, str)
+	fIn = open(source, 'rb') if bCloseIn else source
+	bCloseOut = isinstance(dest, str)
+	fOut = open(dest, 'wb') if bCloseOut else dest
+
+	try:
+		return _transcode(fIn, fOut, real_bytes)
+	finally:
+		if bCloseIn: fIn.close()
+		if bCloseOut: fOut.close()
+
+def _transcode(fIn, fOut, nRealBytes):
+
+	reader = PacketReader(fIn)
+	sVersion = reader.streamType()[1]
+	sFmt = 'das2' if sVersion == '2.2' else 'das3'
+	mkHdr = _das2Hdr if sFmt == 'das2' else _das3Hdr
+
+	dPlans = {}
+	lBatch = []    # (packet ID, plan, uint8 rows, original tag)
+	nBatch = 0
+	nConverted = 0
+
+	def flush():
+		# Convert all the rows for each ID at once, then write in stream order
+		dOut = {}
+		for (nId, plan, aRows, xTag) in lBatch:
+			if plan != None: dOut.setdefault(nId, []).append(aRows)
+
+		dBytes = {}
+		for nId in dOut:
+			lRows = dOut[nId]
+			aRows = lRows[0] if len(lRows) == 1 else numpy.concatenate(lRows)
+			dBytes[nId] = [memoryview(dPlans[nId].convert(aRows).tobytes()), 0]
+
+		lOut = []
+		for (nId, plan, aRows, xTag) in lBatch:
+			if plan == None:
+				# Copied as is, original tags
+				aTags = numpy.frombuffer(xTag, dtype=numpy.uint8)
+				aPkts = numpy.empty((len(aRows), len(xTag) + aRows.shape[1]), dtype=numpy.uint8)
+				aPkts[:,:len(xTag)] = aTags
+				aPkts[:,len(xTag):] = aRows
+				lOut.append(aPkts.tobytes())
+			else:
+				lState = dBytes[nId]
+				nEnd = lState[1] + len(aRows)*plan.dtOut.itemsize
+				lOut.append(lState[0][lState[1]:nEnd])
+				lState[1] = nEnd
+		fwrite(fOut, b''.join(lOut))
+		del lBatch[:]
+
+	for pkt in reader:
+		if isinstance(pkt, DataPkt):
+			aRows = numpy.frombuffer(pkt.content, dtype=numpy.uint8).reshape(1, -1)
+			aRun = reader._takeRun(pkt.length, None)
+			if len(aRun) > 0: aRows = numpy.concatenate((aRows, aRun))
+
+			plan = dPlans.get(pkt.id)
+			if (plan != None) and (pkt.length != plan.dtIn.itemsize): plan = None
+			if plan != None: nConverted += len(aRows)
+			lBatch.append((pkt.id, plan, aRows, reader.xTag))
+			nBatch += len(aRows)
+			if nBatch >= g_nMaxBatch:
+				flush()
+				nBatch = 0
+			continue
+
+		flush()
+		nBatch = 0
+
+		if isinstance(pkt, DataHdrPkt):
+			(xDoc, plan) = mkHdr(pkt, nRealBytes)
+			dPlans[pkt.id] = plan
+			if xDoc != None:
+				hdr = HdrBuf(pkt.id, sFmt)
+				hdr.add(xDoc.decode('utf-8'))
+				hdr.send(fOut)
+				continue
+
+		fwrite(fOut, _otherTag(pkt, sVersion))
+		fwrite(fOut, pkt.content)
+
+	flush()
+	return nConverted
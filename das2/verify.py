@@ -1,9 +1,17 @@
 #!/usr/bin/env python
 
 import sys
+import os
+import io
+import json
+import time
 import argparse
 import re
+import hashlib
+import sqlite3
 from os.path import basename as bname
+from os.path import join as pjoin
+from concurrent.futures import ProcessPoolExecutor
 
 
 # Stuff that might not work if server is mis-configured
@@ -34,6 +42,13 @@ def errorExit(sOut):
 	pout(sOut)
 	sys.exit(5)
 
+def _setStatus(dStatus, sClass, sMsg):
+	"""Record why a check failed, for callers that want more than a return
+	code.  dStatus may be None."""
+	if dStatus != None:
+		dStatus['error_class'] = sClass
+		dStatus['message'] = sMsg
+
 
 # ########################################################################### #
 def namespace(element):
@@ -65,7 +80,22 @@ def prnErrorContext(curPkt, nLine):
 
 
 # ########################################################################### #
-def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
+# Headers that passed validation, by schema, so that repeated headers are not
+# re-parsed.  Archives tend to repeat the same few headers in every file.
+
+g_dValidHdrs = {}
+g_nMaxValidHdrs = 4096
+
+def _validHdrs(schema):
+	"""Get the memo of valid headers for a schema, keyed by version and
+	header digest.  Values are the (root element, data length) pairs."""
+	# Keep a reference to the schema in the entry so it's id isn't re-used
+	if id(schema) not in g_dValidHdrs:
+		g_dValidHdrs[id(schema)] = (schema, {})
+	return g_dValidHdrs[id(schema)][1]
+
+# ########################################################################### #
+def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr, dStatus=None):
 	"""Check a given file-like object to see if the contents match a schema
 
 	Args:
@@ -74,6 +104,8 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 		sContent (str) - The content as determined by the pre-reader
 		sVersion (str) - The version as determined by the pre-reader
 		bUsingNs (bool) - Are namespaces in use, as determined by the pre-reader
+		dStatus (dict, optional) - If given, the 'error_class' and 'message'
+			keys are set when the check fails.
 
 	Returns (int): Shell return value, 0 if it works, positive int < 128 if not.
 
@@ -86,6 +118,7 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 	sCurType = None
 	dDataPktCount = {}
 	dExpectPktSize = {}
+	dValid = _validHdrs(schema)
 
 	try:
 		# Go for packet read...
@@ -101,22 +134,36 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 							"Packet size mismatch, expected %d read %d"%(
 							dExpectPktSize[pkt.id], pkt.length
 						))
+
+				# Buffered packets with the same tag have the same ID and length,
+				# so they pass the same checks.  Count them without parsing.
+				dDataPktCount[pkt.id] += len(reader._takeRun(pkt.length, None))
 				continue
 		
 			if (not isinstance(pkt, das2.HdrPkt) ):
 				raise ValueError("Unknown packet type '%s' encountered"%pkt.tag)
 			if bPrnHdr:
 				pout(pkt.content)
-							
-			docTree = pkt.docTree()
-			elRoot = docTree.getroot()
-			sCurType = elRoot.tag
+
+			tKey = (pkt.sver, hashlib.sha1(pkt.content).digest())
+			if tKey in dValid:
+				(sCurType, nDataLen) = dValid[tKey]
+			else:
+				docTree = pkt.docTree()
+				elRoot = docTree.getroot()
+				sCurType = elRoot.tag
 			
-			schema.assertValid(docTree)
+				schema.assertValid(docTree)
+
+				nDataLen = None
+				if isinstance(pkt, das2.DataHdrPkt): nDataLen = pkt.dataLen()
+
+				if len(dValid) >= g_nMaxValidHdrs: dValid.clear()
+				dValid[tKey] = (sCurType, nDataLen)
 		
 			if isinstance(pkt, das2.DataHdrPkt):
 				dDataPktCount[pkt.id] = 0
-				dExpectPktSize[pkt.id] = pkt.dataLen()
+				dExpectPktSize[pkt.id] = nDataLen
 
 				if dExpectPktSize[pkt.id] == None:
 					pout("|%s| ID %s %s header [OKAY] (variable packet size)"%(
@@ -124,7 +171,7 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 					))
 				else:
 					pout("|%s| ID %s %s header [OKAY] (data size %d bytes)"%(
-						pkt.tag, pkt.id, sCurType, pkt.dataLen()
+						pkt.tag, pkt.id, sCurType, nDataLen
 					))
 			else:
 				sId = pkt.id
@@ -170,6 +217,7 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 			sRep = "Element 'properties', the attribute qualifier"
 			sErr = sErr.replace(sFind, sRep)
 		pout(sErr)
+		_setStatus(dStatus, e.__class__.__name__, sErr)
 		if not curPkt:
 			pout("No current packet, this usually means the packet tag length value is incorrect.")
 			
@@ -179,9 +227,11 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 	except das2.DataError as e:
 		pout("|%s| ID %d packet %d, %s [ERROR]"%(
 			e.pkt_type, e.pkt_id, e.pkt_num, e.message))
+		_setStatus(dStatus, 'DataError', e.message)
 		return 5
 	except ValueError as e:
 		pout("%s [ERROR]"%str(e))
+		_setStatus(dStatus, e.__class__.__name__, str(e))
 		return 5
 				
 	for nId in dDataPktCount:
@@ -196,13 +246,60 @@ def checkStream(fIn, schema, sContent, sVersion, bUsingNs, bPrnHdr):
 	return 0
 
 
-def checkDoc(fIn, schema, bPrnHdr):
+# Number of complete top level elements to collect before validating them
+g_nDocBatch = 4096
+
+def _pruneRepeats(elRoot):
+	"""Drop top level elements that repeat their previous sibling's tag.
+
+	The first element of each run is kept so that what remains is still a
+	valid prefix for any sequence the schema expects.
+	"""
+	sPrev = None
+	for el in list(elRoot):
+		if el.tag == sPrev:
+			el.clear()
+			elRoot.remove(el)
+		sPrev = el.tag
+
+def _docContext(fIn, lLines, nWidth=6):
+	"""Re-read a document one line at a time, keeping just the lines within
+	nWidth of the given line numbers.
+
+	Returns (dict): Line text by line number
+	"""
+	dLines = {}
+	if len(lLines) == 0: return dLines
+	nLast = max(lLines) + nWidth
+
+	fIn.seek(0)
+	for (i, xLine) in enumerate(fIn):
+		nLine = i + 1
+		if nLine > nLast: break
+		for nErr in lLines:
+			if abs(nLine - nErr) <= nWidth:
+				sLine = xLine.rstrip(b'\r\n').decode('utf-8', errors='replace')
+				# Trim long lines at 80 characters
+				if len(sLine) > 80: sLine = sLine[:76] + " ..."
+				dLines[nLine] = sLine
+				break
+	return dLines
+
+def checkDoc(fIn, schema, bPrnHdr, dStatus=None, nMaxErr=10):
 	"""Check a file to see if it matches a given schema, experts pure XML
 	not a packetized stream
 
+	The document is parsed incrementally and validated in batches of top
+	level elements, so memory use does not grow with the document size.  Runs
+	of repeated top level elements (data rows) are dropped after each batch
+	is validated.
+
 	Args:
 		fIn (file-like) The input file to read
 		schema (lxml.etree.XMLSchema) - A schema object, used for header packets.
+		dStatus (dict, optional) - If given, the 'error_class' and 'message'
+			keys are set when the check fails.
+		nMaxErr (int, optional) - Stop after reporting this many errors
 
 	Returns (int): Shell return value, 0 if it works, positive int < 128 if not.
 
@@ -212,59 +309,335 @@ def checkDoc(fIn, schema, bPrnHdr):
 	if bPrnHdr:
 		pout("Header printing disabled for documents")
 	elRoot = None
-	sContent = None
-	sVersion = None
-	try:
-		# Don't have to worry about any das 2.2 mistakes, it's just 
-		# a straight forward check
-
-		tree = etree.parse(fIn)
-		elRoot = tree.getroot()
-		sContent = elRoot.attrib['type']
-		sVersion = elRoot.attrib['version']
-		schema.assertValid(tree)
+	lErrs = []     # (line, error class, message)
+	setSeen = set()
+
+	def validate():
+		"""Validate the current tree, returns True if more errors are wanted"""
+		if schema.validate(elRoot.getroottree()):
+			return True
+		for err in schema.error_log:
+			tErr = (err.line, err.message)
+			if tErr in setSeen: continue    # Kept header elements fail again
+			setSeen.add(tErr)
+			lErrs.append((err.line, 'DocumentInvalid', err.message))
+			if len(lErrs) >= nMaxErr: return False
+		return True
 
-	except (etree.XMLSyntaxError, etree.DocumentInvalid) as e:
-		# Try to get last line with an error
-		nLine = e.error_log[0].line
+	try:
+		nDepth = 0
+		nPending = 0   # Top level elements not yet validated
+		bChecked = False
+		bMore = True
+		for (sEvent, el) in etree.iterparse(
+			fIn, events=('start', 'end'), huge_tree=True, remove_comments=True
+		):
+			if sEvent == 'start':
+				if nDepth == 0: elRoot = el
+				nDepth += 1
+				continue
 
-		# Strip the namespace in the errors, it just makes them more verbose
-		sMsg = str(e)
-		sNamespace = namespace(elRoot)
-		if (elRoot != None) and len(sNamespace) > 0:
-			sMsg = sMsg.replace(sNamespace,'')
+			nDepth -= 1
+			if nDepth != 1: continue
+			nPending += 1
+			if nPending >= g_nDocBatch:
+				bMore = validate()
+				bChecked = True
+				if not bMore: break
+				_pruneRepeats(elRoot)
+				nPending = 0
+
+		# Don't re-check a pruned tree with no new content, it may be missing
+		# required repeats
+		if bMore and ((nPending > 0) or not bChecked):
+			validate()
+
+	except etree.XMLSyntaxError as e:
+		lErrs.append((e.lineno, e.__class__.__name__, e.msg))
+
+	if len(lErrs) == 0:
+		pout('Document validates as a %s version %s with a defined namespace'%(
+			elRoot.get('type'), elRoot.get('version')
+		))
+		return 0
+
+	# Strip the namespace in the errors, it just makes them more verbose
+	sNamespace = namespace(elRoot) if elRoot is not None else ''
+
+	dLines = _docContext(fIn, [t[0] for t in lErrs if t[0] > 0])
+	for (nLine, sClass, sMsg) in lErrs:
+		if len(sNamespace) > 0: sMsg = sMsg.replace(sNamespace,'')
 		pout("Error in document at line %d: %s"%(nLine, sMsg))
-		
-		fIn.seek(0)
-		xDoc = fIn.read()       # <-- FixMe: dangerous
-		sHdr = xDoc.decode('utf-8')
-		lLines = sHdr.split('\n')
-
-		for i in range(len(lLines)):
-			# Trim long lines at 80 characters
-			if len(lLines[i]) > 80:
-				sLine = lLines[i][:76] + " ..."
+		for i in range(nLine - 6, nLine + 7):
+			if i not in dLines: continue
+			if i == nLine:
+				pout("    %3d---> %s"%(i, dLines[i]))
 			else:
-				sLine = lLines[i]
+				pout("    %3d     %s"%(i, dLines[i]))
+
+	if len(lErrs) >= nMaxErr:
+		pout("Stopped after %d errors"%nMaxErr)
+
+	(nLine, sClass, sMsg) = lErrs[0]
+	if len(sNamespace) > 0: sMsg = sMsg.replace(sNamespace,'')
+	_setStatus(dStatus, sClass, "line %d: %s"%(nLine, sMsg))
+	return 5
+
+
+# ########################################################################### #
+# Custom schemas given on the command line, by path
+
+g_dCustomSchemas = {}
+
+def _customSchema(sPath):
+	if sPath not in g_dCustomSchemas:
+		with open(sPath) as fSchema:
+			schema_doc = etree.parse(fSchema)
+		g_dCustomSchemas[sPath] = etree.XMLSchema(schema_doc)
+	return g_dCustomSchemas[sPath]
+
+def verifyFile(
+	sFile, sSchema=None, sExpect=None, bPrnHdr=False, dStatus=None, nMaxErr=10
+):
+	"""Validate a single stream or document file, printing a report.
+
+	Args:
+		sFile (str) - The file to check
+		sSchema (str, optional) - Use this XSD file instead of the built in
+			schema for the content type
+		sExpect (str, optional) - Fail unless the stream is this version
+		bPrnHdr (bool, optional) - Print each header before checking it
+		dStatus (dict, optional) - If given, the 'error_class' and 'message'
+			keys are set when the check fails.
+		nMaxErr (int, optional) - The most errors to report for documents,
+			streams always stop at the first error
+
+	Returns (int): Shell return value, 0 if it works, positive int < 128 if not.
+	"""
+	try:
+		with open(sFile, 'rb') as fRaw:
+			pout("Validating: %s"%sFile)
+
+			# Pre-read to try and determine stream type, might not need a packet
+			# reader at all. 16K *should* find the version attribute in almost all 
+			# cases.
+			xFirst = das2.decompress(fRaw).read(16384)
+			sStreamContent, sStreamVer, sTagStyle, bUsingNs = das2.streamType(xFirst)
+			fRaw.seek(0)
+			fIn = das2.decompress(fRaw)
+
+			if not sStreamContent.startswith('das'):
+				pout("This is a %s, expected a das stream or das document"%sStreamContent)
+				_setStatus(dStatus, 'ContentError', "Content is %s"%sStreamContent)
+				return 5
 			
-			# If we have a valid line number only print within 6 lines each 
-			# way of the header
-			if i > (nLine + 6): 
-				break
+			if sExpect and (sExpect != sStreamVer):
+				pout("%s: is a %s stream, but %s was expected"%(
+					sFile, sStreamVer, sExpect
+				))
+				_setStatus(dStatus, 'VersionError', "Stream version is %s"%sStreamVer)
+				return 5
+			
+			if sSchema:
+				schema = _customSchema(sSchema)
+			else:
+				(schema, sSchema) = das2.loadSchema(sStreamContent, sStreamVer, bUsingNs)
+			pout("Loaded XSD: %s"%bname(sSchema))
 
-			if (nLine > 0) and abs(nLine - (i+1)) > 6: continue
-		
-			if i + 1 == nLine:
-				pout("    %3d---> %s"%(i+1, sLine))
+			if sTagStyle == 'none': # Should use real None here? Not sure.
+				return checkDoc(fIn, schema, bPrnHdr, dStatus, nMaxErr)
 			else:
-				pout("    %3d     %s"%(i+1, sLine))
+				return checkStream(
+					fIn, schema, sStreamContent, sStreamVer, bUsingNs, bPrnHdr, dStatus
+				)
 
-		return 5
+	except (ValueError, IOError) as e:
+		pout("%s [ERROR]"%str(e))
+		_setStatus(dStatus, e.__class__.__name__, str(e))
+		return 13
 
-	pout('Document validates as a %s version %s with a defined namespace'%(
-				sContent, sVersion))
-	return 0
+# ########################################################################### #
+# Batch mode
+
+# File extensions checked when walking directories
+g_lStreamExt = ('.d2s', '.d2t', '.d3b', '.d3t', '.d3x', '.das', '.das2', '.das3')
+
+# Compressed files are checked when the extension before these one matches
+g_lCompressExt = ('.gz', '.zst')
+
+def _findFiles(lPaths, bRecursive, lExt):
+	"""Yield the files to check, directories are walked if bRecursive is set"""
+	for sPath in lPaths:
+		if not os.path.isdir(sPath):
+			yield sPath
+			continue
+
+		if not bRecursive:
+			sys.stderr.write("Skipping directory %s, use --recursive\n"%sPath)
+			continue
+
+		for (sDir, lDirs, lNames) in os.walk(sPath):
+			lDirs.sort()
+			for sName in sorted(lNames):
+				(sBase, sExt) = os.path.splitext(sName.lower())
+				if sExt in g_lCompressExt:
+					sExt = os.path.splitext(sBase)[1]
+				if sExt in lExt:
+					yield pjoin(sDir, sName)
+
+class _ResultDb(object):
+	"""Results of earlier batch runs, by absolute file path"""
+
+	def __init__(self, sFile):
+		sDir = os.path.dirname(sFile)
+		if sDir and not os.path.isdir(sDir): os.makedirs(sDir, exist_ok=True)
+		self.db = sqlite3.connect(sFile)
+		self.db.execute(
+			"CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, "+\
+			"size INTEGER, mtime INTEGER, options TEXT, result TEXT)"
+		)
+		self.nPending = 0
+
+	def get(self, sPath, nSize, nMtime, sOptions):
+		"""Get the saved result for a file, if the file and options are
+		unchanged since it was checked"""
+		row = self.db.execute(
+			"SELECT size, mtime, options, result FROM results WHERE path = ?",
+			(sPath,)
+		).fetchone()
+		if (row == None) or (tuple(row[:3]) != (nSize, nMtime, sOptions)):
+			return None
+		return json.loads(row[3])
+
+	def put(self, sPath, nSize, nMtime, sOptions, dResult):
+		self.db.execute(
+			"INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+			(sPath, nSize, nMtime, sOptions, json.dumps(dResult))
+		)
+		self.nPending += 1
+		if self.nPending >= 1000: self.commit()
+
+	def commit(self):
+		self.db.commit()
+		self.nPending = 0
+
+	def close(self):
+		self.commit()
+		self.db.close()
+
+def _batchCheck(tArgs):
+	"""Check one file with the report discarded, runs in pool workers.
+
+	Returns (dict): The file's JSON lines output record without the size and
+		cache flag.
+	"""
+	(sFile, sSchema, sExpect) = tArgs
+	dStatus = {}
+	rStart = time.time()
 
+	stdout = sys.stdout
+	sys.stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+	try:
+		nRet = verifyFile(sFile, sSchema, sExpect, False, dStatus)
+	except Exception as e:
+		# Keep one bad file from taking down a whole batch
+		nRet = 13
+		_setStatus(dStatus, e.__class__.__name__, str(e))
+	finally:
+		sys.stdout = stdout
+
+	dResult = {
+		'file':sFile, 'status':'ok' if nRet == 0 else 'failed', 'code':nRet,
+		'seconds':round(time.time() - rStart, 6)
+	}
+	if nRet != 0:
+		dResult['error_class'] = dStatus.get('error_class', 'Unknown')
+		dResult['message'] = dStatus.get('message', '')
+	return dResult
+
+def batchMain(opts):
+	"""Check many files, printing a JSON object per file and a summary line.
+
+	Returns (int): 0 if all files validate, 5 otherwise
+	"""
+	rStart = time.time()
+	lExt = tuple(s.strip().lower() for s in opts.sExt.split(',') if s.strip())
+
+	db = None
+	if not opts.bNoDb:
+		sDb = opts.sDb
+		if not sDb:
+			sDb = pjoin(das2.cache._defCacheDir('verify'), 'results.sqlite')
+		db = _ResultDb(sDb)
+
+	# Results depend on the options and the schemas shipped with this version
+	sOptions = json.dumps([opts.sSchema, opts.sExpect, das2.__version__])
+
+	def emit(dResult):
+		pout(json.dumps(dResult))
+		sys.stdout.flush()
+
+	nFiles = 0
+	nCached = 0
+	dFailures = {}
+	lTodo = []
+	for sFile in _findFiles(opts.lFiles, opts.bRecursive, lExt):
+		nFiles += 1
+		sPath = os.path.abspath(sFile)
+		try:
+			st = os.stat(sPath)
+			tStat = (st.st_size, st.st_mtime_ns)
+		except OSError:
+			tStat = (-1, -1)
+
+		dResult = db.get(sPath, tStat[0], tStat[1], sOptions) if db else None
+		if dResult == None:
+			lTodo.append((sFile, sPath, tStat))
+			continue
+
+		nCached += 1
+		dResult['file'] = sFile
+		dResult['cached'] = True
+		if dResult['status'] != 'ok':
+			sClass = dResult.get('error_class', 'Unknown')
+			dFailures[sClass] = dFailures.get(sClass, 0) + 1
+		emit(dResult)
+
+	lArgs = [(t[0], opts.sSchema, opts.sExpect) for t in lTodo]
+	nBytes = 0
+	pool = None
+	try:
+		if (opts.nJobs or 1) > 1 and len(lArgs) > 1:
+			pool = ProcessPoolExecutor(max_workers=opts.nJobs)
+			nChunk = max(1, min(64, len(lArgs) // (4*opts.nJobs)))
+			iResults = pool.map(_batchCheck, lArgs, chunksize=nChunk)
+		else:
+			iResults = map(_batchCheck, lArgs)
+
+		for ((sFile, sPath, tStat), dResult) in zip(lTodo, iResults):
+			if tStat[0] > 0: nBytes += tStat[0]
+			dResult['size'] = tStat[0]
+			if dResult['status'] != 'ok':
+				sClass = dResult['error_class']
+				dFailures[sClass] = dFailures.get(sClass, 0) + 1
+			if db: db.put(sPath, tStat[0], tStat[1], sOptions, dResult)
+			dResult['cached'] = False
+			emit(dResult)
+	finally:
+		if pool: pool.shutdown()
+		if db: db.close()
+
+	rSecs = time.time() - rStart
+	nChecked = len(lTodo)
+	emit({'summary':{
+		'files':nFiles, 'checked':nChecked, 'cached':nCached,
+		'failed':sum(dFailures.values()), 'seconds':round(rSecs, 3),
+		'files_per_sec':round(nChecked / rSecs, 2) if rSecs > 0 else None,
+		'bytes_per_sec':round(nBytes / rSecs) if rSecs > 0 else None,
+		'failures':dFailures
+	}})
+
+	return 5 if len(dFailures) > 0 else 0
 
 # ########################################################################### #
 def main():
@@ -296,58 +669,67 @@ def main():
 		help="Print each das2 header encountered in the stream prior to "+\
 		"schema validation.", dest='bPrnHdr'
 	)
+
+	psr.add_argument(
+		'-m', '--max-errs', default=10, type=int, dest='nMaxErr', metavar='N',
+		help="Report up to N errors in das documents, defaults to %(default)s"
+	)
+
+	psr.add_argument(
+		'-j', '--jobs', default=None, type=int, dest='nJobs', metavar='N',
+		help="Batch mode, check files on N worker processes.  Batch mode "+\
+		"prints one JSON object per file followed by a summary object instead "+\
+		"of the normal report."
+	)
+
+	psr.add_argument(
+		'-r', '--recursive', default=False, action='store_true', dest='bRecursive',
+		help="Batch mode, check all stream files under any directories given. "+\
+		"See --ext."
+	)
+
+	psr.add_argument(
+		'--json', default=False, action='store_true', dest='bJson',
+		help="Batch mode, even for a single process and no directories."
+	)
+
+	psr.add_argument(
+		'--ext', default=','.join(g_lStreamExt), dest='sExt', metavar='LIST',
+		help="Comma separated file extensions to check in directories, "+\
+		"defaults to %(default)s"
+	)
+
+	psr.add_argument(
+		'--db', default=None, dest='sDb', metavar='FILE',
+		help="Batch mode results database.  Files with the same size and "+\
+		"modification time as the last time they were checked are not "+\
+		"checked again.  Defaults to a file in the das2py cache directory."
+	)
+
+	psr.add_argument(
+		'--no-db', default=False, action='store_true', dest='bNoDb',
+		help="Batch mode, check every file and don't save the results"
+	)
 	
 	# End command line with list of files to validate...
 	psr.add_argument(
-		'lFiles', help='The file(s) to validate', nargs='+', metavar='file'
+		'lFiles', help='The file(s) to validate, or directories in batch mode',
+		nargs='+', metavar='file'
 	)
 	
 	opts = psr.parse_args()	
+
+	if opts.nJobs or opts.bRecursive or opts.bJson:
+		return batchMain(opts)
 	
+	nRet = 0
 	for sFile in opts.lFiles:	
-		try:
-			
-			fIn = open(sFile, 'rb')
-
-			pout("Validating: %s"%sFile)
-
-			# Pre-read to try and determine stream type, might not need a packet
-			# reader at all. 16K *should* find the version attribute in almost all 
-			# cases.
-			xFirst = fIn.read(16384)  
-			sStreamContent, sStreamVer, sTagStyle, bUsingNs = das2.streamType(xFirst)
-			fIn.seek(0)
-
-			if not sStreamContent.startswith('das'):
-				pout("This is a %s, expected a das stream or das document"%sStreamContent)
-				return 5
-			
-			if opts.sExpect and (opts.sExpect != sStreamVer):
-				pout("%s: is a %s stream, but %s was expected"%(
-					sFile, sStreamVer, opts.sExpect
-				))
-				return 5
-			
-			if opts.sSchema:
-				fSchema = open(opts.sSchema)
-				schema_doc = etree.parse(fSchema)
-				schema = etree.XMLSchema(schema_doc)
-			else:
-				(schema, opts.sSchema) = das2.loadSchema(sStreamContent, sStreamVer, bUsingNs)
-			pout("Loaded XSD: %s"%bname(opts.sSchema))
-
-			if sTagStyle == 'none': # Should use real None here? Not sure.
-				return checkDoc(fIn, schema, opts.bPrnHdr)
-			else:
-				return checkStream(
-					fIn, schema, sStreamContent, sStreamVer, bUsingNs, opts.bPrnHdr
-				)
-
-		except (ValueError, IOError) as e:
-			pout("%s [ERROR]"%str(e))
-			return 13
+		nFileRet = verifyFile(
+			sFile, opts.sSchema, opts.sExpect, opts.bPrnHdr, None, opts.nMaxErr
+		)
+		if nRet == 0: nRet = nFileRet
 			
-	return 0	
+	return nRet
 
 # ########################################################################## #
 if __name__ == "__main__":
@@ -193,7 +193,7 @@ setup(
 	author="C Piker",
 	author_email="das-developers@uiowa.edu",
 	url="https://das2.org/das2py",
-	scripts=['scripts/das_verify','scripts/das_cdf_info'],
+	scripts=['scripts/das_verify','scripts/das_cdf_info','scripts/das_profile'],
 	include_package_data=True,
 	#package_data={'das2':['xsd/*.xsd']}, # <-- in das2C now
 	package_data={'das2.pycdf':[bname(sCdfSo)]},
@@ -798,6 +798,9 @@ static PyMethodDef pyd2_methods[] = {
 	{"read_file",   pyd2_read_file,   METH_VARARGS, pyd2help_read_file   },
 	{"read_server", pyd2_read_server, METH_VARARGS, pyd2help_read_server },
 	{"read_cmd",    pyd2_read_cmd,    METH_VARARGS, pyd2help_read_cmd    }, 
+	{"read_file_cb",   pyd2_read_file_cb,   METH_VARARGS, pyd2help_read_file_cb   },
+	{"read_server_cb", pyd2_read_server_cb, METH_VARARGS, pyd2help_read_server_cb },
+	{"read_cmd_cb",    pyd2_read_cmd_cb,    METH_VARARGS, pyd2help_read_cmd_cb    },
 	{"auth_set",    pyd2_auth_set,    METH_VARARGS, pyd2help_auth_set    },
 	
 	/* Stuff from py_catalog.c */
@@ -103,20 +103,206 @@ static PyObject* pyd2_auth_set(PyObject* self, PyObject* args)
 	return Py_BuildValue("i", nCreds);
 }
 
-/* Helper for NDarray creation */
+/* Helper for NDarray creation.  Ragged arrays are exported as a flat list
+ * of values, see _DasAryOffsets below for how the rows are recovered */
 static void _npdims_from_shape(DasAry* pAry, PyArray_Dims* pNpDims){
 	ptrdiff_t shape[16] = {0};
 	DasAry_shape(pAry, shape);
 
+	for(int i = 0; i < pAry->nRank; ++i){
+		if(shape[i] == DASIDX_RAGGED){
+			pNpDims->len = 1;
+			pNpDims->ptr[0] = DasAry_size(pAry);
+			return;
+		}
+	}
+
 	pNpDims->len = pAry->nRank;
 	for(int i = 0; i < pAry->nRank; ++i) pNpDims->ptr[i] = shape[i];
 }
 
+/* Is the array ragged in it's last index (and only there) */
+static bool _DasAryRaggedLast(DasAry* pAry){
+	ptrdiff_t shape[16] = {0};
+	int nRank = DasAry_shape(pAry, shape);
+	return (nRank > 1) && (shape[nRank - 1] == DASIDX_RAGGED);
+}
+
+/* Make the CSR style row offsets for an array that is ragged in the last
+ * index.  Row r of the flat values array runs from offsets[r] up to (not
+ * including) offsets[r+1], rows are in C order over the leading indices. */
+static PyObject* _DasAryOffsets(DasAry* pAry)
+{
+	ptrdiff_t shape[16] = {0};
+	int nRank = DasAry_shape(pAry, shape);
+
+	npy_intp nRows = 1;
+	for(int i = 0; i < nRank - 1; ++i) nRows *= shape[i];
+
+	npy_intp nLen = nRows + 1;
+	PyObject* pObj = PyArray_SimpleNew(1, &nLen, NPY_INT64);
+	if(pObj == NULL) return NULL;
+	int64_t* pOff = (int64_t*)PyArray_DATA((PyArrayObject*)pObj);
+
+	ptrdiff_t loc[16] = {0};
+	pOff[0] = 0;
+	for(npy_intp r = 0; r < nRows; ++r){
+		pOff[r+1] = pOff[r] + DasAry_lengthIn(pAry, nRank - 1, loc);
+
+		for(int i = nRank - 2; i >= 0; --i){  /* next leading index */
+			if(++loc[i] < shape[i]) break;
+			loc[i] = 0;
+		}
+	}
+	return pObj;
+}
+
+/* ************************************************************************ */
+/* Zero-copy helpers for 8-byte time values                                 */
+
+/* Time conversions write int64 values, so any array with 8-byte elements can
+ * be converted in it's own buffer, which numpy then takes over. */
+static bool _isWord8(das_val_type vt){
+	return ((vt == vtLong)||(vt == vtULong)||(vt == vtDouble));
+}
+
+/* Take over the elements of a DasAry and wrap them in an ndarray of the given
+ * numpy type string without copying.  On return *ppData points to the first
+ * element (or is NULL for empty arrays) so the caller can re-write values in
+ * place.  Returns NULL with the python error set on failure. */
+static PyObject* _DasAryAdopt8(DasAry* pAry, const char* sNpType, int64_t** ppData)
+{
+	char sInfo[64] = {'\0'};
+	*ppData = NULL;
+
+	PyArray_Descr* pDesc = NULL;
+	PyObject* pType = PyString_FromString(sNpType);
+	PyArray_DescrConverter(pType, &pDesc);
+	Py_DECREF(pType);
+	if(pDesc == NULL) return NULL;
+
+	npy_intp pa_shape[16] = {0};
+	PyArray_Dims np_dims = {pa_shape, 0};
+	_npdims_from_shape(pAry, &np_dims);
+
+	size_t uLen = 0;
+	size_t uOffset = 0;
+	ubyte* pMem = DasAry_disownElements(pAry, &uLen, &uOffset);
+
+	if(uLen == 0)
+		return PyArray_SimpleNewFromDescr(np_dims.len, np_dims.ptr, pDesc);
+
+	if(pMem == NULL){
+		Py_DECREF(pDesc);
+		PyErr_Format(g_pPyD2Error, "Array %s does not own it's elements",
+		             DasAry_toStr(pAry, sInfo, 63));
+		return NULL;
+	}
+	if(uOffset > 0){
+		Py_DECREF(pDesc);
+		free(pMem);
+		PyErr_Format(g_pPyD2Error, "Array %s has head trim, update das2py",
+		             DasAry_toStr(pAry, sInfo, 63));
+		return NULL;
+	}
+
+	/* Steals the descriptor reference */
+	PyObject* pObj = PyArray_NewFromDescr(
+		&PyArray_Type, pDesc, np_dims.len, np_dims.ptr, NULL, pMem,
+		NPY_ARRAY_CARRAY, NULL
+	);
+	if(pObj == NULL){
+		free(pMem);
+		return NULL;
+	}
+	PyArray_ENABLEFLAGS((PyArrayObject*)pObj, NPY_ARRAY_OWNDATA);
+	*ppData = (int64_t*)pMem;
+	return pObj;
+}
+
+static int64_t _dblToNs(double rVal){
+	if((rVal < LONG_MIN)||(rVal > LONG_MAX)) return DAS_INT64_FILL;
+	return (int64_t)rVal;
+}
+
+/* Convert 8-byte epoch values to ns1970 in place */
+static void _calToNs1970InPlace(void* pBuf, das_val_type vt, das_units units, size_t uLen)
+{
+	int64_t* pOut = (int64_t*)pBuf;
+	const int64_t* pLong = (const int64_t*)pBuf;
+	const uint64_t* pULong = (const uint64_t*)pBuf;
+	const double* pDbl = (const double*)pBuf;
+	das_time dt;
+	size_t u;
+
+	if((vt == vtLong)&&(units == Units_fromStr("ns1970"))) return; /* Done! */
+
+	/* Every epoch scale other than TT2000 is a linear function of ns1970, so
+	 * probe the scale & offset once and then do a single multiply-add pass. */
+	if(units != Units_fromStr("TT2000")){
+		Units_convertToDt(&dt, 0.0, units);
+		int64_t nOff = dt_nano_1970(&dt);
+		Units_convertToDt(&dt, 1000.0, units);
+		double rScale = (double)(dt_nano_1970(&dt) - nOff) / 1000.0;
+		Units_convertToDt(&dt, -1000.0, units);
+		int64_t nDiff = dt_nano_1970(&dt) - (nOff - (int64_t)(1000.0*rScale));
+
+		if((nDiff >= -1)&&(nDiff <= 1)){
+			switch(vt){
+			case vtLong:
+				for(u = 0; u < uLen; ++u) pOut[u] = nOff + _dblToNs(pLong[u]*rScale);
+				break;
+			case vtULong:
+				for(u = 0; u < uLen; ++u) pOut[u] = nOff + _dblToNs(pULong[u]*rScale);
+				break;
+			default:
+				for(u = 0; u < uLen; ++u) pOut[u] = _dblToNs(pDbl[u]*rScale + nOff);
+				break;
+			}
+			return;
+		}
+	}
+
+	/* Leap second aware scales, go value by value (but still no allocation) */
+	switch(vt){
+	case vtLong:
+		for(u = 0; u < uLen; ++u){
+			Units_convertToDt(&dt, (double)(pLong[u]), units);
+			pOut[u] = dt_nano_1970(&dt);
+		}
+		break;
+	case vtULong:
+		for(u = 0; u < uLen; ++u){
+			Units_convertToDt(&dt, (double)(pULong[u]), units);
+			pOut[u] = dt_nano_1970(&dt);
+		}
+		break;
+	default:
+		for(u = 0; u < uLen; ++u){
+			Units_convertToDt(&dt, pDbl[u], units);
+			pOut[u] = dt_nano_1970(&dt);
+		}
+		break;
+	}
+}
+
 /* ************************************************************************ */
-/* Make a new numpy datetime64 array, allocs ndarray memory                 */
+/* Make a new numpy datetime64 array, allocs ndarray memory unless the      */
+/* values are 8-bytes wide and may be taken from the DasAry                 */
 
-PyObject* _DasCalAryToNumpyAry(DasAry* pAry)
+PyObject* _DasCalAryToNumpyAry(DasAry* pAry, bool bCopy)
 {
+	das_val_type vtIn = DasAry_valType(pAry);
+	if(!bCopy && _isWord8(vtIn)){
+		int64_t* pData = NULL;
+		PyObject* pObj = _DasAryAdopt8(pAry, "M8[ns]", &pData);
+		if((pObj != NULL)&&(pData != NULL))
+			_calToNs1970InPlace(
+				pData, vtIn, DasAry_units(pAry), PyArray_SIZE((PyArrayObject*)pObj)
+			);
+		return pObj;
+	}
+
 	/* Access the das2 array and the numpy array as a flat index space makes
 	 * looping faster as the for-loop to find the next multi-dimensional
 	 * index is not required */
@@ -249,9 +435,10 @@ PyObject* _DasCalAryToNumpyAry(DasAry* pAry)
 }
 
 /* ************************************************************************ */
-/* Make a new numpy timedelta64 array, allocs ndarray memory                */
+/* Make a new numpy timedelta64 array, allocs ndarray memory unless the     */
+/* values are 8-bytes wide and may be taken from the DasAry                 */
 
-PyObject* _DasTimeAryToNumpyAry(DasAry* pAry)
+PyObject* _DasTimeAryToNumpyAry(DasAry* pAry, bool bCopy)
 {
 	/* Get the conversion factor to nanoseconds */
 	das_units units = DasAry_units(pAry);
@@ -261,6 +448,30 @@ PyObject* _DasTimeAryToNumpyAry(DasAry* pAry)
 
 	size_t uLen;
 	das_val_type vt = DasAry_valType(pAry);
+
+	if(!bCopy && _isWord8(vt)){
+		int64_t* pData = NULL;
+		PyObject* pObj = _DasAryAdopt8(pAry, "m8[ns]", &pData);
+		if((pObj == NULL)||(pData == NULL)) return pObj;
+
+		uLen = PyArray_SIZE((PyArrayObject*)pObj);
+		size_t u;
+		if(vt == vtLong){
+			if(factor != 1.0)
+				for(u = 0; u < uLen; ++u) pData[u] = (int64_t)(pData[u]*factor);
+		}
+		else if(vt == vtULong){
+			const uint64_t* pULong = (const uint64_t*)pData;
+			for(u = 0; u < uLen; ++u) pData[u] = _dblToNs(pULong[u]*factor);
+		}
+		else{
+			/* Fill values such as -1e31 are out of range, see below */
+			const double* pDbl = (const double*)pData;
+			for(u = 0; u < uLen; ++u) pData[u] = _dblToNs(pDbl[u]*factor);
+		}
+		return pObj;
+	}
+
 	const void* pMem = DasAry_getIn(pAry, vt, DIM0, &uLen);
 
 	/* Create a Numpy Array descriptor that says we're going to use nanoseconds
@@ -484,7 +695,7 @@ PyObject* _DasTextAryToNumpyAry(DasAry* pAry)
 /* ************************************************************************ */
 /* Convert a DasAry to NDarray with coping data (fast)                      */
 
-static PyObject* _DasGenericAryToNumpyAry(DasAry* pAry)
+static PyObject* _DasGenericAryToNumpyAry(DasAry* pAry, bool bCopy)
 {
 	char sInfo[64] = {'\0'};        /* For error messages */
 	DasAry_toStr(pAry, sInfo, 63);
@@ -514,11 +725,25 @@ static PyObject* _DasGenericAryToNumpyAry(DasAry* pAry)
 		return NULL;
 	}
 
-	/* Make sure das2 arrays don't delete their data when free'ed */
+	PyObject* pNdAry = NULL;
 	size_t uLen = 0;
+
+	/* Chunked readers keep appending to the same DasAry after the callback,
+	 * so the array has to keep it's buffer.  Copy the values out instead. */
+	if(bCopy){
+		const void* pSrc = DasAry_getIn(pAry, et, DIM0, &uLen);
+		pNdAry = PyArray_SimpleNew(np_dims.len, np_dims.ptr, nType);
+		if(pNdAry == NULL) return NULL;
+		if((uLen > 0)&&(pSrc != NULL))
+			memcpy(
+				PyArray_DATA((PyArrayObject*)pNdAry), pSrc, uLen*DasAry_valSize(pAry)
+			);
+		return pNdAry;
+	}
+
+	/* Make sure das2 arrays don't delete their data when free'ed */
 	size_t uOffset = 0;
 	ubyte* pMem = DasAry_disownElements(pAry, &uLen, &uOffset);
-	PyObject* pNdAry = NULL;
 	
 	if(uLen != 0){
 		if(pMem == NULL){
@@ -550,12 +775,11 @@ static PyObject* _DasGenericAryToNumpyAry(DasAry* pAry)
 /* Converting any* DasAry to ndarray without a data copy if possible        */
 
 /* Note that DasAry is more flexible in one respect in that all it's
- * dimensions can be ragged.  Since ndarrays allow for masks we can get around
- * numpy's limitation by making a cubic array and giving it a mask.  For now
- * I'm just not supporting ragged arrays (except of vtByte arrays that store
- * strings) since das 2.2 streams don't have them anyway.
- *
- * * TODO: Handling mask creation for ragged arrays
+ * dimensions can be ragged.  Arrays that are ragged in the last index only
+ * (das3 size="*" items) are output as a flat values array and a separate
+ * offsets array, see _DasAryOffsets.  The python side can make a padded,
+ * masked cubic array from these if asked.  Raggedness in other indices is not
+ * supported (except of vtByte arrays that store strings).
  *
  * Basic conversion is handled as follows:
  *
@@ -570,23 +794,26 @@ static PyObject* _DasGenericAryToNumpyAry(DasAry* pAry)
  *     object array
  *
  *  4. Otherwise output a generic C-aligned basic type array
+ *
+ * If bCopy is true the DasAry keeps ownership of it's elements and the values
+ * are copied to the ndarray.  This is needed by the chunked readers below.
  */
-static PyObject* _DasAryToNumpyAry(DasAry* pAry)
+static PyObject* _DasAryToNumpyAry(DasAry* pAry, bool bCopy)
 {
 	das_units units = DasAry_units(pAry);
 	das_val_type vt = DasAry_valType(pAry);
 
 	if((vt == vtTime) || Units_haveCalRep(units))
-		return _DasCalAryToNumpyAry(pAry);
+		return _DasCalAryToNumpyAry(pAry, bCopy);
 
 	if(Units_canConvert(units, UNIT_SECONDS))
-		return _DasTimeAryToNumpyAry(pAry);
+		return _DasTimeAryToNumpyAry(pAry, bCopy);
 
 	unsigned int uFlags = DasAry_getUsage(pAry);
 	if((vt == vtText) || ( (uFlags&D2ARY_AS_STRING) == D2ARY_AS_STRING) )
 		return _DasTextAryToNumpyAry(pAry);
 
-	return _DasGenericAryToNumpyAry(pAry);
+	return _DasGenericAryToNumpyAry(pAry, bCopy);
 }
 
 /* ************************************************************************* */
@@ -821,6 +1048,10 @@ static PyObject* _props2PyDict(DasDesc* pDesc)
  *			sName : pyObj;
  *			sName : pyObj;
  *		}
+ *
+ *		'offsets' {       (Only arrays that are ragged in the last index)
+ *			sName : int64 ndarray, 1 longer than the number of rows
+ *		}
  *  }
  *  ...
  * ]
@@ -912,8 +1143,9 @@ static bool _addVars(int nDsRank, DasDim* pDim, PyObject* pDimDict)
 }
 
 
-/* Takes in a DasStream object returns a 2-tuple of stream header plus datasets */
-static PyObject* _Stream2Tuple(DasStream* pStream)
+/* Takes in a DasStream object returns a 2-tuple of stream header plus datasets.
+ * If bCopy is true, array values are copied instead of taken from the DasAry */
+static PyObject* _Stream2Tuple(DasStream* pStream, bool bCopy)
 {
 	DasDesc* pDesc = NULL;
 	DasDs* pDs = NULL;
@@ -935,8 +1167,8 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 	/* char sInfo[32768] = {'\0'}; */
 
 	/* Before going through all the setup, see if the Das Arrays can even be
-	 * converted to ndarrays with this extension.  Once code has been written
-	 * to generate ragged ndarrays, remove this check */
+	 * converted to ndarrays with this extension.  Only raggedness in the last
+	 * index is handled */
 	int nPktId = 0;
 	while((pDesc = DasStream_nextDesc(pStream, &nPktId)) != NULL){
 		
@@ -969,14 +1201,14 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 					 * D2ARY_AS_STRING and raggedness is only in the last dimension
 					 * because I can turn these into cubic string object arrays */
 
-					if((i == (pDasAry->nRank - 1)) &&
-					   (DasAry_valType(pDasAry) == vtByte) &&
-						((pDasAry->uFlags & D2ARY_AS_STRING)==D2ARY_AS_STRING) )
+					/* Other arrays ragged in the last index become values +
+					 * offsets pairs */
+					if(i == (pDasAry->nRank - 1))
 						continue;
 
 					PyErr_Format(g_pPyD2Error,
-						"Array %s from dataset %s is ragged.  Conversion "
-						"of ragged DasArrays to NumPy ndarrays has not been "
+						"Array %s from dataset %s is ragged in a non-final index.  "
+						"Conversion of such DasArrays to NumPy ndarrays has not been "
 						"implemented.", DasAry_toStr(pDasAry, sInfo, 63), pDs->sId
 					);
 					return NULL;
@@ -998,6 +1230,7 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 	PyObject* pDimDict = NULL;
 	PyObject* pdArys = NULL;
 	PyObject* pdFill = NULL;
+	PyObject* pdOffs = NULL;
 	PyObject* pList = NULL;
 	PyObject* pAry = NULL;
 	PyObject* pObj = NULL;
@@ -1101,14 +1334,32 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 			}
 		}
 
-		/* Arrays and their fill values */
+		/* Arrays, their fill values and row offsets for ragged arrays */
 		pdArys = PyDict_New();
 		pdFill = PyDict_New();
+		pdOffs = PyDict_New();
 		for(a = 0; a < pDs->uArrays; ++a){
-			pAry = _DasAryToNumpyAry(pDs->lArrays[a]);
+			pDasAry = pDs->lArrays[a];
+
+			/* Get offsets before the conversion takes the elements */
+			if(_DasAryRaggedLast(pDasAry) && !(
+				(DasAry_valType(pDasAry) == vtByte) &&
+				((pDasAry->uFlags & D2ARY_AS_STRING) == D2ARY_AS_STRING)
+			)){
+				pObj = _DasAryOffsets(pDasAry);
+				if(pObj == NULL){
+					Py_DECREF(pdOffs); Py_DECREF(pdFill); Py_DECREF(pdArys);
+					Py_DECREF(pDsDict); Py_DECREF(pDsList);
+					return NULL;
+				}
+				PyDict_SetItemString(pdOffs, pDasAry->sId, pObj);
+				Py_DECREF(pObj);
+			}
+
+			pAry = _DasAryToNumpyAry(pDs->lArrays[a], bCopy);
 			if(pAry == NULL){
-				Py_DECREF(pdFill); Py_DECREF(pdArys); Py_DECREF(pDsDict);
-				Py_DECREF(pDsList);
+				Py_DECREF(pdOffs); Py_DECREF(pdFill); Py_DECREF(pdArys);
+				Py_DECREF(pDsDict); Py_DECREF(pDsList);
 				return NULL;
 			}
 			PyDict_SetItemString(pdArys, pDs->lArrays[a]->sId, pAry);
@@ -1116,8 +1367,8 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 
 			pObj = _DasAryFillToObj(pDs->lArrays[a]);
 			if(pObj == NULL){
-				Py_DECREF(pdFill); Py_DECREF(pdArys); Py_DECREF(pDsDict);
-				Py_DECREF(pDsList);
+				Py_DECREF(pdOffs); Py_DECREF(pdFill); Py_DECREF(pdArys);
+				Py_DECREF(pDsDict); Py_DECREF(pDsList);
 				return NULL;
 			}
 			PyDict_SetItemString(pdFill, pDs->lArrays[a]->sId, pObj);
@@ -1125,8 +1376,10 @@ static PyObject* _Stream2Tuple(DasStream* pStream)
 		}
 		PyDict_SetItemString(pDsDict, "arrays", pdArys);
 		PyDict_SetItemString(pDsDict, "fill",  pdFill);
+		PyDict_SetItemString(pDsDict, "offsets", pdOffs);
 		Py_DECREF(pdArys);
 		Py_DECREF(pdFill);
+		Py_DECREF(pdOffs);
 		
 		/* okay, now it's safe to save the dataset info string, AFTER any unit
 		 * conversions that may have taken place */
@@ -1183,10 +1436,14 @@ const char pyd2help_read_file[] =
 "   * 'rank' - The number of array dimensions in each dataset\n"
 "   * 'id'   - A string containing an identifier token usable as a variable name\n"
 "   * 'group' - A string containing the join group for this Correlated dataset\n"
-"   * 'shape' - An array containing the maximum index value in each dimension\n"
+"   * 'shape' - An array containing the maximum index value in each dimension,\n"
+"               ragged dimensions are given as -1\n"
 "   * 'coords' - A list of coordinate dictionaries (defined below)\n"
 "   * 'datasets' - A list of datasets correlated in the given coordinates (see below)\n"
 "   * 'arrays' - A dictionary of all the backing ndarrays for the dataset (see below)\n"
+"   * 'offsets' - A dictionary of int64 row offset ndarrays for arrays that are\n"
+"               ragged in the last index.  These arrays are stored flat, row r\n"
+"               is arrays[name][offsets[name][r]:offsets[name][r+1]]\n"
 "   * 'props' - A list of dictionaries providing metadata about the dataset\n"
 "   * 'info' - An information string about the dataset"
 "\n"
@@ -1233,7 +1490,7 @@ static PyObject* pyd2_read_file(PyObject* self, PyObject* args)
 	/* Build python list of dataset objects here */
 	DasStream* pStream = DasDsBldr_getStream(pBldr);
 	DasDsBldr_release(pBldr); /* Free the correlated datasets from builder mem */
-	PyObject* pRet = (pStream != NULL) ? _Stream2Tuple(pStream) : NULL;
+	PyObject* pRet = (pStream != NULL) ? _Stream2Tuple(pStream, false) : NULL;
 	del_DasStream(pStream);  /* arrays don't own re-used data and may be freed */
 	del_DasIO(pIn);
 
@@ -1330,7 +1587,7 @@ static PyObject* pyd2_read_server(PyObject* self, PyObject* args)
 	/* Build python list of dataset objects here */
 	DasStream* pStream = DasDsBldr_getStream(pBldr);
 	DasDsBldr_release(pBldr); /* Free the correlated datasets from builder mem */
-	pRet = (pStream != NULL) ? _Stream2Tuple(pStream) : NULL;
+	pRet = (pStream != NULL) ? _Stream2Tuple(pStream, false) : NULL;
 	del_DasStream(pStream);  /* arrays don't own re-used data and may be freed */
 	DasHttpResp_clear(&res);
 	del_DasIO(pIn);
@@ -1393,9 +1650,316 @@ static PyObject* pyd2_read_cmd(PyObject* self, PyObject* args)
 	/* Build python list of dataset objects here */
 	DasStream* pStream = DasDsBldr_getStream(pBldr);
 	DasDsBldr_release(pBldr); /* Free the correlated datasets from builder mem */
-	PyObject* pRet = (pStream != NULL) ? _Stream2Tuple(pStream) : NULL;
+	PyObject* pRet = (pStream != NULL) ? _Stream2Tuple(pStream, false) : NULL;
 	del_DasStream(pStream);  /* arrays don't own re-used data and may be freed */
 	del_DasIO(pIn);
 
 	return pRet;
 }
+
+/* ************************************************************************* */
+/* Chunked reading                                                           */
+/*                                                                           */
+/* A second stream processor is placed after the dataset builder.  Every     */
+/* uMaxRecs packets (or uMaxBytes of array data) the GIL is re-acquired, the */
+/* accumulated datasets are copied out to python and handed to a callback,   */
+/* then all record-indexed arrays are cleared.  Peak memory is thus bounded  */
+/* by the chunk size and not the stream size.                                */
+
+#define PYD2_CHUNK_STOPPED 2
+
+typedef struct py_chunk_hdlr {
+	StreamHandler base;     /* must be first */
+	DasDsBldr* pBldr;
+	PyObject*  pCallback;
+	size_t     uRecs;       /* Packets seen since the last callback */
+	size_t     uMaxRecs;    /* 0 = don't trigger on record count */
+	size_t     uMaxBytes;   /* 0 = don't trigger on buffer size */
+	int        nState;      /* 0 = okay, 1 = python error set, 2 = stopped */
+} PyChunkHdlr;
+
+static size_t _chunk_bytes(DasStream* pStream)
+{
+	size_t uBytes = 0;
+	int nPktId = 0;
+	DasDesc* pDesc = NULL;
+	while((pDesc = DasStream_nextDesc(pStream, &nPktId)) != NULL){
+		if(DasDesc_type(pDesc) != DATASET) continue;
+		DasDs* pDs = (DasDs*)pDesc;
+		for(size_t a = 0; a < pDs->uArrays; ++a)
+			uBytes += DasAry_size(pDs->lArrays[a]) * DasAry_valSize(pDs->lArrays[a]);
+	}
+	return uBytes;
+}
+
+/* Send the current contents of the builder to python and clear the record
+ * arrays.  Callable with or without the GIL held. */
+static DasErrCode _chunk_emit(PyChunkHdlr* pThis)
+{
+	DasStream* pStream = DasDsBldr_getStream(pThis->pBldr);
+	pThis->uRecs = 0;
+	if(pStream == NULL) return DAS_OKAY;
+
+	PyGILState_STATE gstate = PyGILState_Ensure();
+
+	PyObject* pTup = _Stream2Tuple(pStream, true);
+	PyObject* pRet = NULL;
+	if(pTup != NULL){
+		pRet = PyObject_CallFunctionObjArgs(pThis->pCallback, pTup, NULL);
+		Py_DECREF(pTup);
+	}
+	if(pRet == NULL)
+		pThis->nState = 1;
+	else{
+		if(pRet == Py_False) pThis->nState = PYD2_CHUNK_STOPPED;
+		Py_DECREF(pRet);
+	}
+
+	PyGILState_Release(gstate);
+
+	/* Throw away the records we just sent, headers & non-record arrays stay */
+	int nPktId = 0;
+	DasDesc* pDesc = NULL;
+	while((pDesc = DasStream_nextDesc(pStream, &nPktId)) != NULL){
+		if(DasDesc_type(pDesc) == DATASET) DasDs_clearRagged0((DasDs*)pDesc);
+	}
+
+	return (pThis->nState == 0) ? DAS_OKAY : DASERR_BLDR;
+}
+
+static DasErrCode _chunk_onRecord(PyChunkHdlr* pThis)
+{
+	pThis->uRecs += 1;
+
+	bool bEmit = (pThis->uMaxRecs > 0)&&(pThis->uRecs >= pThis->uMaxRecs);
+	if(!bEmit && (pThis->uMaxBytes > 0)){
+		DasStream* pStream = DasDsBldr_getStream(pThis->pBldr);
+		if(pStream != NULL)
+			bEmit = (_chunk_bytes(pStream) >= pThis->uMaxBytes);
+	}
+	return bEmit ? _chunk_emit(pThis) : DAS_OKAY;
+}
+
+/* das2.2 streams arrive as packets, das3 streams as datasets */
+static DasErrCode _chunk_onPktData(PktDesc* pPd, void* vpUd)
+{
+	return _chunk_onRecord((PyChunkHdlr*)vpUd);
+}
+
+static DasErrCode _chunk_onDsData(DasStream* pSd, int nPktId, DasDs* pDs, void* vpUd)
+{
+	return _chunk_onRecord((PyChunkHdlr*)vpUd);
+}
+
+/* Run the read loop for an already opened DasIO, returns a new reference to
+ * None on success or NULL with the python error set */
+static PyObject* _read_chunked(
+	DasIO* pIn, PyObject* pCallback, size_t uMaxRecs, size_t uMaxBytes
+){
+	DasDsBldr* pBldr = new_DasDsBldr();
+	if(pBldr == NULL) return pyd2_setException(g_pPyD2Error);
+	DasIO_addProcessor(pIn, (StreamHandler*)pBldr);
+
+	PyChunkHdlr hdlr;
+	memset(&hdlr, 0, sizeof(PyChunkHdlr));
+	hdlr.base.pktDataHandler = _chunk_onPktData;
+	hdlr.base.dsDataHandler  = _chunk_onDsData;
+	hdlr.base.userData = &hdlr;
+	hdlr.pBldr     = pBldr;
+	hdlr.pCallback = pCallback;
+	hdlr.uMaxRecs  = uMaxRecs;
+	hdlr.uMaxBytes = uMaxBytes;
+	DasIO_addProcessor(pIn, (StreamHandler*)&hdlr);
+
+	int nRet = DAS_OKAY;
+
+	Py_BEGIN_ALLOW_THREADS
+	nRet = DasIO_readAll(pIn);
+	Py_END_ALLOW_THREADS
+
+	/* Flush anything after the last full chunk */
+	if((nRet == DAS_OKAY)&&(hdlr.nState == 0)&&(hdlr.uRecs > 0))
+		_chunk_emit(&hdlr);
+
+	DasStream* pStream = DasDsBldr_getStream(pBldr);
+	DasDsBldr_release(pBldr);
+	if(pStream != NULL) del_DasStream(pStream);
+
+	if(hdlr.nState == 1) return NULL;  /* Python error already set */
+
+	if((nRet != DAS_OKAY)&&(hdlr.nState != PYD2_CHUNK_STOPPED))
+		return pyd2_setException(g_pPyD2Error);
+
+	Py_RETURN_NONE;
+}
+
+static const char pyd2help_read_file_cb[] =
+"read_file_cb(sFile, callback, nRecs=0, nBytes=16777216)\n"
+"\n"
+"Reads a Das2 stream from a disk file, handing datasets to a callback a\n"
+"chunk at a time instead of returning them all at once.\n"
+"\n"
+"Thread Note:  This function releases the global interpreter lock during stream\n"
+"              reading, it is re-acquired while the callback runs.\n"
+"\n"
+"Args:\n"
+"   sFile (str) : The filename to read\n"
+"\n"
+"   callback (callable) : Called as callback((dHdr, lDs)) for each chunk, the\n"
+"      argument has the same format as the return from :ref:`read_file`.  Return\n"
+"      False to stop reading early, raise an exception to abort.\n"
+"\n"
+"   nRecs (int, optional) : Emit a chunk after this many data packets, 0 to\n"
+"      disable the record limit.\n"
+"\n"
+"   nBytes (int, optional) : Emit a chunk after the buffered arrays reach this\n"
+"      many bytes, 0 to disable the size limit.\n"
+"\n"
+"Returns:\n"
+"   None\n"
+"\n";
+
+static PyObject* pyd2_read_file_cb(PyObject* self, PyObject* args)
+{
+	const char* sFile;
+	PyObject* pCallback = NULL;
+	Py_ssize_t nRecs = 0;
+	Py_ssize_t nBytes = 16777216;
+
+	if(!PyArg_ParseTuple(args, "sO|nn:read_file_cb", &sFile, &pCallback,
+	                     &nRecs, &nBytes))
+		return NULL;
+
+	if(!PyCallable_Check(pCallback)){
+		PyErr_SetString(PyExc_TypeError, "callback must be callable");
+		return NULL;
+	}
+
+	DasIO* pIn = new_DasIO_file("das2py", sFile, "r");
+	if(pIn == NULL) return pyd2_setException(g_pPyD2Error);
+
+	PyObject* pRet = _read_chunked(
+		pIn, pCallback, nRecs > 0 ? nRecs : 0, nBytes > 0 ? nBytes : 0
+	);
+	del_DasIO(pIn);
+	return pRet;
+}
+
+static const char pyd2help_read_server_cb[] =
+"read_server_cb(sUrl, callback, nRecs=0, nBytes=16777216, rConSec, sAgent=None)\n"
+"\n"
+"Reads a Das2 stream from a remote HTTP/HTTPS server, handing datasets to a\n"
+"callback a chunk at a time while the download is still in progress.\n"
+"\n"
+"Note:\n"
+"   This function releases the global interpreter lock during data download,\n"
+"   it is re-acquired while the callback runs.\n"
+"\n"
+"Args:\n"
+"   sUrl (str) : The URL to read, can be an extensive GET string\n"
+"   callback (callable) : See :ref:`read_file_cb`\n"
+"   nRecs (int, optional) : See :ref:`read_file_cb`\n"
+"   nBytes (int, optional) : See :ref:`read_file_cb`\n"
+"   rConSec (float, optional) : How long to wait on the connection to the\n"
+"      remote server in seconds.\n"
+"   sAgent (str,optional) : The user agent string you'd like to use\n"
+"\n"
+"Returns:\n"
+"   None\n"
+"\n";
+
+static PyObject* pyd2_read_server_cb(PyObject* self, PyObject* args)
+{
+	const char* sInitialUrl = NULL;
+	PyObject* pCallback = NULL;
+	Py_ssize_t nRecs = 0;
+	Py_ssize_t nBytes = 16777216;
+	const char* sUserAgent = NULL;
+	float rConSec = DASHTTP_TO_MIN * DASHTTP_TO_MULTI;
+
+	if(!PyArg_ParseTuple(args, "sO|nnfs:read_server_cb", &sInitialUrl,
+	                     &pCallback, &nRecs, &nBytes, &rConSec, &sUserAgent))
+		return NULL;
+
+	if(!PyCallable_Check(pCallback)){
+		PyErr_SetString(PyExc_TypeError, "callback must be callable");
+		return NULL;
+	}
+
+	bool bOkay = false;
+	DasHttpResp res;
+	PyObject* pExcept = g_pPyD2Error;
+	PyObject* pRet = NULL;
+
+	Py_BEGIN_ALLOW_THREADS
+	bOkay = das_http_getBody(sInitialUrl, sUserAgent, g_pMgr, &res, rConSec);
+	Py_END_ALLOW_THREADS
+
+	if(!bOkay){
+		if((res.nCode == 401)||(res.nCode == 403)) pExcept = g_pPyD2AuthErr;
+		if((res.nCode == 400)||(res.nCode == 404)) pExcept = g_pPyD2QueryErr;
+		if(pExcept == NULL) pExcept = g_pPyD2Error;
+
+		pRet = PyErr_Format(pExcept, "%d, Could not get body for URL, reason: %s",
+		                    res.nCode, res.sError);
+		DasHttpResp_clear(&res);
+		return pRet;
+	}
+
+	DasIO* pIn;
+	if(DasHttpResp_useSsl(&res))
+		pIn = new_DasIO_ssl("das2py", res.pSsl, "r");
+	else
+		pIn = new_DasIO_socket("das2py", res.nSockFd, "r");
+
+	DasIO_model(pIn, -1);  /* Allow all stream versions */
+
+	pRet = _read_chunked(
+		pIn, pCallback, nRecs > 0 ? nRecs : 0, nBytes > 0 ? nBytes : 0
+	);
+	DasHttpResp_clear(&res);
+	del_DasIO(pIn);
+	return pRet;
+}
+
+static const char pyd2help_read_cmd_cb[] =
+"read_cmd_cb(sCmd, callback, nRecs=0, nBytes=16777216)\n"
+"\n"
+"Reads a Das2 stream from an external program, handing datasets to a\n"
+"callback a chunk at a time while the program is still running.\n"
+"\n"
+"Args:\n"
+"   sCmd (str) : The reader command line to run.\n"
+"   callback (callable) : See :ref:`read_file_cb`\n"
+"   nRecs (int, optional) : See :ref:`read_file_cb`\n"
+"   nBytes (int, optional) : See :ref:`read_file_cb`\n"
+"\n"
+"Returns:\n"
+"   None\n"
+"\n";
+
+static PyObject* pyd2_read_cmd_cb(PyObject* self, PyObject* args)
+{
+	const char* sCmd;
+	PyObject* pCallback = NULL;
+	Py_ssize_t nRecs = 0;
+	Py_ssize_t nBytes = 16777216;
+
+	if(!PyArg_ParseTuple(args, "sO|nn:read_cmd_cb", &sCmd, &pCallback,
+	                     &nRecs, &nBytes))
+		return NULL;
+
+	if(!PyCallable_Check(pCallback)){
+		PyErr_SetString(PyExc_TypeError, "callback must be callable");
+		return NULL;
+	}
+
+	DasIO* pIn = new_DasIO_cmd("das2py", sCmd);
+	if(pIn == NULL) return pyd2_setException(g_pPyD2Error);
+
+	PyObject* pRet = _read_chunked(
+		pIn, pCallback, nRecs > 0 ? nRecs : 0, nBytes > 0 ? nBytes : 0
+	);
+	del_DasIO(pIn);
+	return pRet;
+}
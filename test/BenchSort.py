@@ -0,0 +1,93 @@
+"""Benchmark Dataset.sort against full index array sorting
+
+Dataset.sort used to build numpy.indices(ds.shape) and fancy index every
+variable with it, even when sorting on a time coordinate that only varies
+in the first index.  This script times that approach against the current
+one on a time by frequency spectrogram and checks that both give the same
+answer.
+
+Data from das servers are usually in order already, or only out of order
+where packets or cache blocks overlap, so those cases are timed as well.
+
+Usage: python test/BenchSort.py [RECORDS [FREQUENCIES]]
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+def mkSpectra(nRecs, nFreq, aTime=None):
+	if aTime is None:
+		aTime = numpy.random.default_rng(7).permutation(nRecs).astype('i8')*1000000000
+	ds = das2.Dataset('spectra')
+	ds.coord('time').reference(aTime.view('M8[ns]'), 'UTC')
+	ds.coord('freq').center(numpy.arange(nFreq)*10.0, 'Hz', axis=1)
+	aAmp = numpy.empty((nRecs, nFreq), dtype='f4')
+	aAmp[:] = numpy.arange(nRecs, dtype='f4')[:, None]
+	ds.data('amp').center(aAmp, 'V')
+	return ds
+
+def indexSort(ds, sVar):
+	"""The old way, index arrays for every axis of every variable"""
+	var = ds.getVar(sVar)[1]
+	iSort = var.unique.index(True)
+	aIdent = numpy.indices(ds.shape)
+	lIdx = [aIdent[i] for i in range(len(ds.shape))]
+	lIdx[iSort] = numpy.argsort(var.array, kind="mergesort", axis=iSort)
+	for var in ds._allVars():
+		var.array = var.array[tuple(lIdx)]
+
+def measure(fSort, ds):
+	tracemalloc.start()
+	rBeg = time.perf_counter()
+	fSort(ds)
+	rSec = time.perf_counter() - rBeg
+	nPeak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return (rSec, nPeak)
+
+def main(argv):
+	nRecs = int(argv[1]) if len(argv) > 1 else 20000
+	nFreq = int(argv[2]) if len(argv) > 2 else 1024
+
+	print("Sorting %d x %d float32 spectra on time, %.0f MB of amplitudes"%(
+		nRecs, nFreq, nRecs*nFreq*4/1e6))
+
+	dsOld = mkSpectra(nRecs, nFreq)
+	(rOld, nOld) = measure(lambda ds: indexSort(ds, 'time:reference'), dsOld)
+	print("   index arrays:  %8.3f s  %8.1f MB peak"%(rOld, nOld/1e6))
+
+	dsNew = mkSpectra(nRecs, nFreq)
+	(rNew, nNew) = measure(lambda ds: ds.sort('time:reference'), dsNew)
+	print("   Dataset.sort:  %8.3f s  %8.1f MB peak"%(rNew, nNew/1e6))
+
+	print("   speed up %.0fx, memory %.1fx less"%(rOld/rNew, nOld/max(nNew, 1)))
+
+	for sVar in ('time:reference', 'freq:center', 'amp:center'):
+		if not numpy.array_equal(dsOld.array(sVar), dsNew.array(sVar)):
+			perr("ERROR: Sorts disagree on %s\n"%sVar)
+			return 13
+
+	# Sorted, and packets of 100 records that overlap their neighbors by 5
+	aSorted = numpy.arange(nRecs, dtype='i8')*1000000000
+	aRuns = aSorted.copy()
+	aRuns[100:] -= ((numpy.arange(100, nRecs) // 100)*5)*1000000000
+	for (sWhat, aTime) in (('sorted', aSorted), ('packet runs', aRuns)):
+		ds = mkSpectra(nRecs, nFreq, aTime)
+		(rSec, nPeak) = measure(lambda ds: ds.sort('time:reference'), ds)
+		print("   %-12s   %8.3f s  %8.1f MB peak"%(sWhat + ':', rSec, nPeak/1e6))
+		if not numpy.array_equal(
+			ds.array('time:reference').view('i8')[:,0], numpy.sort(aTime)
+		):
+			perr("ERROR: %s times did not sort\n"%sWhat)
+			return 13
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,70 @@
+"""Benchmark joining many datasets with ds_union and DatasetAccumulator
+
+ds_union needs every piece in memory before it starts, so the peak is the
+pieces plus the output.  A DatasetAccumulator fed straight from a reader
+only holds the output and the current piece.  This script times both on a
+run of daily time by frequency spectrograms and checks that they agree.
+
+Usage: python test/BenchUnion.py [DATASETS [RECORDS [FREQUENCIES]]]
+"""
+
+import sys
+import time
+import tracemalloc
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+def mkSpectra(iDay, nRecs, nFreq):
+	aTime = (iDay*nRecs + numpy.arange(nRecs, dtype='i8'))*1000000000
+	ds = das2.Dataset('spectra')
+	ds.coord('time').reference(aTime.view('M8[ns]'), 'UTC')
+	ds.coord('freq').center(numpy.arange(nFreq)*10.0, 'Hz', axis=1)
+	aAmp = numpy.empty((nRecs, nFreq), dtype='f4')
+	aAmp[:] = numpy.arange(nRecs, dtype='f4')[:, None] + iDay
+	ds.data('amp').center(aAmp, 'V')
+	return ds
+
+def measure(fJoin):
+	tracemalloc.start()
+	rBeg = time.perf_counter()
+	ds = fJoin()
+	rSec = time.perf_counter() - rBeg
+	nPeak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return (ds, rSec, nPeak)
+
+def accumulate(nDs, nRecs, nFreq):
+	acc = das2.DatasetAccumulator()
+	for i in range(nDs): acc.append(mkSpectra(i, nRecs, nFreq))
+	return acc.dataset()
+
+def main(argv):
+	nDs   = int(argv[1]) if len(argv) > 1 else 1000
+	nRecs = int(argv[2]) if len(argv) > 2 else 240
+	nFreq = int(argv[3]) if len(argv) > 3 else 256
+
+	nBytes = nDs*nRecs*(nFreq*4 + 8)
+	print("Joining %d datasets of %d x %d float32 spectra, %.0f MB total"%(
+		nDs, nRecs, nFreq, nBytes/1e6))
+
+	(dsOld, rOld, nOld) = measure(
+		lambda: das2.ds_union([mkSpectra(i, nRecs, nFreq) for i in range(nDs)])
+	)
+	print("   ds_union:            %8.3f s  %8.1f MB peak"%(rOld, nOld/1e6))
+
+	(dsNew, rNew, nNew) = measure(lambda: accumulate(nDs, nRecs, nFreq))
+	print("   DatasetAccumulator:  %8.3f s  %8.1f MB peak"%(rNew, nNew/1e6))
+	print("   peak memory %.2fx the output size"%(nNew/nBytes))
+
+	for sVar in ('time:reference', 'freq:center', 'amp:center'):
+		if not numpy.array_equal(dsOld.array(sVar), dsNew.array(sVar)):
+			perr("ERROR: Joins disagree on %s\n"%sVar)
+			return 13
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
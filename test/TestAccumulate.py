@@ -0,0 +1,117 @@
+import sys
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Joining datasets one at a time as they arrive from a reader
+
+def mkSpectra(nBeg, nRecs, aFreq):
+	aTime = numpy.arange(nBeg, nBeg + nRecs, dtype='i8')
+	ds = das2.Dataset('spectra')
+	ds.coord('time').reference(aTime.view('M8[ns]'), 'UTC')
+	ds.coord('freq').center(aFreq, 'Hz', axis=1)
+	aAmp = numpy.add.outer(aTime.astype('f8'), numpy.arange(len(aFreq))/1000.0)
+	ds.data('amp').center(aAmp, 'V')
+	return ds
+
+def same(sWhat, ds1, ds2):
+	for sDim in ds1.keys():
+		for sRole in ds1[sDim].keys():
+			(a1, a2) = (ds1[sDim][sRole].array, ds2[sDim][sRole].array)
+			if (a1.shape != a2.shape) or \
+			   not numpy.array_equal(numpy.ma.getdata(a1), numpy.ma.getdata(a2)) or \
+			   not numpy.array_equal(numpy.ma.getmaskarray(a1), numpy.ma.getmaskarray(a2)):
+				perr("ERROR: %s, %s:%s differs\n"%(sWhat, sDim, sRole))
+				return False
+	return True
+
+def main(argv):
+
+	aFreq = numpy.arange(8)*10.0
+	lDs = [mkSpectra(i*7, 7, aFreq) for i in range(40)]
+
+	acc = das2.DatasetAccumulator()
+	for ds in lDs: acc.append(ds)
+	dsOut = acc.dataset()
+
+	if (len(acc) != 280) or (dsOut.shape != (280, 8)):
+		perr("ERROR: Expected 280 x 8 records, got %s\n"%(dsOut.shape,))
+		return 13
+	if list(dsOut['time']['reference'].array[:,0].view('i8')) != list(range(280)):
+		perr("ERROR: Records out of order\n")
+		return 13
+	if not same('vs ds_union', dsOut, das2.ds_union(lDs)): return 13
+
+	# Shared frequency tables stay broadcast, spare room is released
+	var = dsOut['freq']['center']
+	if var.unique != [False, True] or var.array.strides[0] != 0:
+		perr("ERROR: Frequency table was expanded\n")
+		return 13
+	aAmp = dsOut['amp']['center'].array
+	if (aAmp.base is not None) and (aAmp.base.nbytes != aAmp.nbytes):
+		perr("ERROR: Amplitude array holds %d bytes for %d bytes of data\n"%(
+			aAmp.base.nbytes, aAmp.nbytes))
+		return 13
+
+	# Taking the dataset doesn't stop appending, or change what was returned
+	acc.append(mkSpectra(280, 3, aFreq))
+	if (dsOut.shape != (280, 8)) or (acc.dataset().shape != (283, 8)):
+		perr("ERROR: Appending after dataset() went wrong\n")
+		return 13
+	if not numpy.array_equal(dsOut['amp']['center'].array, aAmp):
+		perr("ERROR: Earlier dataset changed by later appends\n")
+		return 13
+
+	# A new frequency table part way through, masks, and integer times after
+	# floating point ones
+	ds1 = mkSpectra(10, 5, aFreq*2)
+	ds1['amp'].center(numpy.ma.masked_greater(ds1['amp']['center'].array, 12.0), 'V')
+	lDs = [mkSpectra(0, 10, aFreq), ds1]
+	acc = das2.DatasetAccumulator(nRecs=15)
+	acc.extend(lDs)
+	dsOut = acc.dataset()
+	if not same('new table', dsOut, das2.ds_union(lDs)): return 13
+	aFreqOut = dsOut['freq']['center'].array
+	if (aFreqOut[0,1] != 10.0) or (aFreqOut[14,1] != 20.0):
+		perr("ERROR: Joined frequency tables are wrong\n%s\n"%aFreqOut)
+		return 13
+	if numpy.ma.count_masked(dsOut['amp']['center'].array) != \
+	   numpy.ma.count_masked(ds1['amp']['center'].array):
+		perr("ERROR: Masks were lost\n")
+		return 13
+
+	lDs = []
+	for (i, aVal) in enumerate((numpy.arange(3.5, 6), numpy.arange(6, 9))):
+		ds = das2.Dataset('waveform')
+		ds.coord('time').center(numpy.arange(i*3, i*3 + 3), 's')
+		ds.data('amp').center(aVal, 'V')
+		lDs.append(ds)
+	acc = das2.DatasetAccumulator()
+	acc.extend(lDs[::-1])
+	aOut = acc.dataset()['amp']['center'].array
+	if (aOut.dtype.kind != 'f') or (list(aOut) != [6, 7, 8, 3.5, 4.5, 5.5]):
+		perr("ERROR: Mixed types not promoted, %s\n"%aOut)
+		return 13
+
+	# Different shapes are scatter data, that's for ds_union
+	try:
+		acc = das2.DatasetAccumulator()
+		acc.extend([mkSpectra(0, 5, aFreq), mkSpectra(5, 5, aFreq[:4])])
+		perr("ERROR: Appended datasets of different shapes\n")
+		return 13
+	except das2.DatasetError:
+		pass
+
+	try:
+		das2.DatasetAccumulator().dataset()
+		perr("ERROR: Empty accumulator gave a dataset\n")
+		return 13
+	except ValueError:
+		pass
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,145 @@
+import sys
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Sorting and joining datasets must not expand broadcast variables
+
+def mkSpectra(aTime, nFreq):
+	ds = das2.Dataset('spectra')
+	ds.coord('time').reference(aTime.astype('i8').view('M8[ns]'), 'UTC')
+	ds.coord('freq').center(numpy.arange(nFreq)*10.0, 'Hz', axis=1)
+	aAmp = numpy.add.outer(aTime.astype('f8'), numpy.arange(nFreq)/1000.0)
+	ds.data('amp').center(numpy.ma.masked_greater(aAmp, 5.0), 'V')
+	return ds
+
+def broadcast(sWhat, ds):
+	"""Degenerate indices must still have zero strides"""
+	for sDim in ds.keys():
+		for sRole in ds[sDim].keys():
+			var = ds[sDim][sRole]
+			for i in range(len(var.unique)):
+				if (not var.unique[i]) and (var.array.strides[i] != 0):
+					perr("ERROR: %s, %s:%s was expanded in index %d\n"%(
+						sWhat, sDim, sRole, i))
+					return False
+	return True
+
+def main(argv):
+
+	aTime = numpy.array([3, 1, 4, 0, 2, 6, 5])
+	ds = mkSpectra(aTime, 4)
+	aExpect = mkSpectra(numpy.sort(aTime), 4)['amp']['center'].array
+
+	ds.sort('time:reference')
+	if not broadcast('sort', ds): return 13
+	aAmp = ds['amp']['center'].array
+	if not numpy.array_equal(numpy.ma.getdata(aAmp), numpy.ma.getdata(aExpect)) or \
+	   not numpy.array_equal(numpy.ma.getmaskarray(aAmp), numpy.ma.getmaskarray(aExpect)):
+		perr("ERROR: Sorted amplitudes or masks are wrong\n%s\n"%aAmp)
+		return 13
+	if list(ds['time']['reference'].array[:,0].view('i8')) != list(range(7)):
+		perr("ERROR: Times were not sorted\n")
+		return 13
+
+	# Values unique in every index can still be changed after a sort
+	if not ds['amp']['center'].array.flags.writeable:
+		perr("ERROR: Sorted amplitudes are read only\n")
+		return 13
+	ds['amp']['center'].array[0,0] = aExpect[0,0]
+
+	# Sorting by frequency only re-orders the frequency index
+	ds['freq'].center(numpy.array([30.0, 10.0, 20.0, 0.0]), 'Hz', axis=1)
+	ds.sort('freq')
+	if not broadcast('frequency sort', ds): return 13
+	if list(ds['amp']['center'].array[0].filled(-1)) != [0.003, 0.001, 0.002, 0.0]:
+		perr("ERROR: Frequency sort re-ordered the wrong values\n")
+		return 13
+	if not ds['amp']['center'].array.flags.writeable:
+		perr("ERROR: Frequency sorted amplitudes are read only\n")
+		return 13
+
+	# Sorted input is left alone, nothing is copied
+	ds = mkSpectra(numpy.arange(7), 4)
+	aAmp = ds['amp']['center'].array
+	ds.sort('time:reference')
+	if ds['amp']['center'].array is not aAmp:
+		perr("ERROR: Already sorted dataset was re-ordered\n")
+		return 13
+
+	ds = das2.Dataset('waveform')
+	ds.coord('time').reference(numpy.array([0, 0, 1, 2], dtype='M8[ns]'), 'UTC')
+	ds.data('amp').center(numpy.array([1.0, 2.0, 0.0, 0.0]), 'V')
+	aAmp = ds['amp']['center'].array
+	ds.sort('time:reference', 'amp:center')
+	if ds['amp']['center'].array is not aAmp:
+		perr("ERROR: Already sorted dataset was re-ordered on two keys\n")
+		return 13
+
+	# Nothing to sort in empty datasets
+	ds = das2.Dataset('waveform')
+	ds.coord('time').reference(numpy.zeros(0, dtype='M8[ns]'), 'UTC')
+	ds.coord('seq').center(numpy.zeros(0, dtype='i4'), '')
+	ds.data('amp').center(numpy.zeros(0), 'V')
+	for tSortOn in (('time:reference',), ('time:reference', 'seq')):
+		ds.sort(*tSortOn)
+		if ds.shape != (0,):
+			perr("ERROR: Sorting an empty dataset on %s changed it\n"%(tSortOn,))
+			return 13
+
+	# Runs that overlap at packet boundaries, and values that don't compare
+	aTime = numpy.array([0, 2, 4, 6, 5, 7, 9, 8, 10, 11])
+	for aAmp in (
+		numpy.arange(10.0),
+		numpy.ma.masked_values(numpy.arange(10.0), 3.0),
+		numpy.array([0, 1, 2, numpy.nan, 4, 5, 6, 7, 8, 9])
+	):
+		ds = das2.Dataset('waveform')
+		ds.coord('time').reference(aTime.astype('i8').view('M8[ns]'), 'UTC')
+		ds.data('amp').center(aAmp[::-1], 'V')
+		aOrder = numpy.argsort(aAmp[::-1], kind="mergesort")
+		ds.sort('amp')
+		if list(ds['time']['reference'].array.view('i8')) != list(aTime[aOrder]):
+			perr("ERROR: Sort of %s is wrong\n"%aAmp[::-1])
+			return 13
+		ds.sort('time:reference')
+		if list(ds['time']['reference'].array.view('i8')) != sorted(aTime):
+			perr("ERROR: Overlapping runs were not sorted\n")
+			return 13
+
+	# Same for 1-D time values
+	ds = das2.Dataset('waveform')
+	ds.coord('time').center(numpy.array([2, 0, 1], dtype='M8[ns]'), 'UTC')
+	ds.data('amp').center(numpy.array([2.0, 0.0, 1.0]), 'V')
+	ds.sort('time:center')
+	for sDim in ('time', 'amp'):
+		if not ds[sDim]['center'].array.flags.writeable:
+			perr("ERROR: Sorted %s values are read only\n"%sDim)
+			return 13
+	ds['time']['center'].array[0] = numpy.datetime64(5, 'ns')
+
+	# Joins keep shared frequency tables broadcast and keep masks
+	lDs = [mkSpectra(numpy.arange(5), 4), mkSpectra(numpy.arange(5, 9), 4)]
+	nMasked = sum(numpy.ma.count_masked(ds['amp']['center'].array) for ds in lDs)
+	dsUnion = das2.ds_union(lDs)
+	if (dsUnion.shape != (9, 4)) or not broadcast('union', dsUnion): return 13
+	aAmp = dsUnion['amp']['center'].array
+	if (nMasked == 0) or (numpy.ma.count_masked(aAmp) != nMasked):
+		perr("ERROR: Joined amplitude masks were lost\n")
+		return 13
+
+	# Different frequency tables have to vary by record
+	ds1 = mkSpectra(numpy.arange(5, 9), 4)
+	ds1['freq'].center(numpy.arange(4)*20.0, 'Hz', axis=1)
+	dsUnion = das2.ds_union([mkSpectra(numpy.arange(5), 4), ds1])
+	aFreq = dsUnion['freq']['center'].array
+	if (aFreq[0,1] != 10.0) or (aFreq[8,1] != 20.0):
+		perr("ERROR: Joined frequency tables are wrong\n%s\n"%aFreq)
+		return 13
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,91 @@
+import sys
+import os
+import time
+import tempfile
+import shutil
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Stream cache round trip, expiry and eviction
+
+def mkRaw(nRecs):
+	aTime = numpy.arange(nRecs, dtype='int64').astype('M8[s]').astype('M8[ns]')
+	dHdr = {'props':{'title':('String', 'Test stream', '', '', 1)},
+	        'frames':None, 'info':'test'}
+	dDs = {
+		'id':'test', 'group':'test', 'rank':1, 'shape':[nRecs], 'info':'',
+		'props':{},
+		'coords':{'time':{'type':'COORD_DIM', 'props':{},
+			'center':{'role':'center', 'units':'UTC', 'valtype':'long',
+			          'frame':None, 'expression':'t[i] UTC | i:0..%d'%nRecs}}},
+		'data':{'amp':{'type':'DATA_DIM', 'props':{},
+			'center':{'role':'center', 'units':'V', 'valtype':'double',
+			          'frame':None, 'expression':'a[i] V | i:0..%d'%nRecs}}},
+		'arrays':{'t':aTime, 'a':numpy.linspace(0.0, 1.0, nRecs)},
+		'fill':{'t':None, 'a':-1e31},
+		'offsets':{}
+	}
+	return (dHdr, [dDs])
+
+def main(argv):
+
+	sDir = tempfile.mkdtemp(prefix='das2_cache_')
+	try:
+		cache = das2.StreamCache(sDir, nMaxBytes=0, rTtl=0)
+
+		sKey = das2.cache_key({'url':'http://example.org/das?a=1&b=2'})
+		if sKey != das2.cache_key({'url':'http://example.org/das?a=1&b=2'}):
+			perr("ERROR: Cache keys are not stable\n")
+			return 13
+
+		if cache.get(sKey) is not None:
+			perr("ERROR: Empty cache returned an entry\n")
+			return 13
+
+		(dHdr, lRaw) = mkRaw(100)
+		aExpect = lRaw[0]['arrays']['a'].copy()
+		cache.put(sKey, dHdr, lRaw)
+
+		(dHdr, lRaw) = cache.get(sKey)
+		ds = das2.ds_from_raw(lRaw[0])
+		if not numpy.array_equal(ds['amp']['center'].array, aExpect):
+			perr("ERROR: Cached values differ from originals\n")
+			return 13
+		if ds['time']['center'].array.dtype != numpy.dtype('M8[ns]'):
+			perr("ERROR: Cached time values are not datetime64\n")
+			return 13
+
+		# Expiry
+		cache.ttl = 1e-6
+		time.sleep(0.01)
+		if cache.get(sKey) is not None:
+			perr("ERROR: Expired entry was returned\n")
+			return 13
+		cache.ttl = 0
+
+		# LRU eviction, touch the first entry so the second one goes
+		lKeys = [das2.cache_key({'n':i}) for i in range(3)]
+		for sKey in lKeys[:2]: cache.put(sKey, *mkRaw(1000))
+		nSize = cache.size()
+		os.utime(cache._path(lKeys[1]), (1, 1))
+		cache.get(lKeys[0])
+
+		cache.max_bytes = nSize
+		cache.put(lKeys[2], *mkRaw(1000))
+
+		if (cache.get(lKeys[1]) is not None) or (cache.get(lKeys[0]) is None) \
+		   or (cache.get(lKeys[2]) is None):
+			perr("ERROR: Least recently used entry was not the one evicted\n")
+			return 13
+
+	finally:
+		shutil.rmtree(sDir)
+
+	print("Stream cache tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,137 @@
+import sys
+import io
+import os
+import gzip
+import zlib
+import shutil
+import tempfile
+from os.path import join as pjoin
+
+import das2
+import das2.verify
+
+perr = sys.stderr.write
+
+# Reading gzip and zlib compressed streams
+
+class _ReadOnly(object):
+	"""A file-like object with nothing but read(), no peek() or readinto()"""
+	def __init__(self, xData):
+		self.fIn = io.BytesIO(xData)
+	def read(self, n=-1):
+		return self.fIn.read(n)
+
+class _Response(io.BufferedReader):
+	"""Stand in for an HTTP response with a Content-Encoding header"""
+	def __init__(self, xData, sEncoding):
+		super().__init__(io.BytesIO(xData))
+		self.headers = {'Content-Encoding':sEncoding}
+
+def packets(fIn):
+	return [(pkt.tag, pkt.id, bytes(pkt.content)) for pkt in das2.PacketReader(fIn)]
+
+def main(argv):
+
+	sTmp = tempfile.mkdtemp(prefix='das2_compress_')
+	try:
+		for sFile in ('ex96_yscan_multispec.d2t', 'ex15_vector_frame.d3b'):
+			with open(pjoin('test', sFile), 'rb') as fIn:
+				xRaw = fIn.read()
+			lRaw = packets(io.BytesIO(xRaw))
+
+			# An archive appended to, so two gzip members
+			xGz = gzip.compress(xRaw[:1000]) + gzip.compress(xRaw[1000:])
+			sGz = pjoin(sTmp, sFile + '.gz')
+			with open(sGz, 'wb') as fOut:
+				fOut.write(xGz)
+
+			with open(sGz, 'rb') as fIn:
+				if packets(fIn) != lRaw:
+					perr("ERROR: %s, gzip file read differently\n"%sFile)
+					return 13
+
+			if packets(_ReadOnly(xGz)) != lRaw:
+				perr("ERROR: %s, gzip input without peek() read differently\n"%sFile)
+				return 13
+
+			if packets(_Response(zlib.compress(xRaw), 'deflate')) != lRaw:
+				perr("ERROR: %s, deflate content encoding not handled\n"%sFile)
+				return 13
+
+			# Label says gzip, but a proxy already decoded it
+			if packets(_Response(xRaw, 'gzip')) != lRaw:
+				perr("ERROR: %s, mislabeled plain stream not read\n"%sFile)
+				return 13
+
+			# Decompressing into a pipe for the C readers
+			with das2.FileFeed(sGz) as sPath:
+				with open(sPath, 'rb') as fIn:
+					if fIn.read() != xRaw:
+						perr("ERROR: %s, file feed content differs\n"%sFile)
+						return 13
+
+			# Readers that stop early don't leave the feeder hanging
+			with das2.FileFeed(sGz) as sPath:
+				with open(sPath, 'rb') as fIn:
+					fIn.read(10)
+
+			with das2.FileFeed(pjoin('test', sFile)) as sPath:
+				if sPath != pjoin('test', sFile):
+					perr("ERROR: Uncompressed file not passed through\n")
+					return 13
+
+		try:
+			with open(sGz, 'rb') as fIn:
+				das2.PacketReader(fIn, mmap=True)
+			perr("ERROR: Compressed file was memory mapped\n")
+			return 13
+		except ValueError:
+			pass
+
+		try:
+			packets(io.BufferedReader(io.BytesIO(xGz[:-100])))
+			perr("ERROR: Truncated stream not detected\n")
+			return 13
+		except ValueError:
+			pass
+
+		try:
+			das2.decompress(io.BytesIO(xRaw), encoding='br')
+			perr("ERROR: Unknown encoding accepted\n")
+			return 13
+		except ValueError:
+			pass
+
+		# Rewinding, as needed to show context for document errors
+		fIn = das2.decompress(io.BufferedReader(io.BytesIO(xGz)))
+		fIn.read(5000)
+		fIn.seek(0)
+		if fIn.read() != xRaw:
+			perr("ERROR: Rewound compressed stream read differently\n")
+			return 13
+
+		# Verification and directory walks
+		stdout = sys.stdout
+		sys.stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+		try:
+			nRet = das2.verify.verifyFile(sGz)
+			lFound = list(das2.verify._findFiles([sTmp], True, das2.verify.g_lStreamExt))
+		finally:
+			sys.stdout = stdout
+		if nRet != 0:
+			perr("ERROR: Compressed stream %s did not validate\n"%sGz)
+			return 13
+		if len(lFound) != 2:
+			perr("ERROR: Expected 2 compressed files in %s, found %s\n"%(sTmp, lFound))
+			return 13
+
+	finally:
+		shutil.rmtree(sTmp)
+
+	print("Compressed streams read okay, zstd support: %s"%(
+		'zstd' in das2.compress.accept_encodings()))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,85 @@
+import sys
+import os
+import json
+import tempfile
+import shutil
+import das2
+
+perr = sys.stderr.write
+
+# Breadth first catalog prefetch over a small tree of local files
+
+def mkTree(sDir, nCols, nSrcs):
+	# Write root -> nCols collections -> nSrcs sources each, return root URL
+	def url(sName): return 'file://%s'%os.path.join(sDir, sName)
+
+	dRoot = {'type':'Catalog', 'name':'Root', 'catalog':{}}
+	for i in range(nCols):
+		sCol = 'col%02d'%i
+		dCol = {'type':'Collection', 'name':sCol, 'title':'Collection %d'%i,
+		        'sources':{}}
+		for j in range(nSrcs):
+			sSrc = '%s_src%02d'%(sCol, j)
+			dCol['sources']['src%02d'%j] = {
+				'type':'HttpStreamSrc', 'name':sSrc, 'urls':[url(sSrc + '.json')]
+			}
+			with open(os.path.join(sDir, sSrc + '.json'), 'w') as fOut:
+				json.dump({'type':'HttpStreamSrc', 'name':sSrc,
+				           'title':'Source %d of %s'%(j, sCol)}, fOut)
+
+		dRoot['catalog'][sCol] = {'type':'Collection', 'name':sCol,
+		                          'urls':[url(sCol + '.json')]}
+		with open(os.path.join(sDir, sCol + '.json'), 'w') as fOut:
+			json.dump(dCol, fOut)
+
+	# One broken link
+	dRoot['catalog']['broken'] = {'type':'Catalog', 'name':'broken',
+	                              'urls':[url('missing.json')]}
+
+	with open(os.path.join(sDir, 'root.json'), 'w') as fOut:
+		json.dump(dRoot, fOut)
+	return url('root.json')
+
+def main(argv):
+
+	sDir = tempfile.mkdtemp(prefix='das2_crawl_')
+	try:
+		sRoot = mkTree(sDir, 4, 5)
+		sPath = 'tag:das2.org,2012:test:/crawl'
+
+		# Depth limited, only the collections load
+		cat = das2.get_catalog(sPath, sRoot)
+		(dIndex, dStats) = cat.prefetch(depth=1, workers=4)
+		if (dStats['loaded'] != 4) or (dStats['levels'] != 1):
+			perr("ERROR: Depth 1 prefetch stats are wrong: %s\n"%dStats)
+			return 13
+
+		(dIndex, dStats) = das2.crawl(sPath, sRoot, workers=4)
+		lSrcs = [s for s in dIndex if dIndex[s] == 'HttpStreamSrc']
+		if len(lSrcs) != 20:
+			perr("ERROR: Expected 20 sources in the index, found %d\n"%len(lSrcs))
+			return 13
+		if list(dStats['failed'].keys()) != ['%s/broken'%sPath]:
+			perr("ERROR: Expected one failed node, got %s\n"%dStats['failed'])
+			return 13
+		if dIndex['%s/col01/src03'%sPath] != 'HttpStreamSrc':
+			perr("ERROR: Source paths are not built from the catalog keys\n")
+			return 13
+
+		# Loaded nodes are full definitions, no further lookups needed
+		cat = das2.get_catalog(sPath, sRoot)
+		cat.prefetch(workers=4)
+		src = cat['col02']['src04']
+		if src.bStub or (src.props['title'] != 'Source 4 of col02'):
+			perr("ERROR: Source was not loaded by prefetch\n")
+			return 13
+
+	finally:
+		shutil.rmtree(sDir)
+
+	print("Catalog crawl: %d nodes in %.3f s"%(dStats['nodes'], dStats['seconds']))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,152 @@
+import sys
+import threading
+import time
+
+try:
+	from urllib.parse import urlsplit, parse_qs
+except ImportError:
+	from urlparse import urlsplit, parse_qs
+
+import das2
+import das2.streamsrc
+
+perr = sys.stderr.write
+
+# Batch queries spread over mirrors, no server needed, the C reader is
+# replaced by a fake that records which mirror got which query
+
+g_lMirrors = ['http://a.test/das2', 'http://b.test/das2', 'http://c.test/das2']
+
+class FakeServer(object):
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.lCalls = []      # (mirror, start time) for each request
+		self.lDown = []       # Mirrors that fail every request
+		self.lBadTimes = []   # Start times that fail on every mirror
+
+	def read_server(self, sUrl, *args):
+		(sBase, sQuery) = sUrl.split('?', 1)
+		sStart = parse_qs(sQuery)['start_time'][0]
+		with self.lock:
+			self.lCalls.append((sBase, sStart))
+
+		time.sleep(0.01)  # Let the pool overlap requests
+		if (sBase in self.lDown) or (sStart in self.lBadTimes):
+			raise IOError("Fake server %s refused %s"%(sBase, sStart))
+
+		return ({'props':{}, 'mirror':sBase, 'start':sStart}, [])
+
+def mkSource():
+	dTime = {
+		'minimum':{'value':'2017-01-01', 'set':{'param':'start_time'}},
+		'maximum':{'value':'2017-01-02', 'set':{'param':'end_time'}}
+	}
+	dDef = {
+		'type':'HttpStreamSrc', 'name':'fake', '_url':'file:///dev/null',
+		'_path':'tag:das2.org,2012:test:/fake',
+		'protocol':{
+			'base_urls':list(g_lMirrors),
+			'http_params':{'start_time':{'required':True}, 'end_time':{'required':True}}
+		},
+		'interface':{'coordinates':{'time':dTime}}
+	}
+	return das2.HttpStreamSrc(dDef, False, False)
+
+def days(nDays):
+	return [
+		{'time':('2017-01-%02d'%(i+1), '2017-01-%02d'%(i+2))} for i in range(nDays)
+	]
+
+def starts(lRet):
+	return [None if tRet is None else tRet[0]['start'] for tRet in lRet]
+
+def main(argv):
+
+	fake = FakeServer()
+	fnReal = das2.streamsrc._das2.read_server
+	das2.streamsrc._das2.read_server = fake.read_server
+	try:
+		# All mirrors up, queries go round-robin and come back in order
+		src = mkSource()
+		lQueries = days(9)
+		lRet = src.get_many(lQueries, max_workers=4)
+		lExpect = [dQuery['time'][0] for dQuery in lQueries]
+		if starts(lRet) != lExpect:
+			perr("ERROR: Results out of query order, %s\n"%starts(lRet))
+			return 13
+		for i in range(len(lRet)):
+			if lRet[i][0]['mirror'] != g_lMirrors[i % 3]:
+				perr("ERROR: Query %d went to %s\n"%(i, lRet[i][0]['mirror']))
+				return 13
+		if len(fake.lCalls) != 9:
+			perr("ERROR: Expected 9 requests, made %d\n"%len(fake.lCalls))
+			return 13
+
+		# One mirror down, its share moves to the next mirror in line
+		fake.lCalls = []
+		fake.lDown = [g_lMirrors[1]]
+		lRet = src.get_many(days(30), max_workers=8)
+		if None in lRet:
+			perr("ERROR: Queries failed with two mirrors still up\n")
+			return 13
+		for i in range(len(lRet)):
+			if (i % 3 == 1) and (lRet[i][0]['mirror'] != g_lMirrors[2]):
+				perr("ERROR: Query %d did not fail over to %s\n"%(i, g_lMirrors[2]))
+				return 13
+
+		# Many threads failing on the same mirror list it once
+		if src.lBadBase != [g_lMirrors[1]]:
+			perr("ERROR: Bad mirror list is %s\n"%src.lBadBase)
+			return 13
+
+		# A query that fails everywhere is None, the others are fine
+		fake.lDown = []
+		fake.lBadTimes = ['2017-01-03']
+		lRet = src.get_many(days(5), max_workers=4)
+		if starts(lRet) != ['2017-01-01', '2017-01-02', None, '2017-01-04', '2017-01-05']:
+			perr("ERROR: Expected only the third query to fail, %s\n"%starts(lRet))
+			return 13
+		nTries = len([t for t in fake.lCalls if t[1] == '2017-01-03'])
+		if nTries < 3:
+			perr("ERROR: Failed query only tried on %d mirrors\n"%nTries)
+			return 13
+
+		if src.get_many([]) != []:
+			perr("ERROR: An empty batch should give an empty list\n")
+			return 13
+
+		# Single queries stop at the first mirror that works and skip the
+		# known bad ones
+		src = mkSource()
+		fake.lBadTimes = []
+		fake.lDown = [g_lMirrors[0]]
+		fake.lCalls = []
+		dProto = {'start_time':'2017-01-01', 'end_time':'2017-01-02'}
+		(dHdr, lDs) = src.protoGet(dProto)
+		if [t[0] for t in fake.lCalls] != g_lMirrors[:2]:
+			perr("ERROR: protoGet made requests to %s\n"%fake.lCalls)
+			return 13
+
+		fake.lCalls = []
+		src.protoGet(dProto)
+		if [t[0] for t in fake.lCalls] != [g_lMirrors[1]]:
+			perr("ERROR: protoGet retried a bad mirror, %s\n"%fake.lCalls)
+			return 13
+
+		fake.lDown = list(g_lMirrors)
+		try:
+			src.protoGet(dProto)
+			perr("ERROR: protoGet with all mirrors down did not raise\n")
+			return 13
+		except das2.SourceError:
+			pass
+
+	finally:
+		das2.streamsrc._das2.read_server = fnReal
+
+	print("Batch queries spread and failed over correctly")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
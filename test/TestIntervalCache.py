@@ -0,0 +1,192 @@
+import sys
+import threading
+import numpy
+
+try:
+	from urllib.parse import parse_qs
+except ImportError:
+	from urlparse import parse_qs
+
+import das2
+import das2.streamsrc
+
+perr = sys.stderr.write
+
+# Interval cache gap finding, trimming and counters, no server needed.  For
+# HttpStreamSrc.get() the C reader is replaced by a fake that makes one
+# minute records for whatever time range it's asked for.
+
+def t64(s): return numpy.datetime64(s, 'ns')
+
+def mkDs(sBeg, sEnd):
+	# One minute records with a 2-D spectrum that is degenerate in frequency
+	aTime = numpy.arange(t64(sBeg), t64(sEnd), numpy.timedelta64(60, 's'))
+	aFreq = numpy.array([10.0, 20.0, 40.0])
+
+	ds = das2.Dataset('spec', 'spec')
+	ds.shape = (len(aTime), len(aFreq))
+	ds.coord('time').center(aTime, 'UTC')
+	ds.coord('frequency').center(aFreq, 'Hz', axis=1)
+	aAmp = numpy.arange(len(aTime)*len(aFreq), dtype='f8').reshape(ds.shape)
+	ds.data('amp').center(aAmp, 'V**2 m**-2 Hz**-1')
+	return ds
+
+def mkRaw(aTime):
+	n = len(aTime)
+	return {
+		'id':'amp', 'group':'amp', 'props':{}, 'shape':[n],
+		'coords':{'time':{'center':{
+			'expression':'time[i] UTC | i:0..%d'%n, 'units':'UTC', 'role':'center'
+		}}},
+		'data':{'amp':{'center':{
+			'expression':'val[i] V | i:0..%d'%n, 'units':'V', 'role':'center'
+		}}},
+		'arrays':{'time':aTime, 'val':numpy.arange(n, dtype='f8')},
+		'fill':{'val':-1e31}
+	}
+
+class FakeServer(object):
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.lCalls = []   # (start, end) of each request
+
+	def read_server(self, sUrl, *args):
+		dQuery = parse_qs(sUrl.split('?', 1)[1])
+		(sBeg, sEnd) = (dQuery['start_time'][0], dQuery['end_time'][0])
+		(t0, t1) = (t64(das2.DasTime(sBeg).isoc(6)), t64(das2.DasTime(sEnd).isoc(6)))
+		with self.lock:
+			self.lCalls.append((t0, t1))
+		aTime = numpy.arange(t0, t1, numpy.timedelta64(60, 's'))
+		return ({'props':{}}, [mkRaw(aTime)])
+
+def mkSource():
+	dTime = {
+		'minimum':{'value':'2017-01-01', 'set':{'param':'start_time'}},
+		'maximum':{'value':'2017-01-02', 'set':{'param':'end_time'}}
+	}
+	dDef = {
+		'type':'HttpStreamSrc', 'name':'fake', '_url':'file:///dev/null',
+		'_path':'tag:das2.org,2012:test:/fake',
+		'protocol':{
+			'base_urls':['http://a.test/das2'],
+			'http_params':{'start_time':{'required':True}, 'end_time':{'required':True}}
+		},
+		'interface':{'coordinates':{'time':dTime}}
+	}
+	return das2.HttpStreamSrc(dDef, False, False)
+
+def sourceGets():
+	# Queries through HttpStreamSrc.get() with the process interval cache on
+	fake = FakeServer()
+	fnReal = das2.streamsrc._das2.read_server
+	das2.streamsrc._das2.read_server = fake.read_server
+	das2.set_interval_cache()
+	try:
+		src = mkSource()
+		for (sBeg, sEnd, lGaps, nRecs) in (
+			('2017-01-01T00:00', '2017-01-01T02:00', [('00:00', '02:00')], 120),
+			('2017-01-01T00:30', '2017-01-01T01:00', [], 30),
+			('2017-01-01T01:00', '2017-01-01T03:00', [('02:00', '03:00')], 120),
+			('2017-01-01T00:00', '2017-01-01T03:00', [], 180)
+		):
+			fake.lCalls = []
+			(dHdr, lDs) = src.get({'time':(sBeg, sEnd)})
+			lExpect = [
+				(t64('2017-01-01T%s'%s0), t64('2017-01-01T%s'%s1)) for (s0, s1) in lGaps
+			]
+			if fake.lCalls != lExpect:
+				perr("ERROR: get() for %s to %s requested %s\n"%(sBeg, sEnd, fake.lCalls))
+				return False
+			aTime = lDs[0]['time']['center'].array
+			if (lDs[0].shape != (nRecs,)) or (aTime[0] != t64(sBeg)):
+				perr("ERROR: get() for %s to %s gave shape %s\n"%(
+					sBeg, sEnd, lDs[0].shape))
+				return False
+
+		# Shorter than the protocol precision and not held, goes to the server
+		fake.lCalls = []
+		(dHdr, lDs) = src.get({'time':('2017-01-01T05:00', '2017-01-01T05:00:00.0005')})
+		if (len(fake.lCalls) != 1) or (lDs[0].shape != (1,)):
+			perr("ERROR: Sub-millisecond query requested %s\n"%fake.lCalls)
+			return False
+
+	finally:
+		das2.streamsrc._das2.read_server = fnReal
+		das2.clear_cache(bDisable=True)
+
+	return True
+
+def main(argv):
+
+	cache = das2.IntervalCache()
+	sKey = das2.cache_key({'source':'test:/spec', 'query':{'res':'0'}})
+
+	t0 = t64('2017-01-01T00:00')
+	t1 = t64('2017-01-01T02:00')
+
+	lGaps = cache.gaps(sKey, t0, t1)
+	if lGaps != [(t0, t1)]:
+		perr("ERROR: Empty cache should have one gap, got %s\n"%lGaps)
+		return 13
+	pc = cache.add(sKey, t0, t1, {}, [mkDs('2017-01-01T00:00', '2017-01-01T02:00')])
+	cache.serve(sKey, t0, t1, lFresh=[pc])
+
+	# Overlapping request only needs the end
+	t2 = t64('2017-01-01T03:00')
+	lGaps = cache.gaps(sKey, t64('2017-01-01T01:00'), t2)
+	if lGaps != [(t1, t2)]:
+		perr("ERROR: Expected gap %s to %s, got %s\n"%(t1, t2, lGaps))
+		return 13
+	pc = cache.add(sKey, t1, t2, {}, [mkDs('2017-01-01T02:00', '2017-01-01T03:00')])
+	lRet = cache.serve(sKey, t64('2017-01-01T01:00'), t2, lFresh=[pc])
+
+	ds = das2.ds_union([lDs[0] for (dHdr, lDs) in lRet])
+	aTime = ds['time']['center'].array[:,0]
+	if (ds.shape != (120, 3)) or (aTime[0] != t64('2017-01-01T01:00')) or \
+	   numpy.any(numpy.diff(aTime) != numpy.timedelta64(60, 's')):
+		perr("ERROR: Served data have the wrong range, %s\n"%(ds.shape,))
+		return 13
+
+	# Degenerate axes survive trimming
+	dsPiece = lRet[0][1][0]
+	if dsPiece['frequency']['center'].unique != [False, True]:
+		perr("ERROR: Frequency became unique in time after trimming\n")
+		return 13
+
+	# Sub-range, all from memory
+	tA = t64('2017-01-01T00:10')
+	tB = t64('2017-01-01T00:20')
+	if cache.gaps(sKey, tA, tB) != []:
+		perr("ERROR: Sub-range should be fully cached\n")
+		return 13
+	lRet = cache.serve(sKey, tA, tB)
+	if lRet[0][1][0].shape != (10, 3):
+		perr("ERROR: Sub-range has shape %s\n"%(lRet[0][1][0].shape,))
+		return 13
+
+	dStats = cache.stats()
+	if (dStats['hits'] != 1) or (dStats['partial'] != 1) or (dStats['misses'] != 1) \
+	   or (dStats['bytes_saved'] <= 0):
+		perr("ERROR: Unexpected cache counters %s\n"%dStats)
+		return 13
+
+	# Different options are a different series
+	sOther = das2.cache_key({'source':'test:/spec', 'query':{'res':'60'}})
+	if cache.gaps(sOther, tA, tB) != [(tA, tB)]:
+		perr("ERROR: Options were not part of the interval key\n")
+		return 13
+
+	cache.max_bytes = 1
+	cache.evict()
+	if cache.size() != 0:
+		perr("ERROR: Eviction left %d bytes\n"%cache.size())
+		return 13
+
+	if not sourceGets(): return 13
+
+	print("Interval cache tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
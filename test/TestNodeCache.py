@@ -0,0 +1,79 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import shutil
+import das2
+
+perr = sys.stderr.write
+
+# Catalog node cache, revalidation and offline mode using local files
+
+g_dNode = {
+	'type':'Catalog', 'name':'Test catalog', 'version':'0.5',
+	'title':'Node cache test catalog', 'catalog':{}
+}
+
+def main(argv):
+
+	sDir = tempfile.mkdtemp(prefix='das2_nodes_')
+	ncache = None
+	try:
+		sFile = os.path.join(sDir, 'node.json')
+		with open(sFile, 'w') as fOut: json.dump(g_dNode, fOut)
+		sUrl = 'file://%s'%sFile
+		sPath = 'tag:das2.org,2012:test:/node_cache'
+
+		ncache = das2.set_node_cache(os.path.join(sDir, 'cache'), rMaxAge=3600)
+
+		cat = das2.get_node(sPath, sUrl)
+		cat = das2.get_node(sPath, sUrl)
+		if (ncache.misses != 1) or (ncache.hits != 1):
+			perr("ERROR: Expected 1 miss and 1 hit, got %d, %d\n"%(
+				ncache.misses, ncache.hits))
+			return 13
+		if cat.props['title'] != g_dNode['title']:
+			perr("ERROR: Cached node has the wrong title\n")
+			return 13
+
+		# Expired entries are revalidated, the first check picks up validators
+		ncache.max_age = 0
+		das2.get_node(sPath, sUrl)
+		das2.get_node(sPath, sUrl)
+		if ncache.revalidated != 2 or ncache.hits != 2:
+			perr("ERROR: Unchanged node was not revalidated\n")
+			return 13
+
+		# Changed nodes are reloaded
+		g_dNode['title'] = 'Changed title'
+		with open(sFile, 'w') as fOut: json.dump(g_dNode, fOut)
+		rTime = time.time() + 10
+		os.utime(sFile, (rTime, rTime))
+
+		cat = das2.get_node(sPath, sUrl)
+		if cat.props['title'] != 'Changed title':
+			perr("ERROR: Changed node was not reloaded\n")
+			return 13
+
+		# Offline, cached nodes work, others fail quickly
+		ncache.offline = True
+		os.remove(sFile)
+		cat = das2.get_node(sPath, sUrl)
+		try:
+			das2.get_node('tag:das2.org,2012:test:/not_cached', sUrl)
+			perr("ERROR: Offline mode loaded an uncached node\n")
+			return 13
+		except das2.CatalogError:
+			pass
+
+	finally:
+		if ncache != None: das2.clear_cache(True)
+		shutil.rmtree(sDir)
+
+	print("Node cache tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,100 @@
+import sys
+import os
+import shutil
+import tempfile
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Memory mapped reading, random packet access, time seeks and sidecar indexes
+
+def summary(lPkts):
+	return [(pkt.tag, pkt.id, pkt.length, bytes(pkt.content)) for pkt in lPkts]
+
+def main(argv):
+
+	sDir = tempfile.mkdtemp(prefix='das2_pktidx_')
+	try:
+		sFile = os.path.join(sDir, 'ex96.d2t')
+		shutil.copy('test/ex96_yscan_multispec.d2t', sFile)
+
+		with open(sFile, 'rb') as fIn:
+			lExpect = summary(das2.PacketReader(fIn))
+
+		fIn = open(sFile, 'rb')
+		reader = das2.PacketReader(fIn, mmap=True, index=True)
+		if len(reader) != len(lExpect):
+			perr("ERROR: Index has %d packets, expected %d\n"%(
+				len(reader), len(lExpect)))
+			return 13
+
+		if summary(reader) != lExpect:
+			perr("ERROR: Mapped packets differ from streamed packets\n")
+			return 13
+
+		if summary([reader[-1], reader[3]]) != [lExpect[-1], lExpect[3]]:
+			perr("ERROR: Random packet access returned the wrong packets\n")
+			return 13
+
+		if not isinstance(reader[-1].content, memoryview):
+			perr("ERROR: Mapped data packets are not views\n")
+			return 13
+
+		lId3 = summary(reader.packets(id=3))
+		if lId3 != [t for t in lExpect if (t[0] == 'Pd') and (t[1] == 3)]:
+			perr("ERROR: packets(id=3) selected the wrong packets\n")
+			return 13
+
+		# Seek, then iteration resumes at the first ID 3 packet at or after
+		# the time
+		(aNums, aTimes) = reader._pktTimes(3)
+		if (len(aNums) != len(lId3)) or (aTimes[0] != numpy.datetime64('2017-09-15T10:00:06.003')):
+			perr("ERROR: Wrong data packet times for ID 3\n")
+			return 13
+
+		n = reader.seek_time(aTimes[100], id=3)
+		if (n != aNums[100]) or (next(reader).id != 3):
+			perr("ERROR: seek_time found packet %d, expected %d\n"%(n, aNums[100]))
+			return 13
+
+		if reader.seek_time('2017-09-16') != len(reader):
+			perr("ERROR: Seeking past the end should return len(reader)\n")
+			return 13
+
+		reader.close()
+		fIn.close()
+
+		# Re-opening uses the sidecar instead of scanning
+		sIndex = sFile + '.pktidx'
+		if not os.path.isfile(sIndex):
+			perr("ERROR: Sidecar index %s was not written\n"%sIndex)
+			return 13
+
+		with open(sFile, 'rb') as fIn:
+			reader = das2.PacketReader(fIn, mmap=True, index=True)
+			reader._nextPkt = None  # Any scan would fail
+			if summary(reader) != lExpect:
+				perr("ERROR: Packets read via sidecar index differ\n")
+				return 13
+			reader.close()
+
+		# Changing the file invalidates the sidecar
+		with open(sFile, 'ab') as fOut:
+			fOut.write(b'[xx]000019<comment type="x"/>')
+		with open(sFile, 'rb') as fIn:
+			reader = das2.PacketReader(fIn, mmap=True, index=True)
+			if (len(reader) != len(lExpect) + 1) or (reader[-1].tag != 'Cx'):
+				perr("ERROR: Stale sidecar index was used\n")
+				return 13
+			reader.close()
+
+	finally:
+		shutil.rmtree(sDir)
+
+	print("Packet index tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,124 @@
+import sys
+import io
+import das2
+
+perr = sys.stderr.write
+
+# Buffered packet reading, payload views vs copies and small chunk sizes
+
+class ReadOnly(object):
+	"""A file-like object with nothing but read()"""
+	def __init__(self, xData):
+		self.fIn = io.BytesIO(xData)
+
+	def read(self, nBytes=-1):
+		return self.fIn.read(nBytes)
+
+def packets(fIn, **kwargs):
+	return [
+		(pkt.tag, pkt.id, pkt.length, bytes(pkt.content))
+		for pkt in das2.PacketReader(fIn, **kwargs)
+	]
+
+def checkRepeatedHdrs():
+	"""Identical headers are parsed once per stream and share their parse"""
+	sHdr = b'<stream version="2.2"><properties String:title="test"/></stream>\n'
+	lPkts = [
+		b'<packet><x type="little_endian_real8" units="t2000"></x>'
+		b'<y type="little_endian_real4" name="amp" units="V"></y></packet>\n',
+		b'<packet><x type="little_endian_real8" units="t2000"></x>'
+		b'<y type="little_endian_real8" name="amp" units="V"></y></packet>\n'
+	]
+	xStream = b'[00]%06d'%len(sHdr) + sHdr
+	for i in range(50):
+		sPkt = lPkts[i % 2]
+		nLen = 12 if (i % 2 == 0) else 16
+		xStream += b'[01]%06d'%len(sPkt) + sPkt + (b':01:' + bytes(nLen))*3
+
+	lParsed = []
+	parse = das2.reader.Das22HdrParser.parse
+	def countParse(self, fIn):
+		lParsed.append(fIn)
+		return parse(self, fIn)
+
+	das2.reader.Das22HdrParser.parse = countParse
+	try:
+		lHdrs = []
+		nData = 0
+		for pkt in das2.PacketReader(io.BytesIO(xStream)):
+			if isinstance(pkt, das2.DataHdrPkt):
+				pkt.docTree()
+				pkt.dtype()
+				lHdrs.append(pkt)
+			elif isinstance(pkt, das2.DataPkt):
+				nData += 1
+	finally:
+		das2.reader.Das22HdrParser.parse = parse
+
+	if (len(lHdrs) != 50) or (nData != 150):
+		perr("ERROR: Read %d headers and %d data packets\n"%(len(lHdrs), nData))
+		return False
+	if len(lParsed) != 2:
+		perr("ERROR: 2 distinct headers were parsed %d times\n"%len(lParsed))
+		return False
+	if (lHdrs[0].tree is not lHdrs[2].tree) or (lHdrs[0].tree is lHdrs[1].tree):
+		perr("ERROR: Parse trees not shared by content\n")
+		return False
+	if [pkt.dataLen() for pkt in lHdrs[:2]] != [12, 16]:
+		perr("ERROR: Wrong data lengths from shared headers\n")
+		return False
+	return True
+
+def main(argv):
+
+	if not checkRepeatedHdrs():
+		return 13
+
+	for sFile in ('test/ex06_waveform_binary.d3b', 'test/ex96_yscan_multispec.d2t'):
+		with open(sFile, 'rb') as fIn:
+			xData = fIn.read()
+
+		# Holding on to views from every packet, they must not be overwritten
+		lViews = []
+		for pkt in das2.PacketReader(io.BytesIO(xData), bufsize=65536):
+			if isinstance(pkt, das2.DataPkt):
+				if not isinstance(pkt.content, memoryview):
+					perr("ERROR: %s, data content is not a memoryview\n"%sFile)
+					return 13
+				lViews.append((pkt.length, pkt.content))
+			elif not isinstance(pkt.content, bytes):
+				perr("ERROR: %s, header content is not bytes\n"%sFile)
+				return 13
+
+		lExpect = packets(io.BytesIO(xData), copy=True)
+		lData = [t for t in lExpect if t[0] == 'Pd']
+		if len(lData) != len(lViews):
+			perr("ERROR: %s, %d data packets with views, %d with copies\n"%(
+				sFile, len(lViews), len(lData)))
+			return 13
+
+		for (i, (nLen, view)) in enumerate(lViews):
+			if (len(view) != nLen) or (bytes(view) != lData[i][3]):
+				perr("ERROR: %s, payload view %d changed after later reads\n"%(
+					sFile, i))
+				return 13
+
+		# Must not depend on readinto() or on the size of each read
+		lOther = packets(ReadOnly(xData))
+		if lOther != lExpect:
+			perr("ERROR: %s, read() only input gave different packets\n"%sFile)
+			return 13
+
+		fTrickle = io.BufferedReader(io.BytesIO(xData), buffer_size=7)
+		if packets(fTrickle) != lExpect:
+			perr("ERROR: %s, small reads gave different packets\n"%sFile)
+			return 13
+
+		nTotal = sum(t[2] for t in lExpect)
+		print("%s: %d packets, %d payload bytes"%(sFile, len(lExpect), nTotal))
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
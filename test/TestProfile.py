@@ -0,0 +1,105 @@
+import sys
+import io
+import json
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Stream profiling, packet counts, byte totals, text encoding costs and
+# record time lines
+
+def mkStream(nRecs):
+	"""A das2.2 stream with a binary packet type and a text packet type"""
+	sHdr = b'<stream version="2.2"><properties String:title="test"/></stream>\n'
+	lPkts = [
+		b'<packet><x type="little_endian_real8" units="t2000"></x>'
+		b'<y type="little_endian_real4" name="amp" units="V"></y></packet>\n',
+		b'<packet><x type="time24" units="UTC"></x>'
+		b'<yscan type="ascii10" name="spec" nitems="3" yTags="1,2,3" zUnits="V"></yscan></packet>\n'
+	]
+	xOut = b'[00]%06d'%len(sHdr) + sHdr
+	for (i, sPkt) in enumerate(lPkts):
+		xOut += b'[%02d]%06d'%(i + 1, len(sPkt)) + sPkt
+
+	# One record every 0.1 seconds
+	aRecs = numpy.zeros(nRecs, dtype=[('tag','S4'), ('x','<f8'), ('amp','<f4')])
+	aRecs['tag'] = b':01:'
+	aRecs['x'] = numpy.arange(nRecs)*0.1
+	xText = b':02:2000-01-01T00:00:00.000Z' + b' 1.000e+00'*3
+	sComment = b'<comment type="log:info" value="hi" source="t"/>'
+	xComment = b'[xx]%06d'%len(sComment) + sComment
+	return xOut + aRecs.tobytes() + xText*2 + xComment
+
+def main(argv):
+
+	nRecs = 20000
+	xStream = mkStream(nRecs)
+	dProf = das2.profile_stream(io.BytesIO(xStream))
+
+	if (dProf['content'], dProf['version']) != ('das-basic-stream', '2.2'):
+		perr("ERROR: Wrong stream type %s %s\n"%(dProf['content'], dProf['version']))
+		return 13
+
+	if (dProf['bytes'] != len(xStream)) or (dProf['records'] != nRecs + 2):
+		perr("ERROR: Profile counted %d bytes and %d records\n"%(
+			dProf['bytes'], dProf['records']))
+		return 13
+
+	nOther = sum(dProf['other_bytes'].values())
+	if dProf['header_bytes'] + dProf['data_bytes'] + nOther != len(xStream):
+		perr("ERROR: Byte totals don't add up to the stream size\n")
+		return 13
+
+	d1 = dProf['packets'][1]
+	d2 = dProf['packets'][2]
+	if (d1['records'] != nRecs) or (d1['data_bytes'] != nRecs*16) or \
+	   (d1['record_len'] != 12) or (d1['text_values'] != 0):
+		perr("ERROR: Bad binary packet statistics %s\n"%d1)
+		return 13
+
+	if (d2['records'] != 2) or (d2['text_values'] != 4) or \
+	   (d2['binary_bytes'] != 2*32):
+		perr("ERROR: Bad text packet statistics %s\n"%d2)
+		return 13
+
+	# 10 records a second
+	dTl = d1['timeline']
+	if (dTl['begin'] != '2000-01-01T00:00:00.000000000') or \
+	   (dTl['bin_sec'] != 1.0) or (dTl['max_rate'] != 10.0) or \
+	   (sum(n for (s, n) in dTl['bins']) != nRecs):
+		perr("ERROR: Bad record time line %s\n"%{
+			k:v for (k,v) in dTl.items() if k != 'bins'})
+		return 13
+
+	# Bins widen instead of growing without bound
+	nMax = das2.profile.g_nMaxBins
+	das2.profile.g_nMaxBins = 64
+	try:
+		dTl = das2.profile_stream(io.BytesIO(xStream))['packets'][1]['timeline']
+	finally:
+		das2.profile.g_nMaxBins = nMax
+	if (len(dTl['bins']) > 64) or (dTl['bin_sec'] != 32.0) or \
+	   (sum(n for (s, n) in dTl['bins']) != nRecs):
+		perr("ERROR: Time line bins did not widen, %d bins of %g s\n"%(
+			len(dTl['bins']), dTl['bin_sec']))
+		return 13
+
+	# Counting only, and JSON output
+	dCount = das2.profile_stream(io.BytesIO(xStream), decode=False)
+	if (dCount['packets'][1]['decoded'] != 0) or (dCount['packets'][1]['timeline'] != None):
+		perr("ERROR: Records were decoded with decode=False\n")
+		return 13
+	json.dumps(dProf)
+
+	sReport = das2.format_profile(das2.profile_stream('test/ex96_yscan_multispec.d2t'))
+	if ('Packet ID 6' not in sReport) or ('text values per record' not in sReport):
+		perr("ERROR: Unexpected profile report\n%s\n"%sReport)
+		return 13
+	print(sReport)
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
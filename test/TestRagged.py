@@ -0,0 +1,129 @@
+import sys
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Ragged arrays arrive from _das2 as flat values plus row offsets
+
+def t64(nSec): return numpy.datetime64(nSec, 's').astype('M8[ns]')
+
+def mkUnsorted():
+	# Rows of amplitudes ragged in the last index, time order reversed
+	ds = das2.Dataset('ragged')
+	ds.coord('time').center(numpy.array([t64(2), t64(0)]), 'UTC')
+	ds.data('amp').center(
+		das2.RaggedArray(numpy.array([20.0, 21.0, 22.0, 0.0, 1.0]), numpy.array([0, 3, 5])),
+		'V'
+	)
+	return ds
+
+def rowsMatch(sWhat, ds):
+	"""Each amplitude row must still go with it's time, row values start at
+	10 times the time in seconds"""
+	aTime = ds['time']['center'].array[:,0]
+	aAmp = ds['amp']['center'].array
+	for i in range(len(aTime)):
+		nSec = int((aTime[i] - t64(0)) // numpy.timedelta64(1, 's'))
+		if aAmp[i,0] != nSec*10:
+			perr("ERROR: %s, time %d s has amplitudes %s\n"%(sWhat, nSec, aAmp[i]))
+			return False
+	return True
+
+def main(argv):
+
+	dRaw = {
+		'id':'ragged', 'group':'test', 'props':{}, 'shape':[3, -1],
+		'coords':{
+			'time':{
+				'type':'COORD_DIM', 'props':{},
+				'center':{
+					'role':'center', 'units':'s', 'valtype':'double',
+					'expression':'t[i] s | i:0..3'
+				}
+			}
+		},
+		'data':{
+			'amp':{
+				'type':'DATA_DIM', 'props':{},
+				'center':{
+					'role':'center', 'units':'V', 'valtype':'double',
+					'expression':'a[i][j] V | i:0..3, j:0..*'
+				}
+			}
+		},
+		'arrays':{
+			't':numpy.arange(3.0),
+			'a':numpy.array([1.0, 2.0, 3.0, -1e31, 5.0, 6.0])
+		},
+		'fill':{'t':None, 'a':-1e31},
+		'offsets':{'a':numpy.array([0, 1, 4, 6])}
+	}
+
+	ds = das2.ds_from_raw(dRaw)
+	if tuple(ds.shape) != (3, 3):
+		perr("ERROR: Expected dataset shape (3, 3), got %s\n"%(ds.shape,))
+		return 13
+
+	var = ds['amp']['center']
+	if not isinstance(var, das2.RaggedVariable):
+		perr("ERROR: Expected a RaggedVariable, got %s\n"%type(var).__name__)
+		return 13
+
+	if list(var.ragged.lengths) != [1, 3, 2]:
+		perr("ERROR: Bad row lengths %s\n"%var.ragged.lengths)
+		return 13
+
+	if list(var.ragged.row(2)) != [5.0, 6.0]:
+		perr("ERROR: Bad row values %s\n"%var.ragged.row(2))
+		return 13
+
+	# Padded view, short rows and fill values are masked
+	aMask = numpy.ma.getmaskarray(var.array)
+	aExpect = numpy.array([[0,1,1],[0,0,1],[0,0,1]], dtype=bool)
+	aExpect[1,2] = True
+	if not numpy.array_equal(aMask, aExpect):
+		perr("ERROR: Bad padding mask\n%s\n"%aMask)
+		return 13
+
+	if ds['time']['center'].array.shape != (3, 3):
+		perr("ERROR: Coordinates not broadcast to the padded shape\n")
+		return 13
+
+	# Sorting re-orders the padded rows, the compact values are dropped
+	ds = mkUnsorted()
+	ds.sort('time:center')
+	if ds['amp']['center'].ragged is not None:
+		perr("ERROR: Compact ragged values kept after a sort\n")
+		return 13
+	if not rowsMatch('sort', ds): return 13
+
+	cache = das2.IntervalCache()
+	sKey = das2.cache_key({'source':'test:/ragged', 'query':{}})
+	(t0, t1) = (t64(0), t64(3))
+	pc = cache.add(sKey, t0, t1, {}, [ds])
+	if pc.nbytes != ds['amp']['center'].array.nbytes + 2*8:
+		perr("ERROR: Sorted ragged dataset sized as %d bytes\n"%pc.nbytes)
+		return 13
+	(dHdr, lDs) = cache.serve(sKey, t0, t1, lFresh=[pc])[0]
+	if not rowsMatch('sort then cache', lDs[0]): return 13
+
+	for (sWhat, dsSub) in (
+		('sort then slice', ds[0:1]), ('sort then slice', ds[1:2]),
+		('sort then cache sub-range', cache.serve(sKey, t0, t64(1))[0][1][0])
+	):
+		if (dsSub.shape[0] != 1) or not rowsMatch(sWhat, dsSub): return 13
+
+	# Unsorted datasets still slice without padding
+	dsSub = mkUnsorted()[1:2]
+	if not isinstance(dsSub['amp']['center'], das2.RaggedVariable) or \
+	   not rowsMatch('slice', dsSub):
+		perr("ERROR: Compact ragged slice went wrong\n")
+		return 13
+
+	print("Ragged dataset: %s"%(ds.shape,))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,41 @@
+import sys
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Chunked reads should produce the same records as a whole-file read
+
+def main(argv):
+
+	sFile = 'test/ex96_yscan_multispec.d2t'
+
+	(dHdr, lDs) = das2.read_file(sFile)
+	nTotal = sum(ds.shape[0] for ds in lDs)
+
+	nChunks = 0
+	nChunked = 0
+	for (dHdr, lChunk) in das2.iter_file(sFile, nRecs=3, rMegaBytes=0):
+		nChunks += 1
+		for ds in lChunk:
+			if ds.shape[0] > 3:
+				perr("ERROR: Chunk %d has %d records, expected <= 3\n"%(
+					nChunks, ds.shape[0]))
+				return 13
+			nChunked += ds.shape[0]
+
+	if nChunked != nTotal:
+		perr("ERROR: Chunked read returned %d records, expected %d\n"%(
+			nChunked, nTotal))
+		return 13
+
+	# Stopping early must not hang the background reader
+	for (dHdr, lChunk) in das2.iter_file(sFile, nRecs=1, rMegaBytes=0):
+		break
+
+	print("Read %d records in %d chunks"%(nChunked, nChunks))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
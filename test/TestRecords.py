@@ -0,0 +1,98 @@
+import sys
+import io
+import os
+import tempfile
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Bulk decoding of fixed length data packets into structured arrays
+
+def mkStream(nRecs):
+	"""A das2.2 binary stream with two interleaved packet IDs"""
+	sHdr = b'<stream version="2.2"><properties String:title="test"/></stream>\n'
+	lPkts = [
+		b'<packet><x type="little_endian_real8" units="t2000"></x>'
+		b'<y type="sun_real4" name="amp" units="V"></y></packet>\n',
+		b'<packet><x type="time24" units="UTC"></x>'
+		b'<yscan type="ascii10" name="spec" nitems="3" yTags="1,2,3" zUnits="V"></yscan></packet>\n'
+	]
+	xOut = b'[00]%06d'%len(sHdr) + sHdr
+	for (i, sPkt) in enumerate(lPkts):
+		xOut += b'[%02d]%06d'%(i + 1, len(sPkt)) + sPkt
+
+	aRecs = numpy.zeros(nRecs, dtype=[('tag','S4'), ('x','<f8'), ('amp','>f4')])
+	aRecs['tag'] = b':01:'
+	aRecs['x'] = numpy.arange(nRecs)*0.5
+	aRecs['amp'] = numpy.arange(nRecs)
+	nHalf = nRecs // 2
+	xText = b':02:2000-01-01T00:00:00.000Z' + b' 1.000e+00'*3
+	return xOut + aRecs[:nHalf].tobytes() + xText + aRecs[nHalf:].tobytes()
+
+def check(sWhat, reader, nRecs):
+	dVals = {1:[], 2:[]}
+	for (hdr, aRecs) in reader.records():
+		dVals[hdr.id].append(hdr.values(aRecs))
+
+	if len(dVals[1]) != 2:
+		perr("ERROR: %s, expected 2 runs for ID 1 got %d\n"%(sWhat, len(dVals[1])))
+		return False
+
+	aTime = numpy.concatenate([d['x'] for d in dVals[1]])
+	aAmp = numpy.concatenate([d['amp'] for d in dVals[1]])
+	aExpect = numpy.datetime64('2000-01-01', 'ns') + \
+		(numpy.arange(nRecs)*500).astype('m8[ms]')
+	if (not numpy.array_equal(aTime, aExpect)) or \
+	   (not numpy.array_equal(aAmp, numpy.arange(nRecs, dtype='f4'))) or \
+	   (aAmp.dtype != numpy.dtype('float32')):
+		perr("ERROR: %s, binary values decoded incorrectly\n"%sWhat)
+		return False
+
+	dSpec = dVals[2][0]
+	if (dSpec['x'][0] != numpy.datetime64('2000-01-01')) or \
+	   (not numpy.array_equal(dSpec['spec'], [[1.0, 1.0, 1.0]])):
+		perr("ERROR: %s, text values decoded incorrectly\n"%sWhat)
+		return False
+	return True
+
+def main(argv):
+
+	# Headers from the example files
+	with open('test/ex06_waveform_binary.d3b', 'rb') as fIn:
+		for pkt in das2.PacketReader(fIn):
+			if isinstance(pkt, das2.DataHdrPkt): break
+	if pkt.dtype() != numpy.dtype([('time.reference','S24'), ('Ey.center','<f4',(6144,))]):
+		perr("ERROR: Unexpected das3 packet type %s\n"%pkt.dtype())
+		return 13
+
+	nRecs = 100000
+	xStream = mkStream(nRecs)
+	if not check('stream', das2.PacketReader(io.BytesIO(xStream)), nRecs):
+		return 13
+
+	# Small reads should only change how the runs are found
+	fTrickle = io.BufferedReader(io.BytesIO(xStream), buffer_size=5)
+	if not check('small reads', das2.PacketReader(fTrickle), nRecs):
+		return 13
+
+	(nFd, sFile) = tempfile.mkstemp(suffix='.d2s')
+	try:
+		with os.fdopen(nFd, 'wb') as fOut:
+			fOut.write(xStream)
+		with open(sFile, 'rb') as fIn:
+			reader = das2.PacketReader(fIn, mmap=True)
+			if len(reader) != nRecs + 4:
+				perr("ERROR: Index has %d packets expected %d\n"%(len(reader), nRecs + 4))
+				return 13
+			if not check('mmap', reader, nRecs):
+				return 13
+	finally:
+		os.remove(sFile)
+
+	print("Record decoding tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
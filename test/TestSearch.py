@@ -0,0 +1,109 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import shutil
+import das2
+
+perr = sys.stderr.write
+
+# Local search index over a small catalog tree of local files
+
+g_lSrcs = [
+	('juno_survey', 'Juno Waves Survey', 'Electric and magnetic spectral density',
+	 ['efield', 'bfield'], ['2016-01-01', '2025-01-01']),
+	('cassini_wfrm', 'Cassini RPWS Waveforms', 'Electric field waveform captures',
+	 ['efield'], ['2004-01-01', '2017-09-15']),
+	('voyager_sa', 'Voyager PWS Spectrum Analyzer', 'Sixteen channel electric spectra',
+	 ['efield'], ['1977-08-20', '2019-03-01']),
+]
+
+def mkSrc(sName, sTitle, sDesc, lData, lRange):
+	dTime = {
+		'minimum':{'value':lRange[0], 'set':{'param':'start_time', 'range':lRange}},
+		'maximum':{'value':lRange[1], 'set':{'param':'end_time', 'range':lRange}}
+	}
+	return {
+		'type':'HttpStreamSrc', 'name':sName, 'title':sTitle, 'description':sDesc,
+		'interface':{'coordinates':{'time':dTime},
+		             'data':{s:{'name':s} for s in lData}}
+	}
+
+def writeTree(sDir, lSrcs):
+	def url(sName): return 'file://%s'%os.path.join(sDir, sName)
+	dCol = {'type':'Collection', 'name':'test', 'title':'Test sources', 'sources':{}}
+	for tSrc in lSrcs:
+		dCol['sources'][tSrc[0]] = {'type':'HttpStreamSrc', 'name':tSrc[0],
+		                            'urls':[url(tSrc[0] + '.json')]}
+		with open(os.path.join(sDir, tSrc[0] + '.json'), 'w') as fOut:
+			json.dump(mkSrc(*tSrc), fOut)
+	with open(os.path.join(sDir, 'col.json'), 'w') as fOut:
+		json.dump(dCol, fOut)
+	return url('col.json')
+
+def names(lResults): return sorted(r.path.split('/')[-1] for r in lResults)
+
+def main(argv):
+
+	sDir = tempfile.mkdtemp(prefix='das2_search_')
+	try:
+		sUrl = writeTree(sDir, g_lSrcs)
+		sPath = 'tag:das2.org,2012:test:/search'
+		sFile = os.path.join(sDir, 'index', 'nodes.json')
+
+		cat = das2.get_catalog(sPath, sUrl)
+		cat.prefetch()
+		idx = das2.SearchIndex(sFile)
+		(nChanged, nRemoved) = idx.update(cat)
+		if nChanged != 4:
+			perr("ERROR: Expected 4 indexed nodes, got %d\n"%nChanged)
+			return 13
+		idx.save()
+
+		# Fresh index from disk, no catalog access needed
+		idx = das2.SearchIndex(sFile)
+
+		lTests = [
+			("electric", ['cassini_wfrm', 'juno_survey', 'voyager_sa']),
+			("juno waves", ['juno_survey']),
+			("wave", ['cassini_wfrm', 'juno_survey']),       # prefix match
+			("efield 2018", ['juno_survey', 'voyager_sa']),  # time coverage
+			("electric 1980-02-01", ['voyager_sa']),
+			("bfield", ['juno_survey']),
+			("mars", [])
+		]
+		for (sQuery, lExpect) in lTests:
+			lGot = names(idx.search(sQuery, type='HttpStreamSrc'))
+			if lGot != lExpect:
+				perr("ERROR: Search '%s' gave %s, expected %s\n"%(sQuery, lGot, lExpect))
+				return 13
+
+		# Incremental refresh: one changed, one removed
+		lSrcs = [list(t) for t in g_lSrcs[:2]]
+		lSrcs[1][1] = 'Cassini RPWS Wideband Receiver'
+		writeTree(sDir, lSrcs)
+
+		cat = das2.get_catalog(sPath, sUrl)
+		cat.prefetch()
+		(nChanged, nRemoved) = idx.update(cat)
+		if (nChanged != 2) or (nRemoved != 1):
+			perr("ERROR: Refresh changed %d and removed %d nodes\n"%(nChanged, nRemoved))
+			return 13
+		if names(idx.search("wideband")) != ['cassini_wfrm'] or idx.search("voyager"):
+			perr("ERROR: Index was not refreshed\n")
+			return 13
+
+		rBeg = time.time()
+		for i in range(100): idx.search("electric 2010")
+		rSecs = (time.time() - rBeg)/100
+
+	finally:
+		shutil.rmtree(sDir)
+
+	print("Search index tests passed, %.2f ms per query"%(rSecs*1000))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
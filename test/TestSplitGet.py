@@ -0,0 +1,159 @@
+import sys
+import threading
+import time
+import numpy
+
+try:
+	from urllib.parse import parse_qs
+except ImportError:
+	from urlparse import parse_qs
+
+import das2
+import das2.streamsrc
+
+perr = sys.stderr.write
+
+# Long time ranges split into pieces, retried and joined back together, no
+# server needed, the C reader is replaced by a fake that makes one minute
+# records for whatever time range it's asked for
+
+def t64(s): return numpy.datetime64(das2.DasTime(s).isoc(6), 'ns')
+
+def mkRaw(sId, aTime):
+	n = len(aTime)
+	return {
+		'id':sId, 'group':sId, 'props':{}, 'shape':[n],
+		'coords':{'time':{'center':{
+			'expression':'time[i] UTC | i:0..%d'%n, 'units':'UTC', 'role':'center'
+		}}},
+		'data':{sId:{'center':{
+			'expression':'val[i] V | i:0..%d'%n, 'units':'V', 'role':'center'
+		}}},
+		'arrays':{'time':aTime, 'val':numpy.arange(n, dtype='f8')},
+		'fill':{'val':-1e31}
+	}
+
+class FakeServer(object):
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.dCalls = {}     # Requests by start time
+		self.dFail = {}      # Start time -> number of requests to fail
+		self.lEmpty = []     # Start times with no data
+
+	def read_server(self, sUrl, *args):
+		dQuery = parse_qs(sUrl.split('?', 1)[1])
+		(sBeg, sEnd) = (dQuery['start_time'][0], dQuery['end_time'][0])
+		(t0, t1) = (t64(sBeg), t64(sEnd))
+		with self.lock:
+			self.dCalls[sBeg] = self.dCalls.get(sBeg, 0) + 1
+			bFail = self.dFail.get(sBeg, 0) > 0
+			if bFail: self.dFail[sBeg] -= 1
+
+		# Early pieces finish last
+		time.sleep(max(0, 0.05 - (t0 - t64('2017-01-01')).astype('i8')*1e-14))
+		if bFail: raise IOError("Fake server refused %s"%sBeg)
+
+		if sBeg in self.lEmpty: aTime = numpy.zeros(0, dtype='M8[ns]')
+		else: aTime = numpy.arange(t0, t1, numpy.timedelta64(60, 's'))
+		return ({'props':{}}, [mkRaw('amp', aTime), mkRaw('temp', aTime)])
+
+def mkSource():
+	dTime = {
+		'minimum':{'value':'2017-01-01', 'set':{'param':'start_time'}},
+		'maximum':{'value':'2017-01-02', 'set':{'param':'end_time'}}
+	}
+	dDef = {
+		'type':'HttpStreamSrc', 'name':'fake', '_url':'file:///dev/null',
+		'_path':'tag:das2.org,2012:test:/fake',
+		'protocol':{
+			'base_urls':['http://a.test/das2'],
+			'http_params':{'start_time':{'required':True}, 'end_time':{'required':True}}
+		},
+		'interface':{'coordinates':{'time':dTime}}
+	}
+	return das2.HttpStreamSrc(dDef, False, False)
+
+def main(argv):
+
+	src = mkSource()
+
+	# Millisecond truncation of piece edges can't leave holes or overlaps
+	sBeg = '2017-01-01T00:00'
+	sEnd = '2017-01-01T00:00:01'
+	lPieces = src._splitProto({'start_time':sBeg, 'end_time':sEnd}, 1.0/3)
+	lEdges = [dPiece['start_time'] for dPiece in lPieces] + [lPieces[-1]['end_time']]
+	if (len(lPieces) != 3) or (t64(lEdges[0]) != t64(sBeg)) or (t64(lEdges[-1]) != t64(sEnd)):
+		perr("ERROR: Split into %s\n"%lPieces)
+		return 13
+	for i in range(len(lPieces) - 1):
+		if (lPieces[i]['end_time'] != lPieces[i+1]['start_time']) or \
+		   (t64(lEdges[i]) >= t64(lEdges[i+1])):
+			perr("ERROR: Pieces %d and %d don't meet, %s\n"%(i, i+1, lPieces))
+			return 13
+
+	try:
+		src._splitProto({'start_time':sBeg, 'end_time':sEnd}, 0)
+		perr("ERROR: Zero length split accepted\n")
+		return 13
+	except ValueError:
+		pass
+
+	fake = FakeServer()
+	fnReal = das2.streamsrc._das2.read_server
+	das2.streamsrc._das2.read_server = fake.read_server
+	try:
+		dQuery = {'time':('2017-01-01T00:00', '2017-01-01T01:00')}
+
+		# One piece fails twice, only it is asked for again
+		sRetry = '2017-01-01T00:20:00.000'
+		fake.dFail = {sRetry:2}
+		(dHdr, lDs) = src.get(dQuery, split=600, max_workers=4, retries=2)
+		if sorted(fake.dCalls.values()) != [1, 1, 1, 1, 1, 3] or fake.dCalls[sRetry] != 3:
+			perr("ERROR: Unexpected requests by piece %s\n"%fake.dCalls)
+			return 13
+
+		# One dataset per ID in the order first seen, records in time order
+		if [ds.name for ds in lDs] != ['amp', 'temp']:
+			perr("ERROR: Joined datasets are %s\n"%[ds.name for ds in lDs])
+			return 13
+		aExpect = numpy.arange(
+			t64('2017-01-01T00:00'), t64('2017-01-01T01:00'), numpy.timedelta64(60, 's')
+		)
+		for ds in lDs:
+			if not numpy.array_equal(ds['time']['center'].array, aExpect):
+				perr("ERROR: %s times are not the full range in order\n"%ds.name)
+				return 13
+
+		# Pieces with no data are dropped from the join
+		fake.dCalls = {}
+		fake.lEmpty = ['2017-01-01T00:30:00.000']
+		(dHdr, lDs) = src.get(dQuery, split=600, max_workers=4, retries=2)
+		if lDs[0].shape != (50,):
+			perr("ERROR: Join with an empty piece has shape %s\n"%(lDs[0].shape,))
+			return 13
+
+		# Out of retries, the error names the missing range
+		fake.dCalls = {}
+		fake.lEmpty = []
+		fake.dFail = {sRetry:5}
+		try:
+			src.get(dQuery, split=600, max_workers=4, retries=2)
+			perr("ERROR: Piece failing past the retry limit did not raise\n")
+			return 13
+		except das2.SourceError as e:
+			if sRetry not in str(e):
+				perr("ERROR: Failed range not named, %s\n"%e)
+				return 13
+		if fake.dCalls[sRetry] != 3 or sum(fake.dCalls.values()) != 8:
+			perr("ERROR: Unexpected requests by piece %s\n"%fake.dCalls)
+			return 13
+
+	finally:
+		das2.streamsrc._das2.read_server = fnReal
+
+	print("Split queries retried and joined correctly")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
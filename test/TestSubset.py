@@ -0,0 +1,120 @@
+import sys
+import datetime
+import numpy
+import das2
+
+perr = sys.stderr.write
+
+# Dataset slicing and coordinate range selection, both return views
+
+def mkDataset(nRecs, nFreq):
+	ds = das2.Dataset('spectra')
+	aRef = numpy.datetime64('2017-01-01', 'ns') + \
+		numpy.arange(nRecs)*numpy.timedelta64(1, 's')
+	ds.coord('time').reference(aRef, 'UTC')
+	ds.coord('time').offset(numpy.arange(nFreq)*numpy.timedelta64(1000, 'ns'), 'ns', axis=1)
+	ds.coord('freq').center(numpy.arange(nFreq)*10.0, 'Hz', axis=1)
+	ds.data('amp').center(numpy.arange(nRecs*nFreq, dtype='f8').reshape(nRecs, nFreq), 'V')
+	return ds
+
+def views(sWhat, ds, dsSub):
+	"""Every variable in dsSub must be a view of the same one in ds, and
+	broadcast axes must stay broadcast"""
+	for sDim in ds.keys():
+		for sRole in ds[sDim].keys():
+			var = ds[sDim][sRole]
+			sub = dsSub[sDim][sRole]
+			if not numpy.shares_memory(var.array, sub.array):
+				perr("ERROR: %s, %s:%s was copied\n"%(sWhat, sDim, sRole))
+				return False
+			if sub.unique != var.unique:
+				perr("ERROR: %s, %s:%s degeneracy changed\n"%(sWhat, sDim, sRole))
+				return False
+			for i in range(len(sub.unique)):
+				if (not sub.unique[i]) and (sub.array.shape[i] > 1) and \
+				   (sub.array.strides[i] != 0):
+					perr("ERROR: %s, %s:%s index %d is no longer broadcast\n"%(
+						sWhat, sDim, sRole, i))
+					return False
+	return True
+
+def main(argv):
+
+	ds = mkDataset(1000, 64)
+	aAmp = ds['amp']['center'].array
+
+	dsSub = ds[10:20]
+	if (dsSub.shape != (10, 64)) or not views('ds[10:20]', ds, dsSub):
+		return 13
+	if not numpy.array_equal(dsSub['amp']['center'].array, aAmp[10:20]):
+		perr("ERROR: ds[10:20] has the wrong values\n")
+		return 13
+	if not numpy.array_equal(dsSub['time']['center'].array, ds['time']['center'].array[10:20]):
+		perr("ERROR: ds[10:20] has the wrong time values\n")
+		return 13
+
+	dsSub = ds[:, 5:9]
+	if (dsSub.shape != (1000, 4)) or not views('ds[:, 5:9]', ds, dsSub):
+		return 13
+	if list(dsSub['freq']['center'].array[0]) != [50.0, 60.0, 70.0, 80.0]:
+		perr("ERROR: ds[:, 5:9] has the wrong frequencies\n")
+		return 13
+
+	dsSub = ds[::10, ::-2]
+	if (dsSub.shape != (100, 32)) or not views('ds[::10, ::-2]', ds, dsSub) or \
+	   not numpy.array_equal(dsSub['amp']['center'].array, aAmp[::10, ::-2]):
+		perr("ERROR: ds[::10, ::-2] is wrong\n")
+		return 13
+
+	for key in (5, (slice(None), 3), (slice(None),)*3):
+		try:
+			ds[key]
+			perr("ERROR: Dataset index %s accepted\n"%(key,))
+			return 13
+		except (TypeError, IndexError):
+			pass
+
+	# Half open coordinate ranges, any time type
+	for (beg, end) in (
+		('2017-01-01T00:00:10', '2017-01-01T00:00:20'),
+		(numpy.datetime64('2017-01-01T00:00:10'), numpy.datetime64('2017-01-01T00:00:20')),
+		(datetime.datetime(2017,1,1,0,0,10), datetime.datetime(2017,1,1,0,0,20))
+	):
+		dsSub = ds.select(time=(beg, end))
+		if (dsSub.shape != (10, 64)) or not views('select', ds, dsSub):
+			perr("ERROR: Time selection %s to %s gave shape %s\n"%(beg, end, dsSub.shape))
+			return 13
+		if dsSub['time']['reference'].array[0,0] != numpy.datetime64('2017-01-01T00:00:10'):
+			perr("ERROR: Time selection starts at the wrong record\n")
+			return 13
+
+	dsSub = ds.select(time=(None, '2017-01-01T00:00:05'), freq=(100.0, 200.0))
+	if dsSub.shape != (5, 10):
+		perr("ERROR: Two coordinate selection gave shape %s\n"%(dsSub.shape,))
+		return 13
+
+	if ds.select(time=('2018-01-01', None)).shape != (0, 64):
+		perr("ERROR: Selection after the end of the data is not empty\n")
+		return 13
+
+	try:
+		ds.select(amp=(0, 1))
+		perr("ERROR: Selection on a data dimension accepted\n")
+		return 13
+	except KeyError:
+		pass
+
+	# Selecting from a big dataset is a binary search, no copies
+	ds = das2.Dataset('waveform')
+	nRecs = 10000000
+	ds.coord('time').reference(numpy.arange(nRecs, dtype='i8').view('M8[ns]'), 'UTC')
+	ds.data('amp').center(numpy.zeros(nRecs, dtype='f4'), 'V')
+	dsSub = ds.select(time=(numpy.datetime64(1000,'ns'), numpy.datetime64(3000,'ns')))
+	if (dsSub.shape != (2000,)) or not views('big select', ds, dsSub):
+		return 13
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
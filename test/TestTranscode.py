@@ -0,0 +1,140 @@
+import sys
+import io
+import numpy
+import das2
+import das2.verify
+
+# das2.transcode is the function, this is the module
+tc = sys.modules['das2.transcode']
+
+perr = sys.stderr.write
+
+# Text to binary stream conversion
+
+def values(fIn):
+	"""All values in a stream by (packet ID, field name), the headers and
+	the record count"""
+	dVals = {}
+	lHdrs = []
+	nRecs = 0
+	for (hdr, aRecs) in das2.PacketReader(fIn).records():
+		if hdr not in lHdrs: lHdrs.append(hdr)
+		nRecs += len(aRecs)
+		for (sName, aVals) in hdr.values(aRecs).items():
+			dVals.setdefault((hdr.id, sName), []).append(aVals)
+	for tKey in dVals:
+		dVals[tKey] = numpy.concatenate(dVals[tKey])
+	return (dVals, lHdrs, nRecs)
+
+def same(sWhat, dIn, dOut, rTol):
+	if sorted(dIn) != sorted(dOut):
+		perr("ERROR: %s, fields %s became %s\n"%(sWhat, sorted(dIn), sorted(dOut)))
+		return False
+
+	for tKey in dIn:
+		(aIn, aOut) = (dIn[tKey], dOut[tKey])
+		if aIn.shape != aOut.shape:
+			perr("ERROR: %s, %s shape changed\n"%(sWhat, tKey))
+			return False
+		if aIn.dtype.kind == 'M':
+			bSame = (numpy.abs((aIn - aOut).astype('i8')) <= 1000).all()  # 1 us
+		elif aIn.dtype.kind in 'SV':
+			bSame = numpy.array_equal(aIn, aOut)
+		else:
+			bSame = numpy.allclose(aIn, aOut, rtol=rTol, atol=0)
+		if not bSame:
+			perr("ERROR: %s, %s values changed\n"%(sWhat, tKey))
+			return False
+	return True
+
+def main(argv):
+
+	for sFile in ('test/ex96_yscan_multispec.d2t', 'test/ex08_dynaspec_namespace.d3t'):
+		with open(sFile, 'rb') as fIn:
+			xIn = fIn.read()
+		(dIn, lHdrs, nRecs) = values(io.BytesIO(xIn))
+
+		# Small batches, interleaved packet IDs are split across flushes
+		nBatch = tc.g_nMaxBatch
+		tc.g_nMaxBatch = 7
+		try:
+			fOut = io.BytesIO()
+			nPkts = das2.transcode(io.BytesIO(xIn), fOut)
+		finally:
+			tc.g_nMaxBatch = nBatch
+		xOut = fOut.getvalue()
+
+		(dOut, lHdrs, nOut) = values(io.BytesIO(xOut))
+		if (nPkts != nRecs) or (nOut != nRecs):
+			perr("ERROR: %s, %d records converted, %d read back, expected %d\n"%(
+				sFile, nPkts, nOut, nRecs))
+			return 13
+		if not same(sFile, dIn, dOut, 1e-7):
+			return 13
+
+		if len(xOut) > 0.75*len(xIn):
+			perr("ERROR: %s, binary output is %d bytes, input is %d\n"%(
+				sFile, len(xOut), len(xIn)))
+			return 13
+
+		for hdr in lHdrs:
+			for (sName, sType, tShape, sUnits, sKind) in hdr.fields():
+				if numpy.dtype(sType).kind == 'S':
+					perr("ERROR: %s, text field %s left in output\n"%(sFile, sName))
+					return 13
+
+		# The output must still be a valid stream
+		(sContent, sVersion, sTagStyle, bUsingNs) = das2.streamType(xOut[:16384])
+		(schema, sPath) = das2.loadSchema(sContent, sVersion, bUsingNs)
+		fReport = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+		stdout = sys.stdout
+		sys.stdout = fReport
+		try:
+			nRet = das2.verify.checkStream(
+				io.BytesIO(xOut), schema, sContent, sVersion, bUsingNs, False
+			)
+		finally:
+			sys.stdout = stdout
+		if nRet != 0:
+			fReport.flush()
+			perr("ERROR: %s, output does not validate\n%s\n"%(
+				sFile, fReport.buffer.getvalue().decode('utf-8')))
+			return 13
+
+		# Half size reals
+		fOut = io.BytesIO()
+		das2.transcode(io.BytesIO(xIn), fOut, real_bytes=4)
+		(dOut, lHdrs, nOut) = values(io.BytesIO(fOut.getvalue()))
+		if not same(sFile + ' real_bytes=4', dIn, dOut, 1e-6):
+			return 13
+
+		print("%s: %d bytes to %d bytes"%(sFile, len(xIn), len(xOut)))
+
+	# Binary streams pass through untouched
+	with open('test/ex15_vector_frame.d3b', 'rb') as fIn:
+		xIn = fIn.read()
+	fOut = io.BytesIO()
+	if (das2.transcode(io.BytesIO(xIn), fOut) != 0) or (fOut.getvalue() != xIn):
+		perr("ERROR: Binary stream changed by transcoding\n")
+		return 13
+
+	try:
+		das2.transcode(io.BytesIO(xIn), io.BytesIO(), encoding='text')
+		perr("ERROR: Unknown encoding accepted\n")
+		return 13
+	except ValueError:
+		pass
+
+	# TT2000 conversions across the 2016-12-31 leap second
+	aTimes = numpy.array(['2016-12-31T23:59:59.5', '2017-01-01T00:00:00.5'], dtype='M8[ns]')
+	aTT = das2.reader._fromTime64(aTimes, 'TT2000')
+	if (aTT[1] - aTT[0] != 2000000000) or \
+	   (das2.reader._toTime64(aTT, 'TT2000') != aTimes).any():
+		perr("ERROR: TT2000 round trip failed, %s\n"%aTT)
+		return 13
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,191 @@
+import sys
+import io
+import os
+import re
+import json
+import shutil
+import tempfile
+import contextlib
+import das2
+import das2.verify
+
+perr = sys.stderr.write
+
+# Stream validation, schema caching and repeated header handling
+
+def verify(xStream):
+	"""Run checkStream on some bytes, returns (return code, output)"""
+	(sContent, sVersion, sTagStyle, bUsingNs) = das2.streamType(xStream[:16384])
+	(schema, sPath) = das2.loadSchema(sContent, sVersion, bUsingNs)
+
+	fOut = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+	with contextlib.redirect_stdout(fOut):
+		nRet = das2.verify.checkStream(
+			io.BytesIO(xStream), schema, sContent, sVersion, bUsingNs, False
+		)
+	fOut.flush()
+	return (nRet, fOut.buffer.getvalue().decode('utf-8'))
+
+def batch(lArgs):
+	"""Run das_verify in batch mode, returns (return code, list of JSON objects)"""
+	fOut = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+	argv = sys.argv
+	sys.argv = ['das_verify'] + lArgs
+	try:
+		with contextlib.redirect_stdout(fOut):
+			nRet = das2.verify.main()
+	finally:
+		sys.argv = argv
+	fOut.flush()
+	sOut = fOut.buffer.getvalue().decode('utf-8')
+	return (nRet, [json.loads(sLine) for sLine in sOut.splitlines()])
+
+def checkBatch():
+	sDir = tempfile.mkdtemp(prefix='das2_verify_')
+	try:
+		os.mkdir(os.path.join(sDir, 'sub'))
+		shutil.copy('test/ex96_yscan_multispec.d2t', sDir)
+		shutil.copy('test/ex13_object_annotation.d3t', os.path.join(sDir, 'sub'))
+		with open(os.path.join(sDir, 'sub', 'bad.d2s'), 'wb') as fOut:
+			fOut.write(b'not a das stream')
+		with open(os.path.join(sDir, 'notes.txt'), 'w') as fOut:
+			fOut.write('not a stream')
+
+		lArgs = ['--jobs', '2', '--recursive', '--db', os.path.join(sDir, 'db'), sDir]
+		(nRet, lOut) = batch(lArgs)
+		dSum = lOut[-1]['summary']
+		if (nRet == 0) or (dSum['files'] != 3) or (dSum['checked'] != 3) or \
+		   (dSum['failed'] != 1) or (len(dSum['failures']) != 1):
+			perr("ERROR: Unexpected batch summary %s\n"%dSum)
+			return False
+
+		dFiles = dict((os.path.basename(d['file']), d) for d in lOut[:-1])
+		if (dFiles['ex96_yscan_multispec.d2t']['status'] != 'ok') or \
+		   (dFiles['bad.d2s']['status'] != 'failed'):
+			perr("ERROR: Unexpected batch results %s\n"%lOut)
+			return False
+
+		# Unchanged files come from the results database
+		(nRet, lOut) = batch(lArgs)
+		dSum = lOut[-1]['summary']
+		if (dSum['checked'] != 0) or (dSum['cached'] != 3) or (dSum['failed'] != 1):
+			perr("ERROR: Unchanged files were checked again %s\n"%dSum)
+			return False
+
+		with open(os.path.join(sDir, 'sub', 'bad.d2s'), 'ab') as fOut:
+			fOut.write(b' ')
+		(nRet, lOut) = batch(lArgs)
+		lChecked = [d['file'] for d in lOut[:-1] if not d['cached']]
+		if [os.path.basename(s) for s in lChecked] != ['bad.d2s']:
+			perr("ERROR: Expected only bad.d2s to be checked, got %s\n"%lChecked)
+			return False
+	finally:
+		shutil.rmtree(sDir)
+
+	return True
+
+def checkDocs():
+	"""Incremental document validation, line numbers must survive pruning"""
+	with open('test/ex16_mag_grid_doc.d3x', 'rb') as fIn:
+		lLines = fIn.read().replace(b' valTerm=";"', b'').split(b'\n')
+
+	nFirst = [i for (i, x) in enumerate(lLines) if x.startswith(b'<d ')][0]
+	lRows = [x for x in lLines if x.startswith(b'<d ')]
+	lRows = (lRows * 20)[:1000]
+	lRows[300] = lRows[300].replace(b'<d id', b'<d idx')
+	lRows[700] = lRows[700].replace(b'<d id', b'<d idx')
+	xDoc = b'\n'.join(lLines[:nFirst] + lRows + [b'</stream>\n'])
+
+	(sContent, sVersion, sTagStyle, bUsingNs) = das2.streamType(xDoc[:16384])
+	(schema, sPath) = das2.loadSchema(sContent, sVersion, bUsingNs)
+
+	nBatch = das2.verify.g_nDocBatch
+	das2.verify.g_nDocBatch = 64
+	try:
+		for (nMaxErr, lExpect) in ((10, [301, 701]), (1, [301])):
+			fOut = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+			dStatus = {}
+			with contextlib.redirect_stdout(fOut):
+				nRet = das2.verify.checkDoc(
+					io.BytesIO(xDoc), schema, False, dStatus, nMaxErr
+				)
+			fOut.flush()
+			sOut = fOut.buffer.getvalue().decode('utf-8')
+
+			lErrLines = sorted(set(
+				int(m) for m in re.findall(r'Error in document at line (\d+)', sOut)
+			))
+			if (nRet == 0) or (lErrLines != [nFirst + n for n in lExpect]):
+				perr("ERROR: Expected document errors at rows %s, got lines %s\n%s"%(
+					lExpect, lErrLines, sOut))
+				return False
+			if ('--->' not in sOut) or (dStatus['error_class'] != 'DocumentInvalid'):
+				perr("ERROR: Document error context or status missing\n%s"%sOut)
+				return False
+
+		fOut = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+		xGood = xDoc.replace(b'<d idx', b'<d id')
+		with contextlib.redirect_stdout(fOut):
+			nRet = das2.verify.checkDoc(io.BytesIO(xGood), schema, False)
+		if nRet != 0:
+			perr("ERROR: Valid document failed incremental validation\n")
+			return False
+	finally:
+		das2.verify.g_nDocBatch = nBatch
+
+	return True
+
+def main(argv):
+
+	(schema1, sPath1) = das2.loadSchema('das-basic-stream', '2.2')
+	(schema2, sPath2) = das2.loadSchema('das-basic-stream', '2.2')
+	if (schema1 is not schema2) or (sPath1 != sPath2):
+		perr("ERROR: Compiled schemas are not cached\n")
+		return 13
+
+	with open('test/ex96_yscan_multispec.d2t', 'rb') as fIn:
+		xStream = fIn.read()
+
+	(nRet, sFirst) = verify(xStream)
+	if (nRet != 0) or ('|Pd| ID 1 data packets 238 [OKAY]' not in sFirst):
+		perr("ERROR: Validation failed for ex96\n%s"%sFirst)
+		return 13
+
+	dValid = das2.verify._validHdrs(schema1)
+	if len(dValid) != 7:
+		perr("ERROR: Expected 7 memoized headers, found %d\n"%len(dValid))
+		return 13
+
+	# Second pass is served from the memo but must say the same thing
+	(nRet, sSecond) = verify(xStream)
+	if (nRet != 0) or (sSecond != sFirst):
+		perr("ERROR: Memoized validation output differs\n")
+		return 13
+
+	# Invalid headers are never memoized
+	xBad = xStream.replace(b'units="UTC"', b'unitz="UTC"', 1)
+	for i in range(2):
+		(nRet, sOut) = verify(xBad)
+		if nRet == 0:
+			perr("ERROR: Invalid packet header passed validation, pass %d\n"%i)
+			return 13
+
+	# Data packets counted in bulk must still be size checked
+	xShort = xStream.replace(b':01:', b':02:', 1)
+	(nRet, sOut) = verify(xShort)
+	if (nRet == 0) or ('[ERROR]' not in sOut):
+		perr("ERROR: Mis-sized data packet was not detected\n%s"%sOut)
+		return 13
+
+	if not checkDocs():
+		return 13
+
+	if not checkBatch():
+		return 13
+
+	print("Stream validation tests passed")
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))